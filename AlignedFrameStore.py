@@ -0,0 +1,162 @@
+import functools
+import glob
+import hashlib
+import os
+import pandas as pd
+from ParquetLoader import load_zone, zone_file, value_columns, power_types, daylight_index_file
+from LocalTime import convert_to_local_time
+from Alignment import align_frames, key_horizon_and_time
+
+# Merged frames are also saved here, so the next script run does not rebuild them
+cache_dir = '.cache/aligned_frames'
+
+# Number of merged frames kept in memory
+memory_cache_size = 32
+
+
+#Identifying the state of the source files, a modified file gives a new fingerprint
+def source_fingerprint(paths):
+    parts = []
+    for path in paths:
+        # A dataset folder (e.g. the naive forecasts of a zone) changes when any of its files does
+        files = sorted(glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True)) if os.path.isdir(path) else [path]
+        for file_path in files:
+            stat = os.stat(file_path)
+            parts.append(f'{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}')
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:16]
+
+
+#Reading and aligning predicted, target and optionally naive rows into the merged frame of
+#split_horizon: predicted and target columns get the _pred and _target suffixes
+def build_aligned_frame(zone_key, horizon, start, end, include_naive, paths, daylight=None):
+    frames = {
+        'pred': load_zone(zone_key, 'predicted', horizon, start=start, end=end, path=paths[0], daylight=daylight),
+        'target': load_zone(zone_key, 'target', horizon, start=start, end=end, path=paths[1], daylight=daylight),
+    }
+    if include_naive:
+        frames['naive'] = load_zone(zone_key, 'naive', horizon, start=start, end=end, path=paths[2], columns=['target_time', 'horizon'] + value_columns('naive'), daylight=daylight)
+
+    # With several horizons the same target_time appears once per horizon
+    by_horizon = not isinstance(horizon, int)
+    key_columns = ['target_time', 'horizon'] if by_horizon else ['target_time']
+    columns = {name: [column for column in df.columns if column not in key_columns] for name, df in frames.items()}
+    if include_naive:
+        columns['naive'] = value_columns('naive')
+
+    keys, aligned, unmatched = align_frames(frames, columns, by_horizon)
+
+    df_combined = {}
+    if by_horizon:
+        df_combined['horizon'], df_combined['target_time'] = key_horizon_and_time(keys)
+    else:
+        df_combined['target_time'] = keys
+    for name, side_columns in aligned.items():
+        for column, values in side_columns.items():
+            df_combined[column if name == 'naive' else f'{column}_{name}'] = values
+
+    df_combined = pd.DataFrame(df_combined)
+    if by_horizon:
+        df_combined = df_combined.sort_values('target_time', kind='stable', ignore_index=True)
+    return convert_to_local_time(df_combined, zone_key)
+
+
+#Reading and aligning only the value columns, without building the merged frame
+def build_aligned_arrays(zone_key, horizon, start, end, power_types, include_naive, paths):
+    kinds = ['predicted', 'target', 'naive'][:len(paths)]
+    frames = {}
+    columns = {}
+    for kind, path in zip(kinds, paths):
+        columns[kind] = value_columns(kind, power_types)
+        frames[kind] = load_zone(zone_key, kind, horizon, power_types, start, end, path=path, columns=['target_time'] + columns[kind])
+
+    keys, aligned, unmatched = align_frames(frames, columns)
+
+    arrays = {'target_time': keys, 'unmatched': unmatched}
+    for kind in kinds:
+        arrays[kind] = {power_type: aligned[kind][column] for power_type, column in zip(power_types, columns[kind])}
+
+    # The arrays are shared through the cache, so they are made read-only
+    keys.flags.writeable = False
+    for kind in kinds:
+        for values in arrays[kind].values():
+            values.flags.writeable = False
+    return arrays
+
+
+#Name of the feather file for one key, the fingerprint is the last part so old versions are easy to find
+def cache_path(zone_key, key_hash, fingerprint):
+    return os.path.join(cache_dir, f'{zone_key}_{key_hash}_{fingerprint}.feather')
+
+
+#Loading the merged frame from disk, or building it and saving it for the next run
+def read_or_build(zone_key, horizon, start, end, include_naive, paths, fingerprint, use_disk_cache, daylight=None):
+    if not use_disk_cache:
+        return build_aligned_frame(zone_key, horizon, start, end, include_naive, paths, daylight)
+
+    key_hash = hashlib.sha1(repr((horizon, start, end, include_naive, paths, daylight)).encode()).hexdigest()[:16]
+    path = cache_path(zone_key, key_hash, fingerprint)
+    if os.path.exists(path):
+        return pd.read_feather(path)
+
+    df_combined = build_aligned_frame(zone_key, horizon, start, end, include_naive, paths, daylight)
+
+    # Remove frames built from older versions of the source files
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale_path in glob.glob(cache_path(zone_key, key_hash, '*')):
+        os.remove(stale_path)
+
+    temporary_path = path + '.tmp'
+    df_combined.to_feather(temporary_path)
+    os.replace(temporary_path, path)
+    return df_combined
+
+
+@functools.lru_cache(maxsize=memory_cache_size)
+def cached_frame(zone_key, horizon, start, end, include_naive, paths, fingerprint, use_disk_cache, daylight=None):
+    return read_or_build(zone_key, horizon, start, end, include_naive, paths, fingerprint, use_disk_cache, daylight)
+
+
+#Paths of the predicted, target and optionally naive files of a zone
+def source_paths(zone_key, include_naive, predicted_path=None, target_path=None, naive_path=None):
+    paths = (predicted_path or zone_file(zone_key, 'predicted'), target_path or zone_file(zone_key, 'target'))
+    if include_naive:
+        paths = paths + (naive_path or zone_file(zone_key, 'naive'),)
+    return paths
+
+
+#Returning the merged predicted/target(/naive) frame for a zone, horizon and time window.
+#The frame is built once and then served from memory or from the feather cache until one
+#of the source files changes. Callers get a copy, so adding columns does not touch the cache.
+#daylight=True or False keeps only the daylight or night rows of the zone's daylight index.
+def aligned_frame(zone_key, horizon=24, start=None, end=None, include_naive=False, predicted_path=None, target_path=None, naive_path=None, use_disk_cache=True, daylight=None):
+    paths = source_paths(zone_key, include_naive, predicted_path, target_path, naive_path)
+    if isinstance(horizon, (list, range, set)):
+        horizon = tuple(sorted(horizon))
+
+    fingerprint_paths = paths if daylight is None else paths + (daylight_index_file(zone_key, os.path.dirname(paths[0])),)
+    fingerprint = source_fingerprint(fingerprint_paths)
+    df_combined = cached_frame(zone_key, horizon, start, end, include_naive, paths, fingerprint, use_disk_cache, daylight)
+    return df_combined.copy()
+
+
+@functools.lru_cache(maxsize=memory_cache_size)
+def cached_arrays(zone_key, horizon, start, end, power_types, include_naive, paths, fingerprint):
+    return build_aligned_arrays(zone_key, horizon, start, end, power_types, include_naive, paths)
+
+
+#Returning the aligned values of one horizon as read-only NumPy arrays instead of a merged frame:
+#arrays['target_time'] holds the int64 ms keys, arrays['predicted'|'target'|'naive'][power_type]
+#the values in that order, and arrays['unmatched'][kind] the target_time values without a match.
+def aligned_arrays(zone_key, horizon=24, start=None, end=None, power_types=power_types, include_naive=False, predicted_path=None, target_path=None, naive_path=None):
+    paths = source_paths(zone_key, include_naive, predicted_path, target_path, naive_path)
+    fingerprint = source_fingerprint(paths)
+    return cached_arrays(zone_key, horizon, start, end, tuple(power_types), include_naive, paths, fingerprint)
+
+
+#Emptying the memory cache and optionally deleting the feather files
+def clear_cache(remove_files=False):
+    cached_frame.cache_clear()
+    cached_arrays.cache_clear()
+    if remove_files:
+        for path in glob.glob(os.path.join(cache_dir, '*.feather')):
+            os.remove(path)
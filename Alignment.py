@@ -0,0 +1,78 @@
+import numpy as np
+from LocalTime import to_epoch_ms
+
+# Epoch ms fit in 42 bits until the year 2109, the horizon goes in the bits above
+horizon_shift = 42
+
+
+#Combining horizon and target_time (ms) in one int64 key, for joins over several horizons
+def horizon_time_key(horizon, epoch_ms):
+    return (np.asarray(horizon, dtype=np.int64) << horizon_shift) | np.asarray(epoch_ms, dtype=np.int64)
+
+
+#Splitting keys made by horizon_time_key back into horizon and target_time (ms)
+def key_horizon_and_time(keys):
+    keys = np.asarray(keys, dtype=np.int64)
+    return keys >> horizon_shift, keys & ((1 << horizon_shift) - 1)
+
+
+#Positions of the matching keys in two sorted int64 key arrays (merge join with searchsorted).
+#Keys are unique on each side, as target_time is for one zone and horizon.
+def sorted_merge_join(left_keys, right_keys):
+    if len(right_keys) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    position = np.searchsorted(right_keys, left_keys)
+    clipped = np.minimum(position, len(right_keys) - 1)
+    matched = (position < len(right_keys)) & (right_keys[clipped] == left_keys)
+    return np.flatnonzero(matched), position[matched]
+
+
+#Sorting the keys and their value columns when the input is not already in time order
+def sorted_side(keys, columns):
+    keys = np.asarray(keys, dtype=np.int64)
+    columns = {name: np.asarray(values) for name, values in columns.items()}
+    if len(keys) > 1 and np.any(keys[1:] < keys[:-1]):
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        columns = {name: values[order] for name, values in columns.items()}
+    if len(keys) > 1 and np.any(keys[1:] == keys[:-1]):
+        raise ValueError('target_time is not unique, filter on a single zone and horizon before aligning')
+    return keys, columns
+
+
+#Aligning several sides (e.g. predicted, target and naive) on their int64 keys.
+#sides maps a name to (keys, {column: values}). Returns the keys present on every side, the value
+#columns of each side as contiguous arrays in that key order, and for each side the keys that had no match.
+def align_arrays(sides):
+    prepared = {name: sorted_side(keys, columns) for name, (keys, columns) in sides.items()}
+
+    common_keys = None
+    for keys, _ in prepared.values():
+        if common_keys is None:
+            common_keys = keys
+        else:
+            common_keys = common_keys[sorted_merge_join(common_keys, keys)[0]]
+
+    aligned = {}
+    unmatched = {}
+    for name, (keys, columns) in prepared.items():
+        side_index, _ = sorted_merge_join(keys, common_keys)
+        is_matched = np.zeros(len(keys), dtype=bool)
+        is_matched[side_index] = True
+        aligned[name] = {column: np.ascontiguousarray(values[side_index]) for column, values in columns.items()}
+        unmatched[name] = keys[~is_matched]
+
+    return common_keys, aligned, unmatched
+
+
+#Aligning DataFrames on target_time, taking only the listed value columns of each one.
+#columns maps the same names as frames to the columns to keep. With by_horizon the key is
+#(horizon, target_time), so frames holding several horizons can be aligned in one go.
+def align_frames(frames, columns, by_horizon=False):
+    sides = {}
+    for name, df in frames.items():
+        keys = to_epoch_ms(df['target_time'])
+        if by_horizon:
+            keys = horizon_time_key(df['horizon'].to_numpy(), keys)
+        sides[name] = (keys, {column: df[column].to_numpy() for column in columns[name]})
+    return align_arrays(sides)
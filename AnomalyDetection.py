@@ -0,0 +1,196 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ParquetLoader import power_types
+from LocalTime import local_day_id, day_id_to_timestamp
+from AlignedFrameStore import aligned_arrays
+from Baselines import lagged_values, ms_per_hour
+from Decomposition import decomposition
+from DaylightMask import daytime_rows
+from ZoneRegistry import capacity_at, zone_names
+
+# Folder holding the anomaly table of every zone and the rolling window state of its last run
+anomaly_dir = 'data/anomalies'
+
+# Series checked for anomalies: 'error' is predicted - target, 'resid' the STL residual of the error
+# (see Decomposition), both as a fraction of the installed capacity of the hour. 'resid' is a full-refit
+# series: every run fits STL on the whole error history, see update_anomalies.
+anomaly_series = ['error', 'resid']
+
+# Trailing window of the rolling median and MAD in hours, and the hours with a value it needs
+anomaly_window_hours = 168
+anomaly_min_hours = 48
+
+# An hour is anomalous when it is more than anomaly_threshold robust standard deviations
+# (1.4826 * MAD) from the rolling median. The MAD is at least mad_floor of the capacity, so
+# flat stretches do not make every small error an anomaly.
+anomaly_threshold = 5.0
+mad_floor = 0.001
+
+# A day is anomalous when at least this many of its hours are
+day_anomaly_hours = 3
+
+# Settings saved with the table, a run with other settings rebuilds it
+anomaly_settings = ['horizon', 'window_hours', 'min_hours', 'threshold', 'mad_floor', 'night_rule']
+
+
+#Hourly series of a zone on a gapless UTC grid from first_ms (or the first row) to the last row:
+#target_time (ms) and the error or residual as a fraction of capacity. Missing hours and, for solar,
+#nighttime hours are NaN, so they neither get flagged nor enter the rolling statistics.
+def hourly_values(zone_key, power_type, series, horizon=24, first_ms=None, night_rule='target_zero'):
+    start = None if first_ms is None else pd.Timestamp(first_ms, unit='ms', tz='UTC')
+    arrays = aligned_arrays(zone_key, horizon, start, None, [power_type])
+    epoch_ms = arrays['target_time']
+    if len(epoch_ms) == 0:
+        return epoch_ms, np.empty(0)
+
+    grid = np.arange(epoch_ms[0] if first_ms is None else first_ms, epoch_ms[-1] + ms_per_hour, ms_per_hour, dtype=np.int64)
+    target = lagged_values(grid, epoch_ms, arrays['target'][power_type])
+    if series == 'error':
+        values = lagged_values(grid, epoch_ms, arrays['predicted'][power_type]) - target
+    elif series == 'resid':
+        # The decomposition needs the whole series, only the residuals of the grid hours are kept
+        df_components = decomposition(zone_key, power_type, 'error', [24], 'stl', horizon)
+        resid_ms = df_components.index.as_unit('ms').asi8
+        values = np.where(np.isnan(target), np.nan, lagged_values(grid, resid_ms, df_components['resid'].to_numpy()))
+    else:
+        raise ValueError(f'Unknown anomaly series {series!r}, use one of {anomaly_series}')
+
+    values = values / capacity_at(zone_key, power_type, grid)
+    if power_type == 'solar':
+        values[~daytime_rows(night_rule, np.nan_to_num(target), grid, zone_key)] = np.nan
+    return grid, values
+
+
+#Rolling median, MAD and robust score of every hour over the anomaly_window_hours hours before it.
+#previous_values and previous_deviations are the values and |value - median| of the hours just before
+#values (the state of the last run), so a run on new hours only gives the same result as a full run.
+#pandas computes both rolling medians in one pass each with a sorted window.
+def robust_scores(values, previous_values=None, previous_deviations=None, window_hours=anomaly_window_hours, min_hours=anomaly_min_hours, floor=mad_floor):
+    n_previous = 0 if previous_values is None else len(previous_values)
+    all_values = values if n_previous == 0 else np.concatenate([previous_values, values])
+    median = pd.Series(all_values).rolling(window_hours, min_periods=min_hours).median().shift(1).to_numpy()[n_previous:]
+
+    deviations = np.abs(values - median)
+    all_deviations = deviations if n_previous == 0 else np.concatenate([previous_deviations, deviations])
+    mad = pd.Series(all_deviations).rolling(window_hours, min_periods=min_hours).median().shift(1).to_numpy()[n_previous:]
+
+    with np.errstate(invalid='ignore'):
+        score = (values - median) / (1.4826 * np.maximum(mad, floor))
+    return median, mad, score, deviations
+
+
+#Anomalous hours of one series as rows of the anomaly table
+def anomaly_rows(power_type, series, epoch_ms, values, median, mad, score, threshold=anomaly_threshold):
+    with np.errstate(invalid='ignore'):
+        anomalous = np.abs(score) > threshold
+    return pd.DataFrame({
+        'power_type': power_type,
+        'series': series,
+        'target_time': epoch_ms[anomalous],
+        'value': values[anomalous],
+        'median': median[anomalous],
+        'mad': mad[anomalous],
+        'score': score[anomalous],
+    })
+
+
+#Anomalous hours of a zone for every power type and series, computed over the whole files
+def detect_anomalies(zone_key, power_types=power_types, series=anomaly_series, horizon=24, threshold=anomaly_threshold, night_rule='target_zero'):
+    frames = []
+    for power_type in power_types:
+        for name in series:
+            epoch_ms, values = hourly_values(zone_key, power_type, name, horizon, night_rule=night_rule)
+            median, mad, score, _ = robust_scores(values)
+            frames.append(anomaly_rows(power_type, name, epoch_ms, values, median, mad, score, threshold))
+    return pd.concat(frames, ignore_index=True)
+
+
+def anomaly_path(zone_key, kind, anomaly_dir=anomaly_dir):
+    suffix = '' if kind == 'table' else '_state'
+    return os.path.join(anomaly_dir, f'{zone_key}{suffix}.parquet')
+
+
+#Reading the anomaly table or window state of a zone and its settings, (None, {}) if there is none
+def read_anomalies(zone_key, kind='table', anomaly_dir=anomaly_dir):
+    path = anomaly_path(zone_key, kind, anomaly_dir)
+    if not os.path.exists(path):
+        return None, {}
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    settings = {name: metadata[name.encode()].decode() for name in anomaly_settings if name.encode() in metadata}
+    return table.to_pandas(), settings
+
+
+#Writing through a temporary file, so a failed run leaves the old files intact
+def write_anomalies(df, settings, zone_key, kind='table', anomaly_dir=anomaly_dir):
+    os.makedirs(anomaly_dir, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {name.encode(): str(value).encode() for name, value in settings.items()}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    path = anomaly_path(zone_key, kind, anomaly_dir)
+    temporary_path = path + '.tmp'
+    pq.write_table(table, temporary_path)
+    os.replace(temporary_path, path)
+
+
+#Checking the hours added since the last run of a zone and appending their anomalies to its table.
+#The state keeps the last anomaly_window_hours values and deviations of every power type and series,
+#so only new hours are scored. For 'error' only the new rows are read and the table is the same as
+#detect_anomalies on the whole files. 'resid' is not incremental: the STL fit of the whole error history
+#is redone on every run, and the residuals (and anomalies) of earlier hours are not revised when the fit
+#changes with the new data, so its table can differ from a full run. Returns the number of new hours checked.
+def update_anomalies(zone_key, power_types=power_types, series=anomaly_series, horizon=24, threshold=anomaly_threshold, night_rule='target_zero', anomaly_dir=anomaly_dir):
+    settings = {'horizon': horizon, 'window_hours': anomaly_window_hours, 'min_hours': anomaly_min_hours, 'threshold': threshold, 'mad_floor': mad_floor, 'night_rule': night_rule}
+    stored, stored_settings = read_anomalies(zone_key, 'table', anomaly_dir)
+    state, _ = read_anomalies(zone_key, 'state', anomaly_dir)
+    if stored is None or state is None or stored_settings != {name: str(value) for name, value in settings.items()}:
+        stored, state = None, None
+
+    tables = [] if stored is None else [stored]
+    states = []
+    hours_checked = 0
+    for power_type in power_types:
+        for name in series:
+            previous = None if state is None else state[(state['power_type'] == power_type) & (state['series'] == name)]
+            if previous is not None and len(previous):
+                first_ms = int(previous['target_time'].iloc[-1]) + ms_per_hour
+                previous_values, previous_deviations = previous['value'].to_numpy(), previous['deviation'].to_numpy()
+            else:
+                first_ms, previous, previous_values, previous_deviations = None, None, None, None
+
+            epoch_ms, values = hourly_values(zone_key, power_type, name, horizon, first_ms, night_rule)
+            median, mad, score, deviations = robust_scores(values, previous_values, previous_deviations)
+            tables.append(anomaly_rows(power_type, name, epoch_ms, values, median, mad, score, threshold))
+            hours_checked += len(epoch_ms)
+
+            window = pd.DataFrame({'power_type': power_type, 'series': name, 'target_time': epoch_ms, 'value': values, 'deviation': deviations})
+            if previous is not None:
+                window = pd.concat([previous, window], ignore_index=True)
+            states.append(window.iloc[-anomaly_window_hours:])
+
+    df_table = pd.concat(tables, ignore_index=True).sort_values(['power_type', 'series', 'target_time'], ignore_index=True)
+    write_anomalies(df_table, settings, zone_key, 'table', anomaly_dir)
+    write_anomalies(pd.concat(states, ignore_index=True), settings, zone_key, 'state', anomaly_dir)
+    return hours_checked
+
+
+#Days of the anomaly table with at least min_hours anomalous hours, per power type and series,
+#with the number of anomalous hours and the largest absolute score of the local day
+def anomalous_days(df_table, zone_key, min_hours=day_anomaly_hours):
+    day_ids = local_day_id(df_table['target_time'].to_numpy(dtype=np.int64), zone_key)
+    df_days = df_table.assign(day_id=day_ids, abs_score=df_table['score'].abs())
+    df_days = df_days.groupby(['power_type', 'series', 'day_id'], as_index=False).agg(anomalous_hours=('score', 'size'), max_abs_score=('abs_score', 'max'))
+    df_days = df_days[df_days['anomalous_hours'] >= min_hours]
+    df_days.insert(2, 'day', day_id_to_timestamp(df_days.pop('day_id').to_numpy(), zone_key))
+    return df_days.reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    for zone_key in zone_names:
+        hours = update_anomalies(zone_key)
+        df_table, _ = read_anomalies(zone_key)
+        print(f"{zone_key}: checked {hours} new hours, {len(df_table)} anomalous hours in {anomaly_path(zone_key, 'table')}")
+        print(anomalous_days(df_table, zone_key).to_string())
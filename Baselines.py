@@ -0,0 +1,114 @@
+import functools
+import numpy as np
+from ParquetLoader import load_zone, zone_file, value_columns, power_types, naive_lag
+from LocalTime import to_epoch_ms
+from Alignment import sorted_merge_join
+from AlignedFrameStore import source_fingerprint
+
+ms_per_hour = 3_600_000
+
+# Number of target histories and baseline series kept in memory
+memory_cache_size = 64
+
+# Benchmark forecasts the model is compared with: name -> (kind, season in hours).
+# A generated baseline only uses target values that are known when the forecast is issued, horizon hours
+# before the target time. 'persistence' is the last known value (lag = horizon), 'seasonal' the same hour
+# of the latest known season (lag = season * ceil(horizon / season)) and 'climatology' the mean of the
+# same hour over the last climatology_days known days. 'file' is the forecast of the given lag in hours
+# stored in the zone's naive forecast dataset (see NaiveModel).
+baselines = {
+    'persistence': ('persistence', None),
+    'persistence_24h': ('seasonal', 24),
+    'persistence_168h': ('seasonal', 168),
+    'climatology': ('climatology', 24),
+    'naive_file': ('file', naive_lag),
+}
+
+climatology_days = 30
+
+
+#Lag in hours of a generated baseline at a horizon, the shortest one that only uses known values
+def baseline_lag_hours(name, horizon):
+    kind, season = baselines[name]
+    if kind == 'persistence':
+        return horizon
+    return season * -(-horizon // season)
+
+
+#Values of a series at epoch_ms - lag_ms, looked up by timestamp, NaN where the series has no value
+def lagged_values(epoch_ms, history_ms, history_values, lag_ms=0):
+    values = np.full(len(epoch_ms), np.nan)
+    found, position = sorted_merge_join(np.asarray(epoch_ms, dtype=np.int64) - lag_ms, history_ms)
+    values[found] = history_values[position]
+    return values
+
+
+#Mean of the values at the same hour on days first_day to first_day + days - 1 before, NaN when none has a value
+def climatology_values(epoch_ms, history_ms, history_values, first_day, days=climatology_days):
+    total = np.zeros(len(epoch_ms))
+    count = np.zeros(len(epoch_ms))
+    for day in range(first_day, first_day + days):
+        values = lagged_values(epoch_ms, history_ms, history_values, day * 24 * ms_per_hour)
+        has_value = ~np.isnan(values)
+        total[has_value] += values[has_value]
+        count += has_value
+    with np.errstate(invalid='ignore'):
+        return np.where(count > 0, total / count, np.nan)
+
+
+#One value per target_time of a zone file for every power type: sorted target_time (ms) and {power_type: values}.
+#The target and naive files repeat every hour for each horizon with the same values, an hour has a value
+#when any of its rows has one. lag selects the naive forecast columns. Cached in memory per file state,
+#fingerprint changes when the file does.
+@functools.lru_cache(maxsize=memory_cache_size)
+def cached_history(zone_key, kind, path, fingerprint, lag=naive_lag):
+    columns = value_columns(kind, power_types, lag)
+    df = load_zone(zone_key, kind, None, path=path, columns=['target_time'] + columns)
+    epoch_ms, position = np.unique(to_epoch_ms(df['target_time']), return_inverse=True)
+
+    values = {}
+    for power_type, column in zip(power_types, columns):
+        column_values = df[column].to_numpy(dtype=float)
+        known = ~np.isnan(column_values)
+        values[power_type] = np.full(len(epoch_ms), np.nan)
+        values[power_type][position[known]] = column_values[known]
+    return epoch_ms, values
+
+
+#A baseline at one horizon for every target_time of the zone's target history, generated with lookups
+#into the cached target arrays and memoized, so later calls for the same zone, baseline and horizon are lookups only
+@functools.lru_cache(maxsize=memory_cache_size)
+def cached_baseline(zone_key, name, horizon, path, fingerprint):
+    history_ms, history_values = cached_history(zone_key, 'target', path, fingerprint)
+    kind, _ = baselines[name]
+    lag_hours = baseline_lag_hours(name, horizon)
+    if kind == 'climatology':
+        forecast = {power_type: climatology_values(history_ms, history_ms, values, lag_hours // 24) for power_type, values in history_values.items()}
+    else:
+        forecast = {power_type: lagged_values(history_ms, history_ms, values, lag_hours * ms_per_hour) for power_type, values in history_values.items()}
+    return history_ms, forecast
+
+
+#Baseline series of a zone at one horizon: target_time (ms) and {power_type: forecast}
+def baseline_series(zone_key, name, horizon=24, target_path=None, naive_path=None):
+    if baselines[name][0] == 'file':
+        path = naive_path or zone_file(zone_key, 'naive')
+        return cached_history(zone_key, 'naive', path, source_fingerprint([path]), baselines[name][1])
+    path = target_path or zone_file(zone_key, 'target')
+    return cached_baseline(zone_key, name, int(horizon), path, source_fingerprint([path]))
+
+
+#Forecasts of several baselines for target times epoch_ms: {name: {power_type: values}}.
+#horizons is one horizon or the horizon of every row, rows of each horizon get the baseline of that horizon.
+def baseline_forecasts(zone_key, names, epoch_ms, horizons=24, power_types=power_types, target_path=None, naive_path=None):
+    epoch_ms = np.asarray(epoch_ms, dtype=np.int64)
+    horizons = np.broadcast_to(np.asarray(horizons, dtype=np.int64), epoch_ms.shape)
+
+    forecasts = {name: {power_type: np.full(len(epoch_ms), np.nan) for power_type in power_types} for name in names}
+    for horizon in np.unique(horizons):
+        rows = horizons == horizon
+        for name in names:
+            series_ms, series_values = baseline_series(zone_key, name, horizon, target_path, naive_path)
+            for power_type in power_types:
+                forecasts[name][power_type][rows] = lagged_values(epoch_ms[rows], series_ms, series_values[power_type])
+    return forecasts
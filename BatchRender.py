@@ -0,0 +1,139 @@
+import json
+import os
+import time
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import pandas as pd
+from ParquetLoader import power_types
+from DailyMetrics import metric_statistics
+from MultiHorizon import evaluate_horizons, metric_cube
+from ParallelRunner import default_workers, horizon_batches, zone_pool
+from ZoneRegistry import zone_names
+
+# Folder the figures and their manifest are written to, and the image formats written for every figure
+render_dir = 'reports/figures'
+render_formats = ['png']
+
+figure_size = (12, 6)
+
+# Figures kept open in this process, keyed by number of lines. A figure is drawn once with empty lines
+# and every render only replaces the line data, labels and title before saving.
+figure_pool = {}
+
+
+#Figure, axes and lines of the pool for n_lines series, created on first use
+def pooled_figure(n_lines):
+    if n_lines not in figure_pool:
+        figure, axes = plt.subplots(figsize=figure_size, layout='constrained')
+        lines = [axes.plot([], [], linestyle='-', marker='o')[0] for _ in range(n_lines)]
+        axes.xaxis_date()
+        axes.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+        axes.set_xlabel('Date')
+        axes.grid(True)
+        figure_pool[n_lines] = (figure, axes, lines)
+    return figure_pool[n_lines]
+
+
+#Saving one figure of daily values, series maps a legend label to the values of every day.
+#Returns the paths written, one per format.
+def render_figure(path_stem, days, series, title, ylabel, formats=render_formats):
+    figure, axes, lines = pooled_figure(len(series))
+    x = mdates.date2num(pd.DatetimeIndex(days).tz_localize(None).to_numpy())
+    for line, (label, values) in zip(lines, series.items()):
+        line.set_data(x, values)
+        line.set_label(label)
+    axes.relim()
+    axes.autoscale_view()
+    axes.set_title(title)
+    axes.set_ylabel(ylabel)
+    axes.legend(loc='upper right')
+
+    paths = []
+    for image_format in formats:
+        path = f'{path_stem}.{image_format}'
+        figure.savefig(path, format=image_format)
+        paths.append(path)
+    return paths
+
+
+#Work done in a worker process: the metrics of one zone for a batch of horizons are computed in one
+#pass (see MultiHorizon) and one figure per (metric, horizon) is rendered with the pooled figures.
+#Returns the manifest entries of the figures.
+def render_task(task):
+    zone_key = task['zone_key']
+    table = evaluate_horizons(zone_key, task['horizons'], task['start'], task['end'], task['metrics'], task['power_types'], night_rule=task['night_rule'])
+    cubes = {power_type: metric_cube(table, power_type) for power_type in task['power_types']}
+
+    entries = []
+    for metric in task['metrics']:
+        for horizon in task['horizons']:
+            start = time.perf_counter()
+            series = {}
+            for power_type, (cube, horizons, cube_days, metrics) in cubes.items():
+                if metric not in metrics or horizon not in horizons:
+                    continue
+                series[power_type] = pd.Series(cube[list(horizons).index(horizon), :, metrics.index(metric)], index=cube_days)
+            if not series:
+                continue
+
+            # Power types can have different days (e.g. no daytime solar hours), the lines share the days of all of them
+            df_series = pd.DataFrame(series)
+            days = df_series.index
+            lines = {f'{metric} for {power_type}': df_series[power_type].to_numpy() for power_type in df_series.columns}
+
+            path_stem = os.path.join(task['output_dir'], f'{zone_key}_{metric}_h{horizon:02d}')
+            title = f'Daily {metric} for {zone_names[zone_key]} - horizon {horizon}h'
+            files = render_figure(path_stem, days, lines, title, metric, task['formats'])
+            entries.append({
+                'zone': zone_key,
+                'metric': metric,
+                'horizon': int(horizon),
+                'power_types': list(df_series.columns),
+                'first_day': str(days[0].date()),
+                'last_day': str(days[-1].date()),
+                'files': files,
+                'seconds': time.perf_counter() - start,
+            })
+    return entries
+
+
+#Rendering the daily metric figures of every zone x metric x horizon without a display, in a process
+#pool of workers processes with one task per zone and batch of horizons_per_task horizons (see
+#ParallelRunner). Writes the figures and manifest.json to output_dir and returns the manifest path.
+def render_batch(zones=None, metrics=list(metric_statistics), horizons=[24], start=None, end=None, power_types=power_types, output_dir=render_dir, formats=render_formats, workers=None, horizons_per_task=None, night_rule='target_zero'):
+    zones = zones or list(zone_names)
+    workers = workers or default_workers
+    os.makedirs(output_dir, exist_ok=True)
+
+    tasks = [
+        {'zone_key': zone_key, 'horizons': batch, 'start': start, 'end': end, 'metrics': list(metrics), 'power_types': list(power_types),
+         'night_rule': night_rule, 'output_dir': output_dir, 'formats': list(formats)}
+        for zone_key in zones for batch in horizon_batches(horizons, horizons_per_task)
+    ]
+
+    started = time.perf_counter()
+    if workers == 1 or len(tasks) == 1:
+        results = [render_task(task) for task in tasks]
+    else:
+        with zone_pool(min(workers, len(tasks)), zones) as pool:
+            results = list(pool.map(render_task, tasks))
+
+    manifest = {
+        'created': pd.Timestamp.now(tz='UTC').isoformat(),
+        'seconds': time.perf_counter() - started,
+        'config': {'zones': zones, 'metrics': list(metrics), 'horizons': list(horizons), 'start': start, 'end': end,
+                   'power_types': list(power_types), 'formats': list(formats), 'night_rule': night_rule},
+        'figures': [entry for entries in results for entry in entries],
+    }
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest_path
+
+
+#call the function, under __main__ so worker processes can import this module
+if __name__ == "__main__":
+    manifest_path = render_batch(horizons=[12, 24], start='2024-01-01', end='2024-01-31', formats=['png', 'svg'])
+    print(f"Saved figures and manifest to {manifest_path}")
@@ -0,0 +1,222 @@
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy.signal import lfilter
+import MetricsallZones
+from ParquetLoader import load_zone, power_types
+from AlignedFrameStore import aligned_frame, clear_cache
+from DailyMetrics import metric_statistics
+from ZoneRegistry import register_zone
+
+# Folder of the synthetic zone files and folder of the saved benchmark results
+benchmark_data_dir = 'data/benchmark'
+benchmark_results_dir = 'benchmarks'
+
+# Size of the synthetic data: zones x years of hourly target times x horizons
+benchmark_zones = 4
+benchmark_years = 1
+benchmark_horizons = [12, 24]
+benchmark_start = '2023-01-01'
+
+# Metrics of MetricsallZones that are timed one by one
+benchmark_metrics = list(metric_statistics) + ['spearman', 'mrae']
+
+# Synthetic zones get these timezones and centres in turn
+synthetic_sites = [
+    ('America/Los_Angeles', (36.7783, -119.4179)),
+    ('America/Chicago', (31.9686, -99.9018)),
+    ('America/New_York', (42.1657, -74.9481)),
+    ('America/Denver', (39.5501, -105.7821)),
+]
+
+ms_per_hour = 3_600_000
+
+
+#Hourly wind and solar production of one synthetic zone: a daily solar curve that is zero at night
+#and a wind series that follows an hourly AR(1) process around a daily cycle, both in MW
+def synthetic_production(epoch_ms, longitude, capacity_mw, rng):
+    solar_hour = (epoch_ms / ms_per_hour + longitude / 15) % 24
+    day_of_year = (epoch_ms // (24 * ms_per_hour)) % 365
+    season = 0.75 + 0.25 * np.cos(2 * np.pi * (day_of_year - 172) / 365)
+    solar = np.clip(np.sin((solar_hour - 6) / 12 * np.pi), 0, None) * season * capacity_mw['solar'] * rng.uniform(0.5, 0.8, len(epoch_ms))
+
+    weather = lfilter([1.0], [1.0, -0.97], rng.normal(0, 0.03, len(epoch_ms)))
+    wind = np.clip(0.35 + weather + 0.1 * np.sin(2 * np.pi * solar_hour / 24), 0.02, 0.95) * capacity_mw['wind']
+    return {'wind': wind.round(), 'solar': solar.round()}
+
+
+#Writing one file of a synthetic zone with the schema of the real files: zone_key, target_time (ms),
+#horizon and one column per power type, sorted by target_time and horizon
+def write_zone_file(path, zone_key, epoch_ms, horizons, columns):
+    table = pa.table({
+        'zone_key': pa.array(np.full(len(epoch_ms) * len(horizons), zone_key)),
+        'target_time': pa.array(np.repeat(epoch_ms, len(horizons)), type=pa.int64()),
+        'horizon': pa.array(np.tile(np.asarray(horizons, dtype=np.int64), len(epoch_ms))),
+        **{column: pa.array(values) for column, values in columns.items()},
+    })
+    pq.write_table(table, path, row_group_size=24 * 14 * len(horizons))
+
+
+#Writing the predicted, target and naive files of one synthetic zone and adding it to the zone registry.
+#The predicted values are the target plus noise that grows with the horizon, the naive values the target
+#of the same hour one day earlier, and a few target hours are missing like in the real files.
+#Returns the paths of the files.
+def generate_zone(zone_key, years=benchmark_years, horizons=benchmark_horizons, start=benchmark_start, data_dir=benchmark_data_dir, seed=0):
+    rng = np.random.default_rng(seed)
+    timezone, location = synthetic_sites[seed % len(synthetic_sites)]
+    capacity_mw = {'wind': float(rng.integers(5000, 40000)), 'solar': float(rng.integers(5000, 30000))}
+
+    first_ms = pd.Timestamp(start, tz='UTC').value // 1_000_000
+    epoch_ms = first_ms + np.arange(int(years * 365 * 24), dtype=np.int64) * ms_per_hour
+    target = synthetic_production(epoch_ms, location[1], capacity_mw, rng)
+    n_rows = len(epoch_ms) * len(horizons)
+    for values in target.values():
+        values[rng.choice(len(values), len(values) // 500, replace=False)] = np.nan
+
+    files = {kind: os.path.join(data_dir, f'{zone_key}_{kind}.parquet') for kind in ['predicted', 'target', 'naive']}
+    os.makedirs(data_dir, exist_ok=True)
+    noise_scale = np.tile(np.asarray(horizons, dtype=float) / max(horizons), len(epoch_ms))
+    write_zone_file(files['target'], zone_key, epoch_ms, horizons, {f'power_production_{power_type}_avg': np.repeat(target[power_type], len(horizons)) for power_type in power_types})
+    write_zone_file(files['predicted'], zone_key, epoch_ms, horizons, {
+        f'power_production_{power_type}_avg': np.clip(np.repeat(target[power_type], len(horizons)) + rng.normal(0, 0.05, n_rows) * noise_scale * capacity_mw[power_type], 0, None)
+        for power_type in power_types
+    })
+    write_zone_file(files['naive'], zone_key, epoch_ms, horizons, {
+        f'naive_forecast_{power_type}_24h': np.repeat(np.concatenate([np.full(24, np.nan), target[power_type][:-24]]), len(horizons))
+        for power_type in power_types
+    })
+
+    register_zone(zone_key, timezone, location, capacity_mw, name=f'Synthetic zone {zone_key}', files=files)
+    return files
+
+
+#Synthetic zones SYN-000, SYN-001, ... keyed by zone, each with its own seed
+def generate_zones(n_zones=benchmark_zones, years=benchmark_years, horizons=benchmark_horizons, start=benchmark_start, data_dir=benchmark_data_dir):
+    return {f'SYN-{i:03d}': generate_zone(f'SYN-{i:03d}', years, horizons, start, data_dir, seed=i) for i in range(n_zones)}
+
+
+#Running function(*args) once, timed with perf_counter and with its peak Python memory from tracemalloc.
+#tracemalloc sees the numpy and pandas buffers allocated in Python, not the ones allocated inside Arrow.
+def measure(stage, zone_key, function, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {'stage': stage, 'zone': zone_key, 'seconds': seconds, 'peak_mb': peak / 2**20}
+
+
+#Drawing a daily metric frame the way visualize_daily_metric_all_zones does and rendering it off screen
+def render_metric(df_metric, metric_type):
+    figure = plt.figure(figsize=(12, 6))
+    for power_type in power_types:
+        column = f'{metric_type}_{power_type}'
+        if column in df_metric.columns:
+            plt.plot(df_metric.index, df_metric[column], linestyle='-', marker='o', label=f'Daily {metric_type} for {power_type}')
+    plt.title(f'Daily {metric_type}')
+    plt.grid(True)
+    plt.legend(loc='upper right')
+    plt.tight_layout()
+    figure.savefig(io.BytesIO(), format='png')
+    plt.close(figure)
+
+
+#Timing the stages of a metric run for every zone: loading the files, aligning them, every metric of
+#MetricsallZones on the aligned frame and plotting. The aligned frame caches in memory and on disk are
+#cleared for every zone, so loading and alignment are measured cold and each metric measures only its
+#own computation on the aligned frame cached by the alignment stage. Like MetricsallZones, horizon 24 is used.
+def run_benchmark(zone_files, metrics=benchmark_metrics, start=None, end=None):
+    records = []
+    # The window of MetricsallZones is set for the run and restored afterwards
+    window = MetricsallZones.window_start, MetricsallZones.window_end
+    MetricsallZones.window_start = start
+    MetricsallZones.window_end = end
+    try:
+        # One untimed run on the first zone, so first-call costs (lazy imports, timezone data) are not measured
+        files = next(iter(zone_files.values()))
+        for metric_type in metrics:
+            MetricsallZones.metric(files['predicted'], files['target'], metric_type)
+
+        for zone_key, files in zone_files.items():
+            clear_cache(remove_files=True)
+            _, record = measure('load', zone_key, lambda: [load_zone(zone_key, kind, 24, start=start, end=end, path=files[kind]) for kind in ['predicted', 'target']])
+            records.append(record)
+            _, record = measure('align', zone_key, aligned_frame, zone_key, 24, start, end, predicted_path=files['predicted'], target_path=files['target'])
+            records.append(record)
+
+            for metric_type in metrics:
+                df_metric, record = measure(f'metric:{metric_type}', zone_key, MetricsallZones.metric, files['predicted'], files['target'], metric_type)
+                records.append(record)
+                _, record = measure(f'plot:{metric_type}', zone_key, render_metric, df_metric, metric_type)
+                records.append(record)
+    finally:
+        MetricsallZones.window_start, MetricsallZones.window_end = window
+
+    clear_cache()
+    return pd.DataFrame(records)
+
+
+#Commit of the working tree, None outside a git checkout
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+#Saving the records with the data size, library versions and commit, so runs of different versions can be compared
+def save_results(records, config, label=None, results_dir=benchmark_results_dir):
+    commit = git_commit()
+    label = label or commit or time.strftime('%Y%m%d-%H%M%S')
+    result = {
+        'label': label,
+        'commit': commit,
+        'created': pd.Timestamp.now(tz='UTC').isoformat(),
+        'config': config,
+        'versions': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__, 'pyarrow': pa.__version__},
+        'records': records.to_dict(orient='records'),
+    }
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f'{label}.json')
+    with open(path, 'w') as file:
+        json.dump(result, file, indent=2)
+    return path
+
+
+#Median seconds and peak memory of every stage over the zones of a saved result
+def stage_summary(path):
+    with open(path) as file:
+        records = pd.DataFrame(json.load(file)['records'])
+    return records.groupby('stage', sort=False)[['seconds', 'peak_mb']].median()
+
+
+#Comparing two saved results stage by stage, ratio above 1 means the new version is slower or uses more memory
+def compare_results(old_path, new_path):
+    old = stage_summary(old_path)
+    new = stage_summary(new_path)
+    comparison = old.join(new, lsuffix='_old', rsuffix='_new', how='outer')
+    comparison['seconds_ratio'] = comparison['seconds_new'] / comparison['seconds_old']
+    comparison['peak_mb_ratio'] = comparison['peak_mb_new'] / comparison['peak_mb_old']
+    return comparison
+
+
+if __name__ == "__main__":
+    # Figures are only rendered into memory, no window is needed
+    matplotlib.use('Agg')
+    zone_files = generate_zones()
+    records = run_benchmark(zone_files)
+    config = {'zones': benchmark_zones, 'years': benchmark_years, 'horizons': benchmark_horizons, 'start': benchmark_start, 'metrics': benchmark_metrics}
+    path = save_results(records, config)
+    print(records.groupby('stage', sort=False)[['seconds', 'peak_mb']].median().round(4).to_string())
+    print(f"Saved benchmark results to {path}")
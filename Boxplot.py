@@ -1,31 +1,25 @@
 import matplotlib.pyplot as plt
-import pyarrow.parquet as pq
+from ZoneRegistry import zone_names
+from ParquetLoader import zone_from_path
+from DistributionSummary import summarize_zone, box_stats
 
 target_files = [
     'data/target_and_predicted/US-CAL-CISO_target.parquet',
     'data/target_and_predicted/US-TEX-ERCO_target.parquet',
 ]
 
-zone_capacity_mw = {
-    'US-CAL-CISO': {'solar': 19700, 'wind': 6030},
-    'US-TEX-ERCO': {'solar': 13500, 'wind': 37000},
-}
-
+#Boxes of the wind and solar target values of every zone, in MW (not normalized) and with the night hours.
+#The quartiles and whiskers come from the streaming summaries of DistributionSummary, so no column is
+#kept in memory.
 def split_solar_wind(list_files):
     list = []
     
     for file in list_files:
-        zone = file.split('/')[-1].split('_')[0] 
-        table = pq.read_table(file)
-        df_target = table.to_pandas()
-        
-        #df_target_wind = df_target["power_production_wind_avg"].values / zone_capacity_mw[zone]['wind']
-        df_target_wind = df_target["power_production_wind_avg"].values # not normalized
-        df_target_solar = df_target["power_production_solar_avg"].values # with night hours and not normalized
-        #df_target_solar = df_target[df_target["power_production_solar_avg"] != 0]["power_production_solar_avg"].values / zone_capacity_mw[zone]['solar'] #with night hours excluded
-        
-        list.append(df_target_wind)
-        list.append(df_target_solar)
+        zone = zone_from_path(file)
+        summaries = summarize_zone(zone, kinds=['target'], exclude_night=False, target_path=file)
+
+        list.append(box_stats(summaries[('target', 'wind')]))
+        list.append(box_stats(summaries[('target', 'solar')]))
     
     return list
 
@@ -40,11 +34,12 @@ for i in range(len(target_values_list)):
     # Calculate position for the boxplot
     position = i * 1.5 + 1
         
-    # Create the boxplot
-    plt.boxplot(target_values_list[i], positions=[position])
+    # Create the boxplot from the precomputed box
+    plt.gca().bxp([target_values_list[i]], positions=[position], showfliers=False)
 
 # Set x-axis labels and title
-plt.xticks([i * 1.5 + 1 for i in range(len(target_files) * 2)], ['Wind (California)', 'Solar (California)', 'Wind (Texas)', 'Solar (Texas)'])
+zones = [zone_names[file.split('/')[-1].split('_')[0]] for file in target_files]
+plt.xticks([i * 1.5 + 1 for i in range(len(target_files) * 2)], [f'{power_type} ({zone})' for zone in zones for power_type in ['Wind', 'Solar']])
 plt.xlabel('Forecast models')
 plt.ylabel('MWh')
 plt.title('Boxplot of target values for the four forecast models (with nighthours included)')
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from ParquetLoader import power_types
+from MultiHorizon import horizon_metric_arrays, horizon_metric_table
+
+# Metrics compared across capacities, every capacity-normalized metric is its MW statistic / capacity
+sensitivity_metrics = ['nmae', 'nrmse', 'nmbe']
+
+
+#Scale factors of a capacity uncertainty band, e.g. 0.1 gives 90% to 110% of the registry capacity
+def capacity_band(fraction, steps=5):
+    return np.linspace(1 - fraction, 1 + fraction, steps)
+
+
+#Daily metrics of a zone for many candidate capacities from a single read, alignment and grouped
+#aggregation of the errors. The normalized metrics are linear in 1 / capacity, so the statistics are
+#computed once and every candidate is one division of the whole result.
+#capacities maps a power type to candidate capacities in MW. scale_factors instead multiply the
+#registry capacity of every hour (see capacity_band), which keeps capacity changes within the window.
+#Repeated candidates are evaluated once. Returns the tidy table of evaluate_horizons with a capacity_mw
+#or capacity_scale column.
+def capacity_sensitivity(zone_key, capacities=None, scale_factors=None, horizons=[24], start=None, end=None, metrics=sensitivity_metrics, power_types=power_types, night_rule='target_zero', predicted_path=None, target_path=None):
+    if (capacities is None) == (scale_factors is None):
+        raise ValueError('Give either capacities or scale_factors')
+
+    if capacities is not None:
+        # Statistics in MW, divided by the candidate capacities below
+        power_types = [power_type for power_type in power_types if power_type in capacities]
+        column = 'capacity_mw'
+        candidates = {power_type: np.unique(np.asarray(capacities[power_type], dtype=float)) for power_type in power_types}
+        base_capacity = dict.fromkeys(power_types, 1.0)
+    else:
+        # Statistics normalized by the registry capacity of each hour, divided by the scale factors below
+        column = 'capacity_scale'
+        candidates = dict.fromkeys(power_types, np.unique(np.asarray(scale_factors, dtype=float)))
+        base_capacity = None
+
+    metric_arrays = horizon_metric_arrays(zone_key, horizons, start, end, metrics, power_types, base_capacity, predicted_path, target_path, night_rule)
+    table = horizon_metric_table(zone_key, metric_arrays)
+
+    # One copy of the rows of each power type per candidate
+    frames = []
+    for power_type, values in candidates.items():
+        rows = table[table['power_type'] == power_type]
+        frame = rows.loc[rows.index.repeat(len(values))].reset_index(drop=True)
+        frame.insert(len(frame.columns) - 1, column, np.tile(values, len(rows)))
+        frame['value'] = frame['value'].to_numpy() / frame[column].to_numpy()
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+#Turning the sensitivity table of one metric into a day x candidate frame per power type and horizon
+def sensitivity_wide(surface, metric):
+    column = 'capacity_mw' if 'capacity_mw' in surface.columns else 'capacity_scale'
+    selected = surface[surface['metric'] == metric]
+    return selected.pivot_table(index='day', columns=['power_type', 'horizon', column], values='value', sort=True)
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+from LocalTime import day_id_to_timestamp, local_day_id, to_epoch_ms
+from DaylightMask import daytime_rows
+from ZoneRegistry import capacity_at
+
+power_types = ['wind', 'solar']
+
+# Daily statistic of the error behind each metric, every metric is the statistic divided by the capacity
+metric_statistics = {
+    'nmae': 'mean_abs',
+    'nrmse': 'root_mean_square',
+    'nrmdse': 'root_median_square',
+    'nmbe': 'mean',
+    'nsde': 'std',
+}
+
+# Metrics that skip solar hours with zero target production (nighttime), as in MetricsallZones
+night_excluded_metrics = ['nmae', 'nrmdse', 'nmbe', 'nsde']
+
+
+#Median of values within each group, found by sorting once on (group, value) instead of one sort per group
+def grouped_median(group_codes, values, n_groups):
+    order = np.lexsort((values, group_codes))
+    sorted_values = values[order]
+    count = np.bincount(group_codes, minlength=n_groups)
+    start = np.cumsum(count) - count
+
+    median = np.full(n_groups, np.nan)
+    has_rows = count > 0
+    lower = start[has_rows] + (count[has_rows] - 1) // 2
+    upper = start[has_rows] + count[has_rows] // 2
+    median[has_rows] = (sorted_values[lower] + sorted_values[upper]) / 2
+    return median
+
+
+#Calculating every daily statistic of the error in one pass over the rows.
+#group_codes go from 0 to n_groups - 1, rows with a NaN error are skipped like resample('D') does.
+def grouped_error_statistics(group_codes, error, n_groups):
+    valid = ~np.isnan(error)
+    group_codes = group_codes[valid]
+    error = error[valid]
+    squared_error = error ** 2
+
+    count = np.bincount(group_codes, minlength=n_groups)
+    sum_error = np.bincount(group_codes, weights=error, minlength=n_groups)
+    sum_abs_error = np.bincount(group_codes, weights=np.abs(error), minlength=n_groups)
+    sum_squared_error = np.bincount(group_codes, weights=squared_error, minlength=n_groups)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sum_error / count
+        # Deviations from the daily mean, same sample std (ddof=1) as pandas
+        deviation = error - mean[group_codes]
+        sum_squared_deviation = np.bincount(group_codes, weights=deviation ** 2, minlength=n_groups)
+        std = np.sqrt(sum_squared_deviation / (count - 1))
+        std[count < 2] = np.nan
+        median_square = grouped_median(group_codes, squared_error, n_groups)
+
+        statistics = {
+            'count': count,
+            'mean': mean,
+            'mean_abs': sum_abs_error / count,
+            'root_mean_square': np.sqrt(sum_squared_error / count),
+            'root_median_square': np.sqrt(median_square),
+            'std': std,
+            # Sums behind the statistics, kept so daily results can be rolled up (see IncrementalMetrics)
+            'sum': sum_error,
+            'sum_abs': sum_abs_error,
+            'sum_square': sum_squared_error,
+            'sum_squared_deviation': sum_squared_deviation,
+            'median_square': median_square,
+        }
+    return statistics
+
+
+#target_time of a merged frame in ms, from the index when split_horizon made it the index
+def frame_epoch_ms(df_combined):
+    times = df_combined.index if isinstance(df_combined.index, pd.DatetimeIndex) else df_combined['target_time']
+    return to_epoch_ms(times)
+
+
+#Grouping the rows by local calendar day using integer day ids of the zone,
+#returns the group code of each row and the local midnight of each group
+def day_groups(df_combined, zone_key=None):
+    zone_key = zone_key or df_combined['zone_key_pred'].iloc[0]
+    day_ids, group_codes = np.unique(local_day_id(frame_epoch_ms(df_combined), zone_key), return_inverse=True)
+    return group_codes, day_id_to_timestamp(day_ids, zone_key)
+
+
+#Calculating the requested metrics of one power type for every group from aligned arrays.
+#Returns {metric: (values, has_rows)}, where has_rows marks the groups that had data for the metric.
+#daytime marks the solar rows kept by the night_excluded_metrics, by default the rows with nonzero target.
+#capacity_mw is one capacity or the capacity of every row, the error of each row is normalized by its own
+#capacity before the statistics so days around a capacity change are not mixed up.
+def grouped_metrics(group_codes, predicted, target, n_groups, metrics, power_type, capacity_mw, daytime=None):
+    error = (predicted - target) / capacity_mw
+    statistics = grouped_error_statistics(group_codes, error, n_groups)
+    if power_type == 'solar' and any(metric in night_excluded_metrics for metric in metrics):
+        if daytime is None:
+            daytime = target != 0
+        daytime_statistics = grouped_error_statistics(group_codes[daytime], error[daytime], n_groups)
+
+    results = {}
+    for metric in metrics:
+        if power_type == 'solar' and metric in night_excluded_metrics:
+            selected = daytime_statistics
+        else:
+            selected = statistics
+        results[metric] = (selected[metric_statistics[metric]], selected['count'] > 0)
+    return results
+
+
+#Calculating daily metrics for all power types of a merged frame (see split_horizon) as a tidy
+#table with one row per (zone, power_type, day, metric). The error, day grouping and statistics are
+#computed once, so asking for all metrics costs about the same as asking for one.
+#night_rule selects the solar nighttime hours left out of the night_excluded_metrics (see DaylightMask).
+#capacity maps a power type to a fixed capacity, by default the capacity of the zone registry at each hour is used.
+def daily_metrics(df_combined, metrics=list(metric_statistics), power_types=power_types, capacity=None, night_rule='target_zero'):
+    zone = df_combined['zone_key_pred'].iloc[0]
+    group_codes, days = day_groups(df_combined)
+    epoch_ms = frame_epoch_ms(df_combined)
+
+    tables = []
+    for power_type in power_types:
+        predicted = df_combined[f'power_production_{power_type}_avg_pred'].to_numpy(dtype=float)
+        target = df_combined[f'power_production_{power_type}_avg_target'].to_numpy(dtype=float)
+        daytime = daytime_rows(night_rule, target, epoch_ms, zone) if power_type == 'solar' else None
+        capacity_mw = capacity[power_type] if capacity else capacity_at(zone, power_type, epoch_ms)
+        results = grouped_metrics(group_codes, predicted, target, len(days), metrics, power_type, capacity_mw, daytime)
+
+        for metric, (values, has_rows) in results.items():
+            tables.append(pd.DataFrame({
+                'zone': zone,
+                'power_type': power_type,
+                'day': days[has_rows],
+                'metric': metric,
+                'value': values[has_rows],
+            }))
+
+    return pd.concat(tables, ignore_index=True)
+
+
+#Turning the tidy table into one column per metric and power type (e.g. nmae_wind) indexed by day
+def daily_metrics_wide(table):
+    wide = table.set_index(['day', 'metric', 'power_type'])['value'].unstack(['metric', 'power_type'])
+    wide.columns = [f'{metric}_{power_type}' for metric, power_type in wide.columns]
+    return wide.sort_index()
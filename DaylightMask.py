@@ -0,0 +1,101 @@
+import functools
+import os
+import numpy as np
+from ZoneRegistry import zone_locations
+
+# Daylight bitsets are also saved here, one file per zone, year and threshold
+cache_dir = '.cache/daylight_masks'
+
+# The sun counts as up above this elevation in degrees, -0.833 is the sunrise/sunset of almanacs
+# (the centre of the sun 50 arc minutes below the horizon, for refraction and the solar radius)
+sun_up_elevation = -0.833
+
+# Night rules for the solar metrics: 'target_zero' leaves out hours with zero target production,
+# 'solar_position' hours with the sun below the horizon at the zone centroid, None nothing
+night_rules = ['target_zero', 'solar_position', None]
+
+ms_per_minute = 60_000
+
+
+#Solar elevation in degrees at a latitude/longitude for an array of ms epochs (UTC), following the
+#NOAA solar calculator equations. Everything is done on whole arrays, there is no per-row call.
+def solar_elevation(epoch_ms, latitude, longitude):
+    epoch_ms = np.asarray(epoch_ms, dtype=np.int64)
+    julian_century = (epoch_ms / 86_400_000 + 2440587.5 - 2451545) / 36525
+
+    mean_longitude = np.radians((280.46646 + julian_century * (36000.76983 + julian_century * 0.0003032)) % 360)
+    mean_anomaly = np.radians(357.52911 + julian_century * (35999.05029 - 0.0001537 * julian_century))
+    eccentricity = 0.016708634 - julian_century * (0.000042037 + 0.0000001267 * julian_century)
+    center = (np.sin(mean_anomaly) * (1.914602 - julian_century * (0.004817 + 0.000014 * julian_century))
+              + np.sin(2 * mean_anomaly) * (0.019993 - 0.000101 * julian_century)
+              + np.sin(3 * mean_anomaly) * 0.000289)
+
+    omega = np.radians(125.04 - 1934.136 * julian_century)
+    apparent_longitude = np.radians(np.degrees(mean_longitude) + center - 0.00569 - 0.00478 * np.sin(omega))
+    mean_obliquity = 23 + (26 + (21.448 - julian_century * (46.815 + julian_century * (0.00059 - julian_century * 0.001813))) / 60) / 60
+    obliquity = np.radians(mean_obliquity + 0.00256 * np.cos(omega))
+    declination = np.arcsin(np.sin(obliquity) * np.sin(apparent_longitude))
+
+    # Equation of time in minutes
+    y = np.tan(obliquity / 2) ** 2
+    equation_of_time = 4 * np.degrees(y * np.sin(2 * mean_longitude) - 2 * eccentricity * np.sin(mean_anomaly)
+                                      + 4 * eccentricity * y * np.sin(mean_anomaly) * np.cos(2 * mean_longitude)
+                                      - 0.5 * y ** 2 * np.sin(4 * mean_longitude) - 1.25 * eccentricity ** 2 * np.sin(2 * mean_anomaly))
+
+    minutes_of_day = (epoch_ms % 86_400_000) / ms_per_minute
+    true_solar_time = (minutes_of_day + equation_of_time + 4 * longitude) % 1440
+    hour_angle = np.radians(true_solar_time / 4 - 180)
+
+    latitude = np.radians(latitude)
+    cos_zenith = np.sin(latitude) * np.sin(declination) + np.cos(latitude) * np.cos(declination) * np.cos(hour_angle)
+    return 90 - np.degrees(np.arccos(np.clip(cos_zenith, -1, 1)))
+
+
+#First ms of a UTC year
+def year_start_ms(year):
+    return np.datetime64(f'{year}-01-01', 'ms').astype(np.int64)
+
+
+#Daylight of every minute of a UTC year at the zone centroid as a packed bitset (about 66 kB),
+#kept in memory and in cache_dir so it is computed once per zone, location, year and threshold.
+#The location is part of the key, so a zone registered again at another location gets a new mask.
+@functools.lru_cache(maxsize=None)
+def year_bitset(zone_key, location, year, elevation=sun_up_elevation):
+    latitude, longitude = location
+    path = os.path.join(cache_dir, f'{zone_key}_{latitude}_{longitude}_{year}_{elevation}.npy')
+    if os.path.exists(path):
+        return np.load(path)
+
+    minutes = np.arange(year_start_ms(year), year_start_ms(year + 1), ms_per_minute)
+    bitset = np.packbits(solar_elevation(minutes, latitude, longitude) > elevation)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_path = path + '.tmp.npy'
+    np.save(temporary_path, bitset)
+    os.replace(temporary_path, path)
+    return bitset
+
+
+#Daylight (sun above the elevation threshold) at each ms epoch for a zone, read from the yearly bitsets
+def daylight_mask(zone_key, epoch_ms, elevation=sun_up_elevation):
+    epoch_ms = np.asarray(epoch_ms, dtype=np.int64)
+    years = epoch_ms.astype('datetime64[ms]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+    mask = np.zeros(len(epoch_ms), dtype=bool)
+    for year in np.unique(years):
+        in_year = years == year
+        minute = (epoch_ms[in_year] - year_start_ms(year)) // ms_per_minute
+        bitset = year_bitset(zone_key, zone_locations[zone_key], int(year), elevation)
+        mask[in_year] = (bitset[minute >> 3] >> (7 - (minute & 7))) & 1
+    return mask
+
+
+#Rows that count as daytime for the solar metrics under a night rule (see night_rules)
+def daytime_rows(night_rule, target, epoch_ms=None, zone_key=None):
+    if night_rule == 'target_zero':
+        return target != 0
+    if night_rule == 'solar_position':
+        return daylight_mask(zone_key, epoch_ms)
+    if night_rule is None:
+        return np.ones(len(target), dtype=bool)
+    raise ValueError(f'Unknown night rule {night_rule!r}, use one of {night_rules}')
@@ -0,0 +1,172 @@
+import glob
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from ParquetLoader import power_types
+from AlignedFrameStore import aligned_arrays
+from Baselines import lagged_values, ms_per_hour
+from ParallelRunner import default_workers, zone_pool
+from ZoneRegistry import zone_names
+
+# Decompositions are saved here keyed by a hash of their input values and settings
+cache_dir = '.cache/decompositions'
+
+# Seasonal periods in hours
+decomposition_periods = {'daily': 24, 'weekly': 168, 'annual': 8760}
+
+# Series decomposed for every zone and power type, error is predicted - target
+series_kinds = ['predicted', 'target', 'error']
+
+# Seasonal smoother length of the STL fit, as in STLHourly
+stl_seasonal = 13
+
+
+#Hourly series of a zone on a gapless UTC grid: target_time (ms) and values. Hours without a value are
+#filled with the previous value (the first ones with the next), since STL does not accept missing values.
+def hourly_series(zone_key, power_type, kind, horizon=24, start=None, end=None):
+    arrays = aligned_arrays(zone_key, horizon, start, end, [power_type])
+    epoch_ms = arrays['target_time']
+    if kind == 'error':
+        values = arrays['predicted'][power_type] - arrays['target'][power_type]
+    else:
+        values = arrays[kind][power_type]
+
+    grid = np.arange(epoch_ms[0], epoch_ms[-1] + ms_per_hour, ms_per_hour, dtype=np.int64)
+    filled = pd.Series(lagged_values(grid, epoch_ms, values)).ffill().bfill().to_numpy()
+    return grid, filled
+
+
+#Periods with at least two full cycles in n hours, the others cannot be estimated
+def fitted_periods(periods, n):
+    return sorted(period for period in periods if 2 * period <= n)
+
+
+#Centred moving average over window hours, with the even windows averaged once more over two hours
+#as in classical decomposition. The ends use the hours available.
+def centred_average(values, window):
+    average = pd.Series(values).rolling(window, center=True, min_periods=1).mean()
+    if window % 2 == 0:
+        average = average.rolling(2, min_periods=1).mean().shift(-1).fillna(average)
+    return average.to_numpy()
+
+
+#Classical decomposition with several periods, vectorized: the trend is the centred average over the
+#longest period, and each seasonal component is the mean of the detrended values at the same position
+#in the cycle, found with bincount and refined by fitting the periods in turn a few times.
+def classical_decomposition(values, periods, iterations=2):
+    trend = centred_average(values, periods[-1])
+    position = np.arange(len(values))
+    seasonal = {period: np.zeros(len(values)) for period in periods}
+
+    remainder = values - trend
+    for _ in range(iterations):
+        for period in periods:
+            partial = remainder + seasonal[period]
+            phase = position % period
+            means = np.bincount(phase, weights=partial, minlength=period) / np.bincount(phase, minlength=period)
+            seasonal[period] = (means - means.mean())[phase]
+            remainder = partial - seasonal[period]
+    return trend, seasonal, remainder
+
+
+#STL for one period and MSTL for several, with statsmodels
+def stl_decomposition(values, periods):
+    from statsmodels.tsa.seasonal import MSTL, STL
+
+    if len(periods) == 1:
+        result = STL(values, period=periods[0], seasonal=stl_seasonal).fit()
+        return result.trend, {periods[0]: result.seasonal}, result.resid
+
+    result = MSTL(values, periods=periods).fit()
+    seasonal = np.asarray(result.seasonal).reshape(len(values), -1)
+    return result.trend, {period: seasonal[:, i] for i, period in enumerate(periods)}, result.resid
+
+
+#Trend, seasonal and residual components of an hourly series as a frame with columns target_time,
+#observed, trend, seasonal_<period> and resid. method is 'stl' (statsmodels STL/MSTL) or 'classical',
+#a fast moving-average decomposition for long multi-year series.
+def decompose(epoch_ms, values, periods=[24], method='stl'):
+    periods = fitted_periods(periods, len(values))
+    if not periods:
+        raise ValueError(f'The series of {len(values)} hours is too short for two cycles of any period')
+
+    if method == 'stl':
+        trend, seasonal, resid = stl_decomposition(values, periods)
+    elif method == 'classical':
+        trend, seasonal, resid = classical_decomposition(values, periods)
+    else:
+        raise ValueError(f"Unknown decomposition method {method!r}, use 'stl' or 'classical'")
+
+    components = {'target_time': epoch_ms, 'observed': values, 'trend': np.asarray(trend)}
+    components.update({f'seasonal_{period}': np.asarray(seasonal[period]) for period in periods})
+    components['resid'] = np.asarray(resid)
+    return pd.DataFrame(components)
+
+
+#Hash of the input values and settings, the same series decomposed the same way gives the same key
+def decomposition_key(epoch_ms, values, periods, method):
+    digest = hashlib.sha1(np.ascontiguousarray(epoch_ms).tobytes())
+    digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+    digest.update(repr((sorted(periods), method, stl_seasonal)).encode())
+    return digest.hexdigest()[:16]
+
+
+#Loading a decomposition from the cache, or fitting it and saving it for the next run
+def cached_decomposition(epoch_ms, values, periods=[24], method='stl'):
+    path = os.path.join(cache_dir, f'{decomposition_key(epoch_ms, values, periods, method)}.feather')
+    if os.path.exists(path):
+        return pd.read_feather(path)
+
+    df_components = decompose(epoch_ms, values, periods, method)
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_path = path + '.tmp'
+    df_components.to_feather(temporary_path)
+    os.replace(temporary_path, path)
+    return df_components
+
+
+#Decomposition of one zone, power type and series, indexed by UTC target_time
+def decomposition(zone_key, power_type, kind, periods=[24], method='stl', horizon=24, start=None, end=None):
+    epoch_ms, values = hourly_series(zone_key, power_type, kind, horizon, start, end)
+    df_components = cached_decomposition(epoch_ms, values, periods, method)
+    df_components.index = pd.to_datetime(df_components.pop('target_time'), unit='ms', utc=True)
+    return df_components
+
+
+#Work done in a worker process: reading, hashing and decomposing one series
+def decomposition_task(task):
+    return decomposition(**task)
+
+
+#Decomposing every zone x power type x series kind in a process pool of workers processes, one task per
+#series. With workers=1 the fits run in this process. Returns {(zone, power_type, kind): components}.
+def run_decompositions(zones=None, power_types=power_types, kinds=series_kinds, periods=[24], method='stl', horizon=24, start=None, end=None, workers=None):
+    zones = zones or list(zone_names)
+    workers = workers or default_workers
+
+    tasks = [
+        {'zone_key': zone_key, 'power_type': power_type, 'kind': kind, 'periods': list(periods), 'method': method, 'horizon': horizon, 'start': start, 'end': end}
+        for zone_key in zones for power_type in power_types for kind in kinds
+    ]
+    if workers == 1 or len(tasks) == 1:
+        results = [decomposition_task(task) for task in tasks]
+    else:
+        with zone_pool(min(workers, len(tasks)), zones) as pool:
+            results = list(pool.map(decomposition_task, tasks))
+
+    return {(task['zone_key'], task['power_type'], task['kind']): result for task, result in zip(tasks, results)}
+
+
+#Emptying the decomposition cache
+def clear_cache():
+    for path in glob.glob(os.path.join(cache_dir, '*.feather')):
+        os.remove(path)
+
+
+#call the function, under __main__ so worker processes can import this module
+if __name__ == "__main__":
+    periods = [decomposition_periods['daily'], decomposition_periods['weekly'], decomposition_periods['annual']]
+    components = run_decompositions(periods=periods, method='classical')
+    for (zone_key, power_type, kind), df_components in components.items():
+        print(f"{zone_key} {power_type} {kind}: {len(df_components)} hours, components {', '.join(df_components.columns)}")
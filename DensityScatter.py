@@ -0,0 +1,158 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ParquetLoader import power_types
+from DistributionSummary import zone_chunks, chunk_days
+from DaylightMask import daytime_rows
+from ZoneRegistry import capacity_at, zone_names
+
+# Folder holding the saved bin counts of every zone, power type and horizon
+density_dir = 'data/density'
+
+# Square grid of density_bins x density_bins bins over density_range on both axes, in units of the
+# installed capacity of the hour, so the counts of different zones and files share their bins and can
+# be added. Pairs with a value outside the range are counted apart.
+density_bins = 200
+density_range = (-0.05, 1.25)
+
+
+#Edges of the bins on both axes
+def density_edges(bins=density_bins, value_range=density_range):
+    return np.linspace(value_range[0], value_range[1], bins + 1)
+
+
+#Empty density: counts[i, j] is the number of hours with the prediction in bin i and the target in bin j
+def empty_density(edges):
+    return {'edges': edges, 'counts': np.zeros((len(edges) - 1, len(edges) - 1), dtype=np.int64), 'outside': 0}
+
+
+#Bin of every value, [edge, next edge) with the last bin including its upper edge like np.histogram2d.
+#Values outside the edges get -1.
+def bin_positions(edges, values):
+    position = np.minimum(np.searchsorted(edges, values, side='right') - 1, len(edges) - 2)
+    position[(values < edges[0]) | (values > edges[-1])] = -1
+    return position
+
+
+#Adding the predicted and target values of one chunk to a density with a single bincount over the
+#flattened grid, so memory stays at the counts whatever the number of hours. Pairs with a NaN are skipped.
+def update_density(density, predicted, target):
+    rows = ~(np.isnan(predicted) | np.isnan(target))
+    edges = density['edges']
+    n_bins = len(edges) - 1
+    predicted_bin = bin_positions(edges, predicted[rows])
+    target_bin = bin_positions(edges, target[rows])
+
+    inside = (predicted_bin >= 0) & (target_bin >= 0)
+    density['outside'] += int(np.sum(~inside))
+    flat = predicted_bin[inside] * n_bins + target_bin[inside]
+    density['counts'] += np.bincount(flat, minlength=n_bins * n_bins).reshape(n_bins, n_bins)
+    return density
+
+
+#Density of two sets of hours together, e.g. two files, two zones or two periods, from their counts
+def merge_density(a, b):
+    if not np.array_equal(a['edges'], b['edges']):
+        raise ValueError('Densities with different bin edges cannot be merged')
+    return {'edges': a['edges'], 'counts': a['counts'] + b['counts'], 'outside': a['outside'] + b['outside']}
+
+
+#Predicted vs target densities of a zone for one horizon from one streaming pass over its files:
+#{power_type: density}. Values are divided by the capacity of their hour (see ZoneRegistry). Solar
+#nighttime hours are left out when exclude_night is set, night_rule tells which hours are night.
+def zone_density(zone_key, horizon=24, power_types=power_types, exclude_night=False, night_rule='target_zero', bins=density_bins, chunk_days=chunk_days, predicted_path=None, target_path=None):
+    densities = {power_type: empty_density(density_edges(bins)) for power_type in power_types}
+    for epoch_ms, values in zone_chunks(zone_key, horizon, power_types, chunk_days, predicted_path, target_path):
+        for power_type in power_types:
+            predicted = values['predicted'][power_type]
+            target = values['target'][power_type]
+            if power_type == 'solar' and exclude_night:
+                rows = daytime_rows(night_rule, target, epoch_ms, zone_key)
+                predicted, target, epoch_ms_rows = predicted[rows], target[rows], epoch_ms[rows]
+            else:
+                epoch_ms_rows = epoch_ms
+            capacity = capacity_at(zone_key, power_type, epoch_ms_rows)
+            update_density(densities[power_type], predicted / capacity, target / capacity)
+    return densities
+
+
+def density_path(zone_key, power_type, horizon, density_dir=density_dir):
+    return os.path.join(density_dir, f'{zone_key}_{power_type}_h{horizon:02d}.parquet')
+
+
+#Saving a density as its non-empty bins only (predicted_bin, target_bin, count) with the edges and the
+#outside count in the metadata, through a temporary file so a failed run leaves the old file intact
+def write_density(density, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    predicted_bin, target_bin = np.nonzero(density['counts'])
+    df = pd.DataFrame({'predicted_bin': predicted_bin.astype(np.int32), 'target_bin': target_bin.astype(np.int32), 'count': density['counts'][predicted_bin, target_bin]})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {b'edges': ','.join(repr(float(edge)) for edge in density['edges']).encode(), b'outside': str(density['outside']).encode()}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    temporary_path = path + '.tmp'
+    pq.write_table(table, temporary_path)
+    os.replace(temporary_path, path)
+
+
+#Reading a density saved with write_density
+def read_density(path):
+    table = pq.read_table(path)
+    metadata = table.schema.metadata
+    density = empty_density(np.array([float(edge) for edge in metadata[b'edges'].decode().split(',')]))
+    density['outside'] = int(metadata[b'outside'])
+    df = table.to_pandas()
+    density['counts'][df['predicted_bin'].to_numpy(), df['target_bin'].to_numpy()] = df['count'].to_numpy()
+    return density
+
+
+#Densities of every zone x power type for one horizon, saved to density_dir. Returns {(zone, power_type): path}.
+def save_densities(zones=None, horizon=24, power_types=power_types, exclude_night=False, density_dir=density_dir):
+    paths = {}
+    for zone_key in zones or list(zone_names):
+        for power_type, density in zone_density(zone_key, horizon, power_types, exclude_night).items():
+            paths[(zone_key, power_type)] = density_path(zone_key, power_type, horizon, density_dir)
+            write_density(density, paths[(zone_key, power_type)])
+    return paths
+
+
+#Density of several saved files added together, e.g. all zones of a power type
+def merge_files(paths):
+    densities = [read_density(path) for path in paths]
+    merged = densities[0]
+    for density in densities[1:]:
+        merged = merge_density(merged, density)
+    return merged
+
+
+#Drawing a density as a heatmap with a log colour scale and the identity line, predicted on x and
+#target on y like Scatterplot. Empty bins stay blank. scale multiplies the edges, e.g. a capacity in MW
+#to show MWh. Returns the mesh for a colorbar.
+def plot_density(ax, density, scale=1.0, cmap='Blues'):
+    import matplotlib.colors as mcolors
+
+    edges = density['edges'] * scale
+    counts = np.ma.masked_equal(density['counts'], 0)
+    mesh = ax.pcolormesh(edges, edges, counts.T, cmap=cmap, norm=mcolors.LogNorm(vmin=1, vmax=max(counts.max() or 1, 1)))
+    used = np.nonzero(density['counts'].sum(axis=1) + density['counts'].sum(axis=0))[0]
+    upper = edges[used[-1] + 1] if len(used) else edges[-1]
+    ax.plot([0, upper], [0, upper], color='red')
+    ax.set_xlim(edges[0], upper)
+    ax.set_ylim(edges[0], upper)
+    return mesh
+
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
+    paths = save_densities(horizon=24)
+    for (zone_key, power_type), path in paths.items():
+        density = read_density(path)
+        figure, ax = plt.subplots(figsize=(10, 6))
+        mesh = plot_density(ax, density)
+        figure.colorbar(mesh, ax=ax, label='Hours')
+        ax.set_title(f'Predicted vs. target {power_type} in {zone_names[zone_key]} (24 hour horizon)')
+        ax.set_xlabel('Predicted (fraction of capacity)')
+        ax.set_ylabel('Target (fraction of capacity)')
+        plt.show()
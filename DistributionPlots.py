@@ -3,6 +3,11 @@ import matplotlib.dates as mdates
 import pyarrow.parquet as pq
 import pandas as pd
 import numpy as np
+from ZoneRegistry import zone_capacity_mw
+from ParquetLoader import zone_from_path
+from LocalTime import to_epoch_ms
+from Baselines import baseline_forecasts
+from Downsample import plot_downsampled
 
 # Define the locations of your predicted and target data files
 target_predicted_files_CAL = {
@@ -13,13 +18,13 @@ target_predicted_files_TEX = {
     'data/target_and_predicted/US-TEX-ERCO_predicted.parquet': 'data/target_and_predicted/US-TEX-ERCO_target.parquet',
 }
 
-naive_CAL = 'naive_forecast_US-CAL-CISO.parquet'
-naive_TEX = 'naive_forecast_US-TEX-ERCO.parquet'
+# Baseline plotted as the naive forecast (see Baselines), generated from the target data for the horizon
+naive_baseline = 'persistence_24h'
 
-US_CAL_CISO_solar_capacity = 19700
-US_CAL_CISO_wind_capacity = 6030
-US_TEX_ERCO_solar_capacity = 13500
-US_TEX_ERCO_wind_capacity = 37000
+US_CAL_CISO_solar_capacity = zone_capacity_mw['US-CAL-CISO']['solar']
+US_CAL_CISO_wind_capacity = zone_capacity_mw['US-CAL-CISO']['wind']
+US_TEX_ERCO_solar_capacity = zone_capacity_mw['US-TEX-ERCO']['solar']
+US_TEX_ERCO_wind_capacity = zone_capacity_mw['US-TEX-ERCO']['wind']
 
 
 
@@ -40,17 +45,13 @@ def split_horizon(predicted_file, target_file, horizon):
     df_combined = pd.merge(df_predicted, df_target, on='target_time', suffixes=('_pred', '_target'))
     return df_combined
 
-def visualize_weekly_data_naive(predicted_file, target_file, naive_file, horizon, power_type, week_start, week_end, capacity, zone):
+def visualize_weekly_data_naive(predicted_file, target_file, baseline, horizon, power_type, week_start, week_end, capacity, zone):
     df_combined = split_horizon(predicted_file, target_file, horizon)
     #zone = df_combined['zone_key'].iloc[0] 
 
-    # Read the naive forecast data
-    df_naive = pq.read_table(naive_file).to_pandas()
-    df_naive = df_naive[df_naive["horizon"] == horizon].copy()
-    df_naive['target_time'] = pd.to_datetime(df_naive['target_time'], utc=True)
-    
-    # Merge the naive data into the combined dataframe on 'target_time'
-    df_combined = pd.merge(df_combined, df_naive, on='target_time', suffixes=('', '_naive'))
+    # Naive forecast of the horizon for every target time, looked up in the in-memory baseline of the zone
+    naive = baseline_forecasts(zone_from_path(target_file), [baseline], to_epoch_ms(df_combined['target_time']), horizon, [power_type], target_path=target_file)
+    df_combined[f'naive_forecast_{power_type}'] = naive[baseline][power_type]
 
     # Convert 'week_start' to a timezone-aware datetime object
     week_start_date = pd.to_datetime(week_start).tz_localize('UTC')
@@ -69,7 +70,7 @@ def visualize_weekly_data_naive(predicted_file, target_file, naive_file, horizon
     ]
 
     for column_name, color, label in plot_configs:
-        plt.plot(df_week['target_time'], df_week[column_name], linestyle='-', color=color, label=label)
+        plot_downsampled(plt.gca(), df_week['target_time'], df_week[column_name], linestyle='-', color=color, label=label)
     
     plt.title(f'Hourly {power_type.capitalize()} Power Production for {zone.capitalize()}')
     plt.xlabel('Time')
@@ -109,7 +110,7 @@ def visualize_weekly_data(predicted_file, target_file, horizon, power_type, week
     ]
 
     for column_name, color, label in plot_configs:
-        plt.plot(df_week['target_time'], df_week[column_name], linestyle='-', color=color, label=label)
+        plot_downsampled(plt.gca(), df_week['target_time'], df_week[column_name], linestyle='-', color=color, label=label)
     
     plt.title(f'Hourly {power_type.capitalize()} Power Production for {zone.capitalize()}')
     plt.xlabel('Time')
@@ -133,16 +134,16 @@ def visualize_weekly_data(predicted_file, target_file, horizon, power_type, week
 
 
 for predicted_file, target_file in target_predicted_files_TEX.items():
-    #visualize_weekly_data_naive(predicted_file, target_file, naive_TEX, 24, 'solar', week_start='2023-08-01', week_end='2023-08-15', capacity=US_TEX_ERCO_solar_capacity, zone='Texas')
-    visualize_weekly_data_naive(predicted_file, target_file, naive_TEX, 24, 'wind', week_start='2023-08-01', week_end='2023-08-15', capacity=US_TEX_ERCO_wind_capacity, zone='Texas')
+    #visualize_weekly_data_naive(predicted_file, target_file, naive_baseline, 24, 'solar', week_start='2023-08-01', week_end='2023-08-15', capacity=US_TEX_ERCO_solar_capacity, zone='Texas')
+    visualize_weekly_data_naive(predicted_file, target_file, naive_baseline, 24, 'wind', week_start='2023-08-01', week_end='2023-08-15', capacity=US_TEX_ERCO_wind_capacity, zone='Texas')
 
     #visualize_weekly_data(predicted_file, target_file, 24, 'solar', week_start='2023-08-01', week_end='2023-08-14', capacity=US_TEX_ERCO_solar_capacity, zone='Texas')
     #visualize_weekly_data(predicted_file, target_file, 24, 'wind', week_start='2023-08-01', week_end='2023-08-14', capacity=US_TEX_ERCO_wind_capacity, zone='Texas')
 
 
 for predicted_file, target_file in target_predicted_files_CAL.items():
-    #visualize_weekly_data_naive(predicted_file, target_file, naive_CAL, 24, 'solar', week_start='2023-08-01', week_end='2023-08-15', capacity=US_CAL_CISO_solar_capacity, zone='California')
-    visualize_weekly_data_naive(predicted_file, target_file, naive_CAL, 24, 'wind', week_start='2023-08-01', week_end='2023-08-15', capacity=US_CAL_CISO_wind_capacity, zone='California')
+    #visualize_weekly_data_naive(predicted_file, target_file, naive_baseline, 24, 'solar', week_start='2023-08-01', week_end='2023-08-15', capacity=US_CAL_CISO_solar_capacity, zone='California')
+    visualize_weekly_data_naive(predicted_file, target_file, naive_baseline, 24, 'wind', week_start='2023-08-01', week_end='2023-08-15', capacity=US_CAL_CISO_wind_capacity, zone='California')
 
     #visualize_weekly_data(predicted_file, target_file, 24, 'solar', week_start='2023-08-01', week_end='2023-08-15', capacity=US_CAL_CISO_solar_capacity, zone='California')
     #visualize_weekly_data(predicted_file, target_file, 24, 'wind', week_start='2023-08-01', week_end='2023-08-15', capacity=US_CAL_CISO_wind_capacity, zone='California')
\ No newline at end of file
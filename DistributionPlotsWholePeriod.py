@@ -3,6 +3,8 @@ import matplotlib.dates as mdates
 import pyarrow.parquet as pq
 import pandas as pd
 import numpy as np
+from ZoneRegistry import zone_capacity_mw
+from Downsample import plot_downsampled
 
 # Define the locations of your predicted and target data files
 target_predicted_files_CAL = {
@@ -14,10 +16,10 @@ target_predicted_files_TEX = {
 }
 
 #Max capacity in MW
-US_CAL_CISO_solar_capacity = 19700
-US_CAL_CISO_wind_capacity = 6030
-US_TEX_ERCO_solar_capacity = 13500
-US_TEX_ERCO_wind_capacity = 37000
+US_CAL_CISO_solar_capacity = zone_capacity_mw['US-CAL-CISO']['solar']
+US_CAL_CISO_wind_capacity = zone_capacity_mw['US-CAL-CISO']['wind']
+US_TEX_ERCO_solar_capacity = zone_capacity_mw['US-TEX-ERCO']['solar']
+US_TEX_ERCO_wind_capacity = zone_capacity_mw['US-TEX-ERCO']['wind']
 
 def split_horizon(predicted_file, target_file, horizon):
     # Read the data from the files
@@ -49,8 +51,9 @@ def visualize_data(predicted_file, target_file, horizon, power_type, capacity, z
         (f'power_production_{power_type}_avg_target', 'red', 'Target'),
     ]
 
+    # A year of hours is far more points than pixels, each line is reduced to the min and max of every pixel column
     for column_name, color, label in plot_configs:
-        plt.plot(df_combined['target_time'], df_combined[column_name], linestyle='-', color=color, label=label)
+        plot_downsampled(plt.gca(), df_combined['target_time'], df_combined[column_name], linestyle='-', color=color, label=label)
     
     plt.title(f'Hourly {power_type.capitalize()} Power Production for {zone.capitalize()}')
     plt.ylabel('MWh')
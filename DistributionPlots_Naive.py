@@ -1,14 +1,16 @@
 import matplotlib.pyplot as plt
 import pandas as pd
+from NaiveModel import load_naive_forecast
 
 
-# Load the dataset for 'US-CAL-CISO'
-df = pd.read_parquet('naive_forecast_US-CAL-CISO.parquet')
+# Load the naive forecasts for 'US-CAL-CISO' from the dataset built by NaiveModel
+df = load_naive_forecast('US-CAL-CISO', lags=[24], start='2023-07-29', end='2023-08-15')
+df['target_time'] = pd.to_datetime(df['target_time'], unit='ms', utc=True).dt.tz_convert('America/Los_Angeles')
 
 # Plotting
 plt.figure(figsize=(10, 6))
 plt.plot(df['target_time'], df['power_production_wind_avg'], label='Historic Values')
-plt.plot(df['target_time'], df['naive_forecast_wind'], label='Naive Forecast', linestyle='--')
+plt.plot(df['target_time'], df['naive_forecast_wind_24h'], label='Naive Forecast', linestyle='--')
 
 plt.title('Naive Forecast vs Historic Values for US-CAL-CISO')
 plt.xlabel('Time')
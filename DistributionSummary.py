@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from ParquetLoader import load_zone, zone_file, value_columns, power_types
+from LocalTime import to_epoch_ms
+from Alignment import align_frames
+from QuantileSketch import default_relative_accuracy, encode_values, merge_bins, grouped_quantile, decode_bins
+from DaylightMask import daytime_rows
+from ZoneRegistry import zone_capacity_mw
+
+# Distributions summarized per zone and power type, error is predicted - target
+distribution_kinds = ['predicted', 'target', 'error']
+
+# Fixed histogram bins over a range in units of the zone capacity: production from slightly below
+# zero to above capacity, errors from -capacity to capacity. Values outside are counted apart.
+distribution_bins = 512
+histogram_ranges = {'predicted': (-0.05, 1.25), 'target': (-0.05, 1.25), 'error': (-1.0, 1.0)}
+
+# Days of rows read and aligned at a time
+chunk_days = 31
+
+ms_per_hour = 3_600_000
+
+
+#First and last target_time (ms) of a parquet file from its row group statistics, reading the
+#target_time column only when the statistics are missing
+def file_time_range(path):
+    parquet_file = pq.ParquetFile(path)
+    time_index = parquet_file.schema_arrow.names.index('target_time')
+    bounds = []
+    for i in range(parquet_file.metadata.num_row_groups):
+        statistics = parquet_file.metadata.row_group(i).column(time_index).statistics
+        if statistics is None or not statistics.has_min_max:
+            epoch_ms = to_epoch_ms(pq.read_table(path, columns=['target_time']).column('target_time').to_pandas())
+            return int(epoch_ms.min()), int(epoch_ms.max())
+        bounds.extend([statistics.min, statistics.max])
+    epoch_ms = to_epoch_ms(pd.Series(bounds))
+    return int(epoch_ms.min()), int(epoch_ms.max())
+
+
+#Aligned predicted and target values of one horizon, chunk_days at a time. Every chunk reads only the
+#row groups of its time window (see ParquetLoader.build_filter), so memory stays at one chunk.
+#Yields the target_time (ms) and {'predicted'|'target': {power_type: values}} of each chunk.
+def zone_chunks(zone_key, horizon=24, power_types=power_types, chunk_days=chunk_days, predicted_path=None, target_path=None):
+    paths = {'predicted': predicted_path or zone_file(zone_key, 'predicted'), 'target': target_path or zone_file(zone_key, 'target')}
+    columns = {kind: value_columns(kind, power_types) for kind in paths}
+    first_ms, last_ms = file_time_range(paths['target'])
+
+    chunk_ms = chunk_days * 24 * ms_per_hour
+    for start_ms in range(first_ms, last_ms + 1, chunk_ms):
+        start = pd.Timestamp(start_ms, unit='ms', tz='UTC')
+        end = pd.Timestamp(start_ms + chunk_ms - 1, unit='ms', tz='UTC')
+        frames = {kind: load_zone(zone_key, kind, horizon, power_types, start, end, path=path, columns=['target_time'] + columns[kind]) for kind, path in paths.items()}
+        keys, aligned, _ = align_frames(frames, columns)
+        if len(keys):
+            yield keys, {kind: {power_type: aligned[kind][column].astype(float) for power_type, column in zip(power_types, columns[kind])} for kind in paths}
+
+
+#Count, mean and central moment sums (m2, m3, m4) of a chunk
+def chunk_moments(values):
+    n = len(values)
+    if n == 0:
+        return {'n': 0, 'mean': 0.0, 'm2': 0.0, 'm3': 0.0, 'm4': 0.0}
+    mean = values.mean()
+    deviation = values - mean
+    return {'n': n, 'mean': mean, 'm2': np.sum(deviation ** 2), 'm3': np.sum(deviation ** 3), 'm4': np.sum(deviation ** 4)}
+
+
+#Moments of two chunks together from the moments of each (pairwise update of Chan and Pebay),
+#so no chunk has to be kept and the sums stay centred
+def merge_moments(a, b):
+    n = a['n'] + b['n']
+    if a['n'] == 0 or b['n'] == 0:
+        return dict(b if a['n'] == 0 else a)
+    delta = b['mean'] - a['mean']
+    m2 = a['m2'] + b['m2'] + delta ** 2 * a['n'] * b['n'] / n
+    m3 = (a['m3'] + b['m3'] + delta ** 3 * a['n'] * b['n'] * (a['n'] - b['n']) / n ** 2
+          + 3 * delta * (a['n'] * b['m2'] - b['n'] * a['m2']) / n)
+    m4 = (a['m4'] + b['m4'] + delta ** 4 * a['n'] * b['n'] * (a['n'] ** 2 - a['n'] * b['n'] + b['n'] ** 2) / n ** 3
+          + 6 * delta ** 2 * (a['n'] ** 2 * b['m2'] + b['n'] ** 2 * a['m2']) / n ** 2
+          + 4 * delta * (a['n'] * b['m3'] - b['n'] * a['m3']) / n)
+    return {'n': n, 'mean': a['mean'] + delta * b['n'] / n, 'm2': m2, 'm3': m3, 'm4': m4}
+
+
+#Empty summary of one distribution: moments, a fixed-bin histogram over edges with the counts below
+#and above it, and the log bins of a quantile sketch (see QuantileSketch)
+def empty_summary(edges, relative_accuracy=default_relative_accuracy):
+    return {
+        'moments': chunk_moments(np.empty(0)),
+        'edges': edges,
+        'counts': np.zeros(len(edges) - 1, dtype=np.int64),
+        'below': 0,
+        'above': 0,
+        'sketch_codes': np.empty(0, dtype=np.int64),
+        'sketch_counts': np.empty(0, dtype=np.int64),
+        'relative_accuracy': relative_accuracy,
+    }
+
+
+#Adding the values of one chunk to a summary, NaN values are skipped
+def update_summary(summary, values):
+    values = values[~np.isnan(values)]
+    summary['moments'] = merge_moments(summary['moments'], chunk_moments(values))
+
+    # Bins hold [edge, next edge), the last one includes its upper edge like np.histogram
+    edges = summary['edges']
+    inside = (values >= edges[0]) & (values <= edges[-1])
+    summary['below'] += int(np.sum(values < edges[0]))
+    summary['above'] += int(np.sum(values > edges[-1]))
+    position = np.minimum(np.searchsorted(edges, values[inside], side='right') - 1, len(edges) - 2)
+    summary['counts'] += np.bincount(position, minlength=len(edges) - 1)
+
+    codes = encode_values(values, summary['relative_accuracy'])
+    groups = np.zeros(len(summary['sketch_codes']) + len(codes), dtype=np.int64)
+    all_codes = np.concatenate([summary['sketch_codes'], codes])
+    all_counts = np.concatenate([summary['sketch_counts'], np.ones(len(codes), dtype=np.int64)])
+    _, summary['sketch_codes'], summary['sketch_counts'] = merge_bins(groups, all_codes, all_counts)
+    return summary
+
+
+#Summaries of every kind and power type of a zone from one streaming pass over its files:
+#{(kind, power_type): summary}. Solar nighttime hours are left out when exclude_night is set,
+#night_rule tells which hours are night (see DaylightMask). Rows need both a predicted and a target value.
+def summarize_zone(zone_key, kinds=distribution_kinds, power_types=power_types, horizon=24, exclude_night=True, night_rule='target_zero', bins=distribution_bins, chunk_days=chunk_days, predicted_path=None, target_path=None):
+    summaries = {}
+    for kind in kinds:
+        for power_type in power_types:
+            low, high = histogram_ranges[kind]
+            capacity = zone_capacity_mw[zone_key][power_type]
+            summaries[(kind, power_type)] = empty_summary(np.linspace(low * capacity, high * capacity, bins + 1))
+
+    for epoch_ms, values in zone_chunks(zone_key, horizon, power_types, chunk_days, predicted_path, target_path):
+        for power_type in power_types:
+            predicted = values['predicted'][power_type]
+            target = values['target'][power_type]
+            rows = ~(np.isnan(predicted) | np.isnan(target))
+            if power_type == 'solar' and exclude_night:
+                rows &= daytime_rows(night_rule, target, epoch_ms, zone_key)
+
+            chunk = {'predicted': predicted[rows], 'target': target[rows], 'error': predicted[rows] - target[rows]}
+            for kind in kinds:
+                update_summary(summaries[(kind, power_type)], chunk[kind])
+    return summaries
+
+
+#Quantiles of a summary from its sketch, within its relative accuracy
+def summary_quantiles(summary, quantiles):
+    groups = np.zeros(len(summary['sketch_codes']), dtype=np.int64)
+    return np.array([grouped_quantile(groups, summary['sketch_codes'], summary['sketch_counts'], 1, q, summary['relative_accuracy'])[0] for q in quantiles])
+
+
+#Count, mean, standard deviation, skewness and excess kurtosis (as scipy.stats skew and kurtosis
+#with their defaults) and quartiles of a summary
+def distribution_statistics(summary):
+    moments = summary['moments']
+    n = moments['n']
+    q1, median, q3 = summary_quantiles(summary, [0.25, 0.5, 0.75])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'count': n,
+            'mean': moments['mean'] if n else np.nan,
+            'std': np.sqrt(moments['m2'] / n) if n else np.nan,
+            'skew': np.sqrt(n) * moments['m3'] / moments['m2'] ** 1.5 if n else np.nan,
+            'kurtosis': n * moments['m4'] / moments['m2'] ** 2 - 3 if n else np.nan,
+            'q1': q1,
+            'median': median,
+            'q3': q3,
+        }
+
+
+#Box of a boxplot for matplotlib's Axes.bxp: quartiles from the sketch and whiskers at the most
+#extreme sketch bins within 1.5 IQR of the box, like plt.boxplot. Outliers are not drawn.
+def box_stats(summary, label=None):
+    statistics = distribution_statistics(summary)
+    values = np.sort(decode_bins(summary['sketch_codes'], summary['relative_accuracy']))
+    iqr = statistics['q3'] - statistics['q1']
+    inside = values[(values >= statistics['q1'] - 1.5 * iqr) & (values <= statistics['q3'] + 1.5 * iqr)]
+    return {
+        'label': label,
+        'med': statistics['median'],
+        'q1': statistics['q1'],
+        'q3': statistics['q3'],
+        'whislo': inside.min() if len(inside) else statistics['q1'],
+        'whishi': inside.max() if len(inside) else statistics['q3'],
+        'fliers': [],
+    }
+
+
+#Gaussian KDE of a summary evaluated at the bin centres, by smoothing the histogram with an FFT
+#convolution instead of summing a kernel over every value. The bandwidth defaults to Scott's rule,
+#as in scipy's gaussian_kde and seaborn. Returns the bin centres and the density.
+def kde_curve(summary, bandwidth=None):
+    edges = summary['edges']
+    counts = summary['counts'].astype(float)
+    width = edges[1] - edges[0]
+    centres = (edges[:-1] + edges[1:]) / 2
+    statistics = distribution_statistics(summary)
+    if bandwidth is None:
+        bandwidth = statistics['std'] * statistics['count'] ** (-1 / 5)
+    if not counts.sum() or not bandwidth > 0:
+        return centres, np.zeros(len(centres))
+
+    # Kernel sampled at the bin offsets, zero padding keeps the circular convolution from wrapping around
+    half_width = min(int(np.ceil(4 * bandwidth / width)), len(counts))
+    offsets = np.arange(-half_width, half_width + 1) * width
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    size = len(counts) + len(kernel) - 1
+    smoothed = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)[half_width:half_width + len(counts)]
+    return centres, np.maximum(smoothed, 0) / (counts.sum() + summary['below'] + summary['above'])
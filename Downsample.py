@@ -0,0 +1,69 @@
+import numpy as np
+from LocalTime import to_epoch_ms
+
+# A line is downsampled when it has more than this many points per horizontal pixel of the axes
+points_per_pixel = 4
+
+
+#Bucket of every point when the x range is split into n_buckets equal parts, one per pixel column
+def pixel_buckets(x, n_buckets):
+    x = x.astype(float)
+    span = x[-1] - x[0]
+    if span <= 0:
+        return np.zeros(len(x), dtype=np.int64)
+    return np.minimum(((x - x[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+
+
+#Positions of the points to keep so the line looks the same at n_buckets pixels wide: the first and
+#last point, and in every bucket its lowest and highest value, so all peaks and dips are drawn.
+#In buckets with missing values the first missing point is kept too, so gaps in the line stay visible.
+#x must be sorted, the positions are returned in x order.
+def minmax_indices(x, y, n_buckets):
+    x = to_epoch_ms(x)
+    y = np.asarray(y, dtype=float)
+    if len(y) <= 2 * n_buckets + 2:
+        return np.arange(len(y))
+
+    bucket = pixel_buckets(x, n_buckets)
+    known = ~np.isnan(y)
+
+    # Known points ordered by bucket and then value: the first of a bucket is its minimum, the last its maximum
+    known_index = np.flatnonzero(known)
+    known_index = known_index[np.lexsort((y[known_index], bucket[known_index]))]
+    known_bucket = bucket[known_index]
+    first = np.flatnonzero(np.r_[True, known_bucket[1:] != known_bucket[:-1]])
+    last = np.r_[first[1:], len(known_index)] - 1
+
+    missing_index = np.flatnonzero(~known)
+    missing_bucket = bucket[missing_index]
+    first_missing = missing_index[np.r_[True, missing_bucket[1:] != missing_bucket[:-1]]] if len(missing_index) else missing_index
+
+    keep = np.concatenate([[0, len(y) - 1], known_index[first], known_index[last], first_missing])
+    return np.unique(keep)
+
+
+#Width in pixels of the drawing area of a matplotlib axes
+def axes_width_px(ax):
+    return max(int(ax.get_window_extent().width), 1)
+
+
+#Points at positions keep, pandas objects keep their type and index
+def take_points(values, keep):
+    if hasattr(values, 'take'):
+        return values.take(keep)
+    return np.asarray(values)[keep]
+
+
+#x and y with only the points needed at n_pixels wide, or unchanged when there are not many more points than pixels
+def downsample(x, y, n_pixels):
+    if len(y) <= points_per_pixel * n_pixels:
+        return x, y
+    keep = minmax_indices(x, y, n_pixels)
+    return take_points(x, keep), take_points(y, keep)
+
+
+#Drop-in for ax.plot(x, y, ...) of long time series: the points are reduced to the minimum and maximum
+#of every pixel column of the axes before drawing, which looks the same and draws much faster
+def plot_downsampled(ax, x, y, *args, **kwargs):
+    x, y = downsample(x, y, axes_width_px(ax))
+    return ax.plot(x, y, *args, **kwargs)
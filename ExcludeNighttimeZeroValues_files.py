@@ -1,9 +1,11 @@
-from astral.sun import sun
-from astral import LocationInfo
-from datetime import datetime
-from pytz import timezone
-import pandas as pd
+import os
+import numpy as np
+import pyarrow as pa
 import pyarrow.parquet as pq
+from ParquetLoader import daylight_index_file, zone_from_path
+from ZoneRegistry import timezone_mapping, zone_locations
+from LocalTime import to_epoch_ms, local_day_id
+from DaylightMask import daylight_mask
 
 
 target_predicted_files = {
@@ -12,39 +14,68 @@ target_predicted_files = {
 }
 
 
-def separate_times_and_save(files):
-    for predicted_path, target_path in files.items():
-        predicted_df = pq.read_table(predicted_path).to_pandas()
-        target_df = pq.read_table(target_path).to_pandas()
+#Daylight from the target data: a target_time is day when there is solar production, night when the
+#production is zero and unknown (null) when there is no target value. There is one flag per target_time,
+#so all horizons and the predicted rows of the same hour are matched by timestamp, not by row position.
+def daylight_from_target(target_path, epoch_ms):
+    df_target = pq.read_table(target_path, columns=['target_time', 'power_production_solar_avg']).to_pandas()
+    solar = df_target['power_production_solar_avg'].to_numpy(dtype=float)
+    position = np.searchsorted(epoch_ms, to_epoch_ms(df_target['target_time']))
 
-        nighttime_mask = target_df['power_production_solar_avg'] == 0
-        daytime_mask = target_df['power_production_solar_avg'] > 0
+    known = np.bincount(position, weights=~np.isnan(solar), minlength=len(epoch_ms)) > 0
+    production = np.bincount(position, weights=np.nan_to_num(solar) > 0, minlength=len(epoch_ms)) > 0
+    return pa.array(production, mask=~known)
 
-        # Separate nighttime and daytime data
-        df_nighttime_predicted = predicted_df[nighttime_mask]
-        df_daytime_predicted = predicted_df[daytime_mask]
 
-        df_nighttime_target = target_df[nighttime_mask]
-        df_daytime_target = target_df[daytime_mask]
+#Daylight from sunrise and sunset at the centre of the zone, using the astral package.
+#sun() is called once per local day and every target_time is compared to the times of its day.
+def daylight_from_astral(zone_key, epoch_ms):
+    from astral import LocationInfo
+    from astral.sun import sun
 
-        # Define new file paths
-        predicted_nighttime_path = predicted_path.replace(".parquet", "_nighttime.parquet")
-        target_nighttime_path = target_path.replace(".parquet", "_nighttime.parquet")
+    latitude, longitude = zone_locations[zone_key]
+    location = LocationInfo(zone_key, 'US', timezone_mapping[zone_key], latitude, longitude)
+    day_ids, day_codes = np.unique(local_day_id(epoch_ms, zone_key), return_inverse=True)
 
-        predicted_daytime_path = predicted_path.replace(".parquet", "_daytime.parquet")
-        target_daytime_path = target_path.replace(".parquet", "_daytime.parquet")
+    sunrise = np.empty(len(day_ids), dtype=np.int64)
+    sunset = np.empty(len(day_ids), dtype=np.int64)
+    for i, date in enumerate(day_ids.astype('datetime64[D]').tolist()):
+        times = sun(location.observer, date=date, tzinfo=location.timezone)
+        sunrise[i] = int(times['sunrise'].timestamp() * 1000)
+        sunset[i] = int(times['sunset'].timestamp() * 1000)
 
-        # Save the nighttime DataFrames as new Parquet files
-        df_nighttime_predicted.to_parquet(predicted_nighttime_path, index=False)
-        df_nighttime_target.to_parquet(target_nighttime_path, index=False)
+    return pa.array((epoch_ms >= sunrise[day_codes]) & (epoch_ms < sunset[day_codes]))
 
-        # Save the daytime DataFrames as new Parquet files
-        df_daytime_predicted.to_parquet(predicted_daytime_path, index=False)
-        df_daytime_target.to_parquet(target_daytime_path, index=False)
 
-        # You can return the paths or just print a confirmation
-        print(f"Saved nighttime data to {predicted_nighttime_path} and {target_nighttime_path}")
-        print(f"Saved daytime data to {predicted_daytime_path} and {target_daytime_path}")
+#Building the daylight index of a zone once instead of writing day and night copies of its files.
+#method is 'target_zero' (zero solar target production is night), 'astral' (sunrise to sunset from astral)
+#or 'solar_position' (sun above the horizon, computed for all hours at once, see DaylightMask).
+#The index is written next to the predicted file, readers then select day or night rows with
+#load_zone(..., daylight=True/False).
+def build_daylight_index(predicted_path, target_path, method='target_zero'):
+    zone_key = zone_from_path(predicted_path)
+    epoch_ms = np.unique(np.concatenate([to_epoch_ms(pq.read_table(path, columns=['target_time']).column('target_time').to_pandas()) for path in [predicted_path, target_path]]))
+
+    if method == 'target_zero':
+        daylight = daylight_from_target(target_path, epoch_ms)
+    elif method == 'astral':
+        daylight = daylight_from_astral(zone_key, epoch_ms)
+    elif method == 'solar_position':
+        daylight = pa.array(daylight_mask(zone_key, epoch_ms))
+    else:
+        raise ValueError(f"Unknown daylight method {method!r}, use 'target_zero', 'astral' or 'solar_position'")
+
+    table = pa.table({'target_time': pa.array(epoch_ms, type=pa.int64()), 'daylight': daylight})
+    table = table.replace_schema_metadata({b'method': method.encode()})
+    index_path = daylight_index_file(zone_key, os.path.dirname(predicted_path))
+    temporary_path = index_path + '.tmp'
+    pq.write_table(table, temporary_path)
+    os.replace(temporary_path, index_path)
+    return index_path
+
 
 # Call the function
-separate_times_and_save(target_predicted_files)
+if __name__ == "__main__":
+    for predicted_path, target_path in target_predicted_files.items():
+        index_path = build_daylight_index(predicted_path, target_path)
+        print(f"Saved daylight index to {index_path}")
@@ -0,0 +1,423 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ParquetLoader import zone_file, power_types
+from LocalTime import local_day_id, day_id_to_timestamp, to_epoch_ms
+from AlignedFrameStore import source_fingerprint
+from Alignment import sorted_merge_join
+from DailyMetrics import grouped_error_statistics, metric_statistics, night_excluded_metrics
+from MultiHorizon import all_horizons, load_all_horizons
+from QuantileSketch import default_relative_accuracy, grouped_sketch_bins, grouped_quantile, merge_bins, encode_values, decode_bins
+from DaylightMask import daytime_rows
+from ZoneRegistry import timezone_mapping, capacity_at
+
+# Folder holding one file of daily error statistics per zone
+store_dir = 'data/daily_statistics'
+
+# Statistics stored per (power_type, horizon, subset, day), in MW before normalizing by capacity.
+# Windows are rolled up from the sums, the median only holds for its own day.
+statistic_columns = {
+    'count': 'count',
+    'sum_error': 'sum',
+    'sum_abs_error': 'sum_abs',
+    'sum_squared_error': 'sum_square',
+    'sum_squared_deviation': 'sum_squared_deviation',
+    'median_squared_error': 'median_square',
+}
+
+# Relative accuracy of the daily error sketches, medians and percentiles of any window come from them
+sketch_relative_accuracy = default_relative_accuracy
+
+# Metrics that only come from the sketches, nrmdse does too for windows longer than a day
+sketch_metrics = {'nmdae': 'median_abs'}
+
+
+#Key of a (horizon, local day) pair, day ids stay below 10^6 until the year 4700
+def day_key(horizon, day_id):
+    return np.asarray(horizon, dtype=np.int64) * 1_000_000 + np.asarray(day_id, dtype=np.int64)
+
+
+def store_path(zone_key, store_dir=store_dir):
+    return os.path.join(store_dir, f'{zone_key}.parquet')
+
+
+# Settings of a store run that are saved with the statistics
+store_settings = ['run_key', 'selection', 'relative_accuracy', 'night_rule', 'row_groups']
+
+
+#Reading the stored daily statistics of a zone and the settings they were built with, (None, {}) if there are none
+def read_store(zone_key, store_dir=store_dir):
+    path = store_path(zone_key, store_dir)
+    if not os.path.exists(path):
+        return None, {}
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    settings = {name: metadata[name.encode()].decode() for name in store_settings if name.encode() in metadata}
+    return table.to_pandas(), settings
+
+
+#Writing the daily statistics through a temporary file, so a failed run leaves the old store intact
+def write_store(df, settings, zone_key, store_dir=store_dir):
+    os.makedirs(store_dir, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {name.encode(): str(value).encode() for name, value in settings.items()}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    path = store_path(zone_key, store_dir)
+    temporary_path = path + '.tmp'
+    pq.write_table(table, temporary_path)
+    os.replace(temporary_path, path)
+
+
+#Hash of the rows of each group, the sum of the row hashes so it does not depend on the row order.
+#order sorts the rows by group and starts holds the first sorted position of every group.
+def group_content_hash(order, starts, target_time, predicted, target):
+    rows = pd.DataFrame({'target_time': target_time, 'predicted': predicted, 'target': target})
+    row_hash = pd.util.hash_pandas_object(rows, index=False).to_numpy()
+    return np.add.reduceat(row_hash[order], starts)
+
+
+#Daily statistics and error sketch of the rows in the changed groups, one frame per subset ('all', and 'daytime' for solar).
+#The sketch of each day is kept as two list columns, its bin codes and their counts.
+def changed_day_statistics(group_codes, changed, group_keys, content_hash, predicted, target, power_type, relative_accuracy=sketch_relative_accuracy, daytime=None):
+    new_code = np.cumsum(changed) - 1
+    in_changed = changed[group_codes]
+    codes = new_code[group_codes[in_changed]]
+    error = predicted[in_changed] - target[in_changed]
+    n_groups = int(changed.sum())
+
+    subsets = {'all': np.ones(len(codes), dtype=bool)}
+    if power_type == 'solar':
+        subsets['daytime'] = (target != 0 if daytime is None else daytime)[in_changed]
+
+    frames = []
+    for subset, rows in subsets.items():
+        statistics = grouped_error_statistics(codes[rows], error[rows], n_groups)
+        frame = {
+            'power_type': power_type,
+            'horizon': group_keys[changed] // 1_000_000,
+            'day_id': group_keys[changed] % 1_000_000,
+            'subset': subset,
+            'content_hash': content_hash[changed],
+        }
+        for column, statistic in statistic_columns.items():
+            frame[column] = statistics[statistic]
+
+        bin_groups, bin_codes, bin_counts = grouped_sketch_bins(codes[rows], error[rows], relative_accuracy)
+        group_starts = np.searchsorted(bin_groups, np.arange(1, n_groups))
+        frame['sketch_code'] = np.split(bin_codes, group_starts)
+        frame['sketch_count'] = np.split(bin_counts, group_starts)
+        frames.append(pd.DataFrame(frame))
+    return frames
+
+
+#Time range (first and last target_time in ms) and a signature of every row group of a parquet file,
+#from the file metadata only: its row count and, for every column, the compressed size and the
+#min/max/null count statistics. None when target_time has no statistics.
+def row_group_signatures(path):
+    parquet_file = pq.ParquetFile(path)
+    time_index = parquet_file.schema_arrow.names.index('target_time')
+    signatures = []
+    for i in range(parquet_file.metadata.num_row_groups):
+        row_group = parquet_file.metadata.row_group(i)
+        time_statistics = row_group.column(time_index).statistics
+        if time_statistics is None or not time_statistics.has_min_max:
+            return None
+
+        description = [row_group.num_rows]
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            statistics = column.statistics
+            has_min_max = statistics is not None and statistics.has_min_max
+            description.append((column.total_compressed_size, statistics.min if has_min_max else None, statistics.max if has_min_max else None, statistics.null_count if statistics is not None else None))
+        first_ms, last_ms = to_epoch_ms(pd.Series([time_statistics.min, time_statistics.max]))
+        signatures.append([int(first_ms), int(last_ms), hashlib.sha1(repr(description).encode()).hexdigest()[:16]])
+    return signatures
+
+
+#First and last local day holding rows of a row group that is new, changed or gone since the stored
+#run, from the row group signatures of both runs. (None, None) when no row group changed, and None
+#when that cannot be told from the signatures and the whole files have to be read.
+def changed_day_range(previous_groups, current_groups, zone_key):
+    if not previous_groups or any(previous_groups.get(kind) is None or groups is None for kind, groups in current_groups.items()):
+        return None
+
+    changed_ms = []
+    for kind, groups in current_groups.items():
+        previous = {tuple(group) for group in previous_groups[kind]}
+        for first_ms, last_ms, _ in previous ^ {tuple(group) for group in groups}:
+            changed_ms.extend([first_ms, last_ms])
+    if not changed_ms:
+        return None, None
+    day_ids = local_day_id(np.array(changed_ms, dtype=np.int64), zone_key)
+    return int(day_ids.min()), int(day_ids.max())
+
+
+#Updating the stored daily statistics of a zone from its predicted and target files.
+#When the files did not change since the last run nothing is read. Otherwise only the local days of
+#the row groups that changed are read (see changed_day_range), e.g. just the new days after an append.
+#Their rows are hashed per (power_type, horizon, day) and statistics are only computed for days whose
+#hash changed or that are new, days of that range that are no longer in the files are dropped.
+#Row groups are compared by their metadata, so a rewrite that changes values without changing any
+#statistic or compressed size goes unnoticed. Returns the number of days that were (re)computed.
+#night_rule selects the solar hours of the 'daytime' subset (see DaylightMask).
+def update_store(zone_key, horizons=all_horizons, power_types=power_types, predicted_path=None, target_path=None, store_dir=store_dir, relative_accuracy=sketch_relative_accuracy, night_rule='target_zero'):
+    paths = [predicted_path or zone_file(zone_key, 'predicted'), target_path or zone_file(zone_key, 'target')]
+    selection = f'{sorted(set(horizons))}:{list(power_types)}'
+    settings = {'run_key': f'{source_fingerprint(paths)}:{selection}', 'selection': selection, 'relative_accuracy': relative_accuracy, 'night_rule': night_rule}
+    stored, stored_settings = read_store(zone_key, store_dir)
+    if stored is not None and stored_settings.get('run_key') == settings['run_key'] and all(stored_settings.get(name) == str(settings[name]) for name in ['relative_accuracy', 'night_rule']):
+        return 0
+    if any(stored_settings.get(name) != str(settings[name]) for name in ['relative_accuracy', 'night_rule']):
+        # Sketches of another accuracy cannot be merged with new ones and another night rule
+        # changes the daytime subset of every day, so every day is rebuilt
+        stored = None
+
+    current_groups = {'predicted': row_group_signatures(paths[0]), 'target': row_group_signatures(paths[1])}
+    settings['row_groups'] = json.dumps(current_groups)
+
+    # Other horizons or power types change the days of the store, the whole files are read then
+    start, end = None, None
+    frames = []
+    if stored is not None and stored_settings.get('selection') == selection:
+        day_range = changed_day_range(json.loads(stored_settings.get('row_groups', 'null')), current_groups, zone_key)
+        if day_range == (None, None):
+            write_store(stored, settings, zone_key, store_dir)
+            return 0
+        if day_range is not None:
+            first_day, last_day = day_range
+            start = day_id_to_timestamp([first_day], zone_key)[0]
+            end = day_id_to_timestamp([last_day + 1], zone_key)[0] - pd.Timedelta(milliseconds=1)
+            in_range = stored['day_id'].between(first_day, last_day)
+            frames.append(stored[~in_range])
+            stored = stored[in_range]
+
+    arrays = load_all_horizons(zone_key, horizons, start, end, power_types, *paths)
+    keys = day_key(arrays['horizon'], local_day_id(arrays['target_time'], zone_key))
+    group_keys, group_codes = np.unique(keys, return_inverse=True)
+    order = np.argsort(group_codes, kind='stable')
+    starts = np.searchsorted(group_codes[order], np.arange(len(group_keys)))
+
+    days_computed = 0
+    for power_type in power_types:
+        if len(group_keys) == 0:
+            break
+        predicted = arrays['predicted'][power_type]
+        target = arrays['target'][power_type]
+        content_hash = group_content_hash(order, starts, arrays['target_time'], predicted, target)
+
+        changed = np.ones(len(group_keys), dtype=bool)
+        if stored is not None:
+            previous = stored[(stored['power_type'] == power_type) & (stored['subset'] == 'all')]
+            previous_keys = day_key(previous['horizon'], previous['day_id'])
+            order_previous = np.argsort(previous_keys, kind='stable')
+            found, position = sorted_merge_join(group_keys, previous_keys[order_previous])
+            changed[found] = previous['content_hash'].to_numpy()[order_previous][position] != content_hash[found]
+
+            # Keeping the stored rows of the days that did not change
+            unchanged_keys = group_keys[~changed]
+            stored_rows = stored[stored['power_type'] == power_type]
+            frames.append(stored_rows[np.isin(day_key(stored_rows['horizon'], stored_rows['day_id']), unchanged_keys)])
+
+        if changed.any():
+            daytime = daytime_rows(night_rule, target, arrays['target_time'], zone_key) if power_type == 'solar' else None
+            frames.extend(changed_day_statistics(group_codes, changed, group_keys, content_hash, predicted, target, power_type, relative_accuracy, daytime))
+        days_computed += int(changed.sum())
+
+    df_store = pd.concat(frames, ignore_index=True)
+    df_store = df_store.sort_values(['power_type', 'horizon', 'day_id', 'subset'], ignore_index=True)
+    write_store(df_store, settings, zone_key, store_dir)
+    return days_computed
+
+
+#Local day id of a window bound, dates without a timezone are local dates of the zone
+def window_day_id(value, zone_key):
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(timezone_mapping[zone_key]).tz_localize(None)
+    return np.datetime64(timestamp.date(), 'D').astype(np.int64)
+
+
+#First day id of the period (of pandas period frequency freq) that each day belongs to
+def period_day_id(day_ids, freq):
+    days = pd.DatetimeIndex(np.asarray(day_ids, dtype=np.int64).astype('datetime64[D]'))
+    return days.to_period(freq).start_time.values.astype('datetime64[D]').astype(np.int64)
+
+
+#Merging the stored sketches of the rows in each group (group_ids) and taking quantile q of the error,
+#or of the absolute error with absolute=True. scale divides the error of each row (day) first, e.g. by
+#its capacity. The bins of a day are then moved to the bins of the scaled values, which can add up to
+#one more relative accuracy to the error of the quantile.
+def sketch_quantile(df, group_ids, n_groups, q, absolute=False, relative_accuracy=sketch_relative_accuracy, scale=None):
+    lengths = df['sketch_code'].map(len).to_numpy()
+    if lengths.sum() == 0:
+        return np.full(n_groups, np.nan)
+    groups = np.repeat(group_ids, lengths)
+    codes = np.concatenate(df['sketch_code'].to_list()).astype(np.int64)
+    counts = np.concatenate(df['sketch_count'].to_list()).astype(np.int64)
+    if scale is not None:
+        codes = encode_values(decode_bins(codes, relative_accuracy) / np.repeat(scale, lengths), relative_accuracy)
+    groups, codes, counts = merge_bins(groups, codes, counts)
+    return grouped_quantile(groups, codes, counts, n_groups, q, relative_accuracy, absolute)
+
+
+#Combining stored daily statistics into the statistics of each period. The standard deviation is
+#merged with the parallel algorithm of Chan et al.: the within-day sums of squared deviations plus
+#count * (day mean - period mean)^2 for every day. The median of the absolute error comes from the
+#merged sketches when with_median is set. scale divides the error of each day (see scale_statistics).
+def combine_statistics(df, by, with_median=False, relative_accuracy=sketch_relative_accuracy, scale=None):
+    if scale is not None:
+        df = scale_statistics(df, scale)
+    has_rows = df['count'] > 0
+    df = df.assign(day_mean=(df['sum_error'] / df['count']).where(has_rows))
+    grouped = df.groupby(by, sort=True)
+    combined = grouped[['count', 'sum_error', 'sum_abs_error', 'sum_squared_error', 'sum_squared_deviation']].sum()
+
+    period_mean = grouped['sum_error'].transform('sum') / grouped['count'].transform('sum')
+    between = (df['count'] * (df['day_mean'] - period_mean) ** 2).where(has_rows, 0)
+    combined['sum_squared_deviation'] += between.groupby([df[column] for column in by], sort=True).sum().to_numpy()
+    combined['median_squared_error'] = grouped['median_squared_error'].first().where(grouped.size() == 1)
+
+    count = combined['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        statistics = pd.DataFrame({
+            'count': count,
+            'mean': combined['sum_error'] / count,
+            'mean_abs': combined['sum_abs_error'] / count,
+            'root_mean_square': np.sqrt(combined['sum_squared_error'] / count),
+            'root_median_square': np.sqrt(combined['median_squared_error']),
+            'std': np.sqrt(combined['sum_squared_deviation'] / (count - 1)).where(count >= 2),
+        })
+    if with_median:
+        statistics['median_abs'] = sketch_quantile(df, grouped.ngroup().to_numpy(), len(statistics), 0.5, True, relative_accuracy, scale)
+    return statistics
+
+
+#Stored daily statistics of the error divided by scale (one value per row), the squared sums and
+#the median of the squared error by scale squared. The sketches are scaled in sketch_quantile.
+def scale_statistics(df, scale):
+    df = df.copy()
+    for column in ['sum_error', 'sum_abs_error']:
+        df[column] = df[column] / scale
+    for column in ['sum_squared_error', 'sum_squared_deviation', 'median_squared_error']:
+        df[column] = df[column] / scale ** 2
+    return df
+
+
+#Stored days of a zone in the window, with the period each day belongs to (see rollup_metrics)
+def window_days(zone_key, start=None, end=None, horizons=None, power_types=power_types, freq='D', store_dir=store_dir):
+    stored, settings = read_store(zone_key, store_dir)
+    if stored is None:
+        raise FileNotFoundError(f'No daily statistics stored for {zone_key}, run update_store first')
+
+    selected = stored['power_type'].isin(power_types)
+    if horizons is not None:
+        selected &= stored['horizon'].isin(list(horizons))
+    if start is not None:
+        selected &= stored['day_id'] >= window_day_id(start, zone_key)
+    if end is not None:
+        selected &= stored['day_id'] <= window_day_id(end, zone_key)
+    df = stored[selected]
+
+    if freq == 'D':
+        period = df['day_id']
+    elif freq is None:
+        period = pd.Series(df['day_id'].min(), index=df.index)
+    else:
+        period = pd.Series(period_day_id(df['day_id'], freq), index=df.index)
+    return df.assign(period=period), float(settings['relative_accuracy'])
+
+
+#Rolling the stored daily statistics up into metrics for any window, as a tidy table like
+#MultiHorizon.evaluate_horizons. freq='D' gives daily values, another pandas period frequency ('W', 'M')
+#one value per period starting at the day column, and None one value for the whole window.
+#nrmdse is exact for daily values and comes from the merged sketches for longer periods, like nmdae
+#(median absolute error / capacity). Both are then within the relative accuracy of the store.
+#Without a capacity per power type every day is normalized by the registry capacity at its local midnight,
+#capacity steps start at local midnight so that is the capacity of the whole day.
+def rollup_metrics(zone_key, start=None, end=None, horizons=None, metrics=list(metric_statistics), power_types=power_types, capacity=None, freq='D', store_dir=store_dir):
+    df, relative_accuracy = window_days(zone_key, start, end, horizons, power_types, freq, store_dir)
+
+    # The lower median of the absolute error is the square root of the lower median of the squared error
+    statistic_names = {**metric_statistics, **sketch_metrics}
+    if freq != 'D':
+        statistic_names['nrmdse'] = 'median_abs'
+    with_median = any(statistic_names[metric] == 'median_abs' for metric in metrics)
+
+    # Capacity of every stored day, taken at its local midnight
+    day_start_ms = to_epoch_ms(day_id_to_timestamp(df['day_id'], zone_key))
+    capacity_mw = np.ones(len(df))
+    for power_type in power_types:
+        rows = (df['power_type'] == power_type).to_numpy()
+        capacity_mw[rows] = capacity[power_type] if capacity else capacity_at(zone_key, power_type, day_start_ms[rows])
+
+    # With one capacity per power type in the window the combined statistics are divided by it,
+    # otherwise every day is scaled by its own capacity before the days are combined
+    scale = None
+    divisor = {}
+    for power_type in power_types:
+        capacities = np.unique(capacity_mw[(df['power_type'] == power_type).to_numpy()])
+        if len(capacities) > 1:
+            scale = capacity_mw
+        divisor[power_type] = capacities[0] if len(capacities) else 1
+    if scale is not None:
+        divisor = dict.fromkeys(power_types, 1)
+    statistics = combine_statistics(df, ['power_type', 'subset', 'horizon', 'period'], with_median, relative_accuracy, scale)
+
+    tables = []
+    for power_type in power_types:
+        for metric in metrics:
+            subset = 'daytime' if power_type == 'solar' and (metric in night_excluded_metrics or metric in sketch_metrics) else 'all'
+            if (power_type, subset) not in statistics.index.droplevel(['horizon', 'period']):
+                continue
+            selected = statistics.loc[(power_type, subset)]
+            selected = selected[selected['count'] > 0]
+            tables.append(pd.DataFrame({
+                'zone': zone_key,
+                'horizon': selected.index.get_level_values('horizon').to_numpy(),
+                'power_type': power_type,
+                'day': day_id_to_timestamp(selected.index.get_level_values('period'), zone_key),
+                'metric': metric,
+                'value': selected[statistic_names[metric]].to_numpy() / divisor[power_type],
+            }))
+
+    return pd.concat(tables, ignore_index=True)
+
+
+#Quantiles of the error in MW over one or more zones, merged from the stored daily sketches without
+#reading any rows. One row per (power_type, horizon, period) and quantile, the metric is named after
+#the quantile (error_q0.5, abs_error_q0.9). Days are local dates of each zone, so the day column has no timezone.
+#subset 'daytime' leaves out solar hours with zero target production.
+def rollup_quantiles(zones, quantiles=[0.5], start=None, end=None, horizons=None, power_types=power_types, freq=None, absolute=False, subset='all', store_dir=store_dir):
+    frames = []
+    accuracies = set()
+    for zone_key in zones:
+        df, relative_accuracy = window_days(zone_key, start, end, horizons, power_types, freq, store_dir)
+        frames.append(df[(df['subset'] == subset) | ((df['subset'] == 'all') & (df['power_type'] != 'solar'))])
+        accuracies.add(relative_accuracy)
+    if len(accuracies) > 1:
+        raise ValueError('The stores of these zones use sketches of a different relative accuracy')
+    df = pd.concat(frames, ignore_index=True)
+    relative_accuracy = accuracies.pop()
+
+    grouped = df.groupby(['power_type', 'horizon', 'period'], sort=True)
+    group_ids = grouped.ngroup().to_numpy()
+    labels = grouped.size().index
+    name = 'abs_error' if absolute else 'error'
+
+    tables = []
+    for q in quantiles:
+        values = sketch_quantile(df, group_ids, len(labels), q, absolute, relative_accuracy)
+        tables.append(pd.DataFrame({
+            'zone': '+'.join(zones),
+            'horizon': labels.get_level_values('horizon').to_numpy(),
+            'power_type': labels.get_level_values('power_type').to_numpy(),
+            'day': pd.DatetimeIndex(labels.get_level_values('period').to_numpy().astype('datetime64[D]')),
+            'metric': f'{name}_q{q:g}',
+            'value': values,
+        }))
+
+    return pd.concat(tables, ignore_index=True).dropna(subset=['value'])
@@ -0,0 +1,63 @@
+import functools
+import numpy as np
+import pandas as pd
+from ZoneRegistry import timezone_mapping
+
+ms_per_day = 86_400_000
+
+# Years covered by the UTC offset tables, outside them the first/last offset is used
+first_table_year = 2010
+last_table_year = 2040
+
+
+#Building the UTC offset table of a zone once: the UTC times (ms) at which the offset changes
+#(daylight saving time) and the offset in ms that holds from each of them on.
+#The offsets are sampled every 15 minutes, which catches every transition of the zones we use.
+@functools.lru_cache(maxsize=None)
+def offset_transitions(zone_key):
+    grid = pd.date_range(f'{first_table_year}-01-01', f'{last_table_year}-01-01', freq='15min', tz='UTC')
+    local_wall_time = grid.tz_convert(timezone_mapping[zone_key]).tz_localize(None)
+    offsets = (local_wall_time.asi8 - grid.asi8) // 1_000_000
+
+    changes = np.flatnonzero(np.diff(offsets)) + 1
+    transition_ms = np.concatenate([[np.iinfo(np.int64).min], grid.asi8[changes] // 1_000_000])
+    transition_offset = np.concatenate([[offsets[0]], offsets[changes]])
+    return transition_ms, transition_offset
+
+
+#Converting target_time values (ms epochs, or timestamps as in the naive files) to int64 ms since epoch
+def to_epoch_ms(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.DatetimeIndex(values).as_unit('ns').asi8 // 1_000_000
+    return np.asarray(values, dtype=np.int64)
+
+
+#UTC offset in ms of each epoch in the local time of the zone
+def utc_offset_ms(epoch_ms, zone_key):
+    transition_ms, transition_offset = offset_transitions(zone_key)
+    return transition_offset[np.searchsorted(transition_ms, epoch_ms, side='right') - 1]
+
+
+#Local calendar day of each epoch as an integer (days since 1970-01-01 in local time).
+#Used for daily grouping instead of normalizing tz-aware timestamps.
+def local_day_id(epoch_ms, zone_key):
+    epoch_ms = np.asarray(epoch_ms, dtype=np.int64)
+    return (epoch_ms + utc_offset_ms(epoch_ms, zone_key)) // ms_per_day
+
+
+#Local midnight of each day id as tz-aware timestamps, like the index of resample('D')
+def day_id_to_timestamp(day_ids, zone_key):
+    midnight = pd.DatetimeIndex(np.asarray(day_ids, dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]'))
+    return midnight.tz_localize(timezone_mapping[zone_key], ambiguous='NaT', nonexistent='shift_forward')
+
+
+#Local time of each epoch as tz-aware timestamps
+def epoch_ms_to_local(epoch_ms, zone_key):
+    return pd.to_datetime(np.asarray(epoch_ms, dtype=np.int64), unit='ms', utc=True).tz_convert(timezone_mapping[zone_key])
+
+
+#Converting df['target_time'] to the local time of the zone. Works on ms epochs as well as on
+#timestamps, so calling it on a frame that was already converted does not change anything.
+def convert_to_local_time(df, zone_key):
+    df['target_time'] = epoch_ms_to_local(to_epoch_ms(df['target_time']), zone_key)
+    return df
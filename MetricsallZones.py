@@ -1,9 +1,11 @@
-import matplotlib.pyplot as plt
-import pyarrow.parquet as pq
 import pandas as pd
-import pytz
-import numpy as np 
-from scipy.stats import spearmanr
+from ParquetLoader import zone_from_path
+from AlignedFrameStore import aligned_frame
+from DailyMetrics import daily_metrics, daily_metrics_wide, metric_statistics
+from RankMetrics import daily_spearman
+from RelativeError import daily_relative_mae
+from ParallelRunner import evaluate_zones
+from ZoneRegistry import zone_names
 
 # Dictionary mapping predicted file paths to target file paths
 target_predicted_files = {
@@ -11,329 +13,93 @@ target_predicted_files = {
     'data/target_and_predicted/US-TEX-ERCO_predicted.parquet': 'data/target_and_predicted/US-TEX-ERCO_target.parquet',
 }
 
-naive_CAL = 'naive_forecast_US-CAL-CISO.parquet'
-naive_TEX = 'naive_forecast_US-TEX-ERCO.parquet'
-
-# Timezone mapping for each zone
-timezone_mapping = {
-    'US-CAL-CISO': 'America/Los_Angeles',  # California Time Zone
-    'US-TEX-ERCO': 'America/Chicago',      # Texas Time Zone
-}
-
 power_types = ['wind', 'solar']
 
-zone_capacity_mw = {
-    'US-CAL-CISO': {'solar': 19700, 'wind': 6030},
-    'US-TEX-ERCO': {'solar': 13500, 'wind': 37000},
-}
+# Solar hours left out as nighttime: 'target_zero', 'solar_position' or None (see DaylightMask)
+night_rule = 'target_zero'
 
-def convert_to_local_time(df, zone_key):
-    df['target_time'] = pd.to_datetime(df['target_time'], unit='ms', utc=True)
-    local_timezone = pytz.timezone(timezone_mapping[zone_key])
-    df['target_time'] = df['target_time'].dt.tz_convert(local_timezone)
-    return df
+# Baseline of the MRAE (see Baselines), the same hour of the latest day known at the forecast horizon
+mrae_baseline = 'persistence_24h'
 
+# Evaluation window in local time, the end is included as an instant (its 00:00 hour) like in the other scripts
+window_start = '2024-01-01'
+window_end = '2024-01-15'
 
-def split_horizon(df_predicted, df_target):
-    zone_key = df_predicted['zone_key'].iloc[0]
-    
-    df_predicted = convert_to_local_time(df_predicted, zone_key)
-    df_target = convert_to_local_time(df_target, zone_key)
-    
-    df_predicted = df_predicted[df_predicted["horizon"] == 24]
-    df_target = df_target[df_target["horizon"] == 24]
-    
-    df_combined = pd.merge(df_predicted, df_target, on='target_time', suffixes=('_pred', '_target'))
-    
-    start_date = pd.Timestamp('2024-01-01', tz=timezone_mapping[zone_key])
-    end_date = pd.Timestamp('2024-01-15', tz=timezone_mapping[zone_key])
-    
-    df_combined = df_combined[(df_combined['target_time'] >= start_date) & (df_combined['target_time'] <= end_date)]
+#Returning the merged predicted and target rows for horizon 24 in the evaluation window.
+#The merged frame is cached per zone, so every metric after the first one reuses it.
+def split_horizon(predicted_file, target_file):
+    zone_key = zone_from_path(predicted_file)
+    df_combined = aligned_frame(zone_key, 24, window_start, window_end, predicted_path=predicted_file, target_path=target_file)
     df_combined.set_index('target_time', inplace=True)
-    
     return df_combined
 
 
-#Calculate daily NMAE normalized by capacity for solar and wind
-def nmae(df_combined):
-    zone = df_combined['zone_key_pred'].iloc[0]
-
-    for power_type in power_types:
-        df_combined[f'abs_error_{power_type}'] = np.abs(df_combined[f'power_production_{power_type}_avg_pred'] - df_combined[f'power_production_{power_type}_avg_target'])
-        
-        
-        # If the power type is 'solar', exclude entries where predicted values are zero
-        if power_type == 'solar':
-            # Filter out rows where the predicted solar production is zero
-            df_filtered = df_combined[df_combined[f'power_production_{power_type}_avg_target'] != 0]
-            # Calculate NRMSE for solar with non-zero predictions
-            df_combined[f'nmae_{power_type}'] = df_filtered[f'abs_error_{power_type}'].resample('D').mean() / zone_capacity_mw[zone][power_type]
-        else:
-            # Calculate NRMSE normally for other types
-            df_combined[f'nmae_{power_type}'] = df_combined[f'abs_error_{power_type}'].resample('D').mean() / zone_capacity_mw[zone][power_type]
-        """
-
-
-        df_combined[f'abs_error_{power_type}'] = np.abs(df_combined[f'power_production_{power_type}_avg_pred'] - df_combined[f'power_production_{power_type}_avg_target'])
-        capacity = zone_capacity_mw[zone][power_type]
-        df_combined[f'nmae_{power_type}'] = df_combined[f'abs_error_{power_type}'].resample('D').mean() / capacity
-        """
-    return df_combined
-
-
-#calculate daily NRMSE normalized by capacity for solar and wind
-def nrmse(df_combined):
-    zone = df_combined['zone_key_pred'].iloc[0]
-
-    for power_type in power_types:
-
-        # Calculate the errors
-        df_combined[f'error_{power_type}'] = (df_combined[f'power_production_{power_type}_avg_pred'] - df_combined[f'power_production_{power_type}_avg_target'])
-
-        """
-        # If the power type is 'solar', exclude entries where predicted values are zero
-        if power_type == 'solar':
-            # Filter out rows where the predicted solar production is zero
-            df_filtered = df_combined[df_combined[f'power_production_{power_type}_avg_target'] != 0]
-            # Calculate NRMSE for solar with non-zero predictions
-            df_combined[f'nrmse_{power_type}'] = np.sqrt((df_filtered[f'error_{power_type}'] ** 2).resample('D').mean()) / zone_capacity_mw[zone][power_type]
-        else:
-            # Calculate NRMSE normally for other types
-            df_combined[f'nrmse_{power_type}'] = np.sqrt((df_combined[f'error_{power_type}'] ** 2).resample('D').mean()) / zone_capacity_mw[zone][power_type]
-        """
-
-        df_combined[f'error_{power_type}'] = (df_combined[f'power_production_{power_type}_avg_pred'] - df_combined[f'power_production_{power_type}_avg_target'])
-        capacity = zone_capacity_mw[zone][power_type]
-        df_combined[f'nrmse_{power_type}'] = np.sqrt((df_combined[f'error_{power_type}'] ** 2).resample('D').mean()) / capacity
-        
-    return df_combined
+#Calculate the daily error metrics normalized by capacity (nmae, nrmse, nrmdse, nmbe, nsde) for solar and wind.
+#All requested metrics come out of one pass over the merged frame, every hour is normalized by the
+#capacity of the zone registry at that hour.
+def error_metrics(df_combined, metric_types):
+    table = daily_metrics(df_combined, metric_types, power_types, night_rule=night_rule)
+    return daily_metrics_wide(table)
 
 
-#calculate daily NRMdSE normalized by capacity for solar and wind
-def nrmdse(df_combined):
-    zone = df_combined['zone_key_pred'].iloc[0]
-
-    for power_type in power_types:
-        df_combined[f'error_{power_type}'] = (df_combined[f'power_production_{power_type}_avg_pred'] - df_combined[f'power_production_{power_type}_avg_target'])
-        
-        
-        # If the power type is 'solar', exclude entries where predicted values are zero
-        if power_type == 'solar':
-            # Filter out rows where the predicted solar production is zero
-            df_filtered = df_combined[df_combined[f'power_production_{power_type}_avg_target'] != 0]
-            # Calculate NRMSE for solar with non-zero predictions
-            df_combined[f'nrmdse_{power_type}'] = np.sqrt((df_filtered[f'error_{power_type}'] ** 2).resample('D').median()) / zone_capacity_mw[zone][power_type]
-        else:
-            # Calculate NRMSE normally for other types
-             df_combined[f'nrmdse_{power_type}'] = np.sqrt((df_combined[f'error_{power_type}'] ** 2).resample('D').median()) / zone_capacity_mw[zone][power_type]
-        """
-
-        df_combined[f'error_{power_type}'] = (df_combined[f'power_production_{power_type}_avg_pred'] - df_combined[f'power_production_{power_type}_avg_target'])
-        capacity = zone_capacity_mw[zone][power_type]
-        df_combined[f'nrmdse_{power_type}'] = np.sqrt((df_combined[f'error_{power_type}'] ** 2).resample('D').median()) / capacity
-        """
-    return df_combined
-
-
-#calculate daily NMBE normalized by capacity for solar and wind
-def nmbe(df_combined):
-    zone = df_combined['zone_key_pred'].iloc[0]
-
-    for power_type in power_types:
-
-        df_combined[f'error_{power_type}'] = (df_combined[f'power_production_{power_type}_avg_pred'] - df_combined[f'power_production_{power_type}_avg_target'])
-        
-        # If the power type is 'solar', exclude entries where predicted values are zero
-        if power_type == 'solar':
-            # Filter out rows where the predicted solar production is zero
-            df_filtered = df_combined[df_combined[f'power_production_{power_type}_avg_target'] != 0]
-            # Calculate NRMSE for solar with non-zero predictions
-            df_combined[f'nmbe_{power_type}'] = df_filtered[f'error_{power_type}'].resample('D').mean() / zone_capacity_mw[zone][power_type]
-        else:
-            # Calculate NRMSE normally for other types
-            df_combined[f'nmbe_{power_type}'] = df_combined[f'error_{power_type}'].resample('D').mean() / zone_capacity_mw[zone][power_type]
-
-        
-        #df_combined[f'error_{power_type}'] = (df_combined[f'power_production_{power_type}_avg_pred'] - df_combined[f'power_production_{power_type}_avg_target'])
-        #capacity = zone_capacity_mw[zone][power_type]
-        #df_combined[f'nmbe_{power_type}'] = df_combined[f'error_{power_type}'].resample('D').mean() / capacity
-        
-    return df_combined
-
-#calculate daily NMBE normalized by capacity for solar and wind
-def nsde(df_combined):
-    zone = df_combined['zone_key_pred'].iloc[0]
-
-    for power_type in power_types:
-
-        df_combined[f'error_{power_type}'] = (df_combined[f'power_production_{power_type}_avg_pred'] - df_combined[f'power_production_{power_type}_avg_target'])
-        
-        # If the power type is 'solar', exclude entries where predicted values are zero
-        if power_type == 'solar':
-            # Filter out rows where the predicted solar production is zero
-            df_filtered = df_combined[df_combined[f'power_production_{power_type}_avg_target'] != 0]
-            # Calculate NRMSE for solar with non-zero predictions
-            df_combined[f'nsde_{power_type}'] = df_filtered[f'error_{power_type}'].resample('D').std() / zone_capacity_mw[zone][power_type]
-        else:
-            # Calculate NRMSE normally for other types
-            df_combined[f'nsde_{power_type}'] = df_combined[f'error_{power_type}'].resample('D').std() / zone_capacity_mw[zone][power_type]
-
-        
-        #df_combined[f'error_{power_type}'] = (df_combined[f'power_production_{power_type}_avg_pred'] - df_combined[f'power_production_{power_type}_avg_target'])
-        #capacity = zone_capacity_mw[zone][power_type]
-        #df_combined[f'nsde_{power_type}'] = df_combined[f'error_{power_type}'].resample('D').std() / capacity
-        
-    return df_combined
-
-"""
-#calculate daily mrae for solar and wind
-def mrae(df_combined):
-    zone = df_combined['zone_key_pred'].iloc[0]
-    naive_path = naive_CAL if 'CAL' in zone else naive_TEX
-    df_naive = pq.read_table(naive_path).to_pandas()
-    df_naive.set_index('target_time', inplace=True)
-
-
-    for power_type in power_types:
-        naive_column = f'naive_forecast_{power_type}'
-        forecast_column = f'power_production_{power_type}_avg_pred'
-        actual_column = f'power_production_{power_type}_avg_target'
-
-        df_combined = df_combined.join(df_naive[naive_column], how='inner')
-        
-        # Calculate absolute errors between forecast and actual, and naive and actual
-        df_combined['absolute_pred'] = np.abs(df_combined[forecast_column] - df_combined[actual_column])
-        df_combined['absolute_naive'] = np.abs(df_combined[naive_column] - df_combined[actual_column])
-
-        #calculate mae for forecasted and naive
-        daily_mae_pred = df_combined['absolute_pred'].resample('D').mean()
-        daily_mae_naive = df_combined['absolute_naive'].resample('D').mean()
-
-        df_combined[f'mrae_{power_type}'] = daily_mae_pred / daily_mae_naive
-
-    return df_combined
-"""
-
+#Daily MRAE for solar and wind against mrae_baseline, solar nighttime hours are left out.
+#Model, baseline and target are aligned once by timestamp for both power types (see RelativeError).
 def mrae(df_combined):
-    zone = df_combined['zone_key_pred'].iloc[0]
-    naive_path = naive_CAL if 'CAL' in zone else naive_TEX
-    df_naive = pq.read_table(naive_path).to_pandas()
-    df_naive['target_time'] = pd.to_datetime(df_naive['target_time'], unit='ms', utc=True)
-    df_naive = convert_to_local_time(df_naive, zone)
-    df_naive.set_index('target_time', inplace=True)
-
-    for power_type in power_types:
-        naive_column = f'naive_forecast_{power_type}'
-        forecast_column = f'power_production_{power_type}_avg_pred'
-        actual_column = f'power_production_{power_type}_avg_target'
-
-        df_combined = df_combined.join(df_naive[[naive_column]], how='inner')
-
-        if power_type == 'solar':
-            filtered_df = df_combined[df_combined[forecast_column] != 0]
-            absolute_pred = np.abs(filtered_df[forecast_column] - filtered_df[actual_column])
-            absolute_naive = np.abs(filtered_df[naive_column] - filtered_df[actual_column])
-        else:
-            absolute_pred = np.abs(df_combined[forecast_column] - df_combined[actual_column])
-            absolute_naive = np.abs(df_combined[naive_column] - df_combined[actual_column])
-
-        # Calculating daily MAE for forecasted and naive
-        daily_mae_pred = absolute_pred.resample('D').mean()
-        daily_mae_naive = absolute_naive.resample('D').mean()
+    df_mrae = daily_relative_mae(df_combined, [mrae_baseline], power_types, night_rule=night_rule)
+    return df_mrae.rename(columns={f'mrae_{mrae_baseline}_{power_type}': f'mrae_{power_type}' for power_type in power_types})
 
-        df_combined[f'mrae_{power_type}'] = daily_mae_pred / daily_mae_naive
-
-    return df_combined
-    
-
-"""
-def spearman(df_combined):
-    daily_correlations = {}
-
-    for power_type in power_types:
-        # Group by day and compute Spearman's rank correlation for each day
-        grouped = df_combined.groupby(pd.Grouper(freq='D'))
-        correlations = []
-        dates = []
-
-        for name, group in grouped:
-            correlation, p_value = spearmanr(group[f'power_production_{power_type}_avg_target'], group[f'power_production_{power_type}_avg_pred'])
-            correlations.append(correlation)
-            dates.append(name)
-
-        daily_correlations[power_type] = pd.Series(correlations, index=dates)
-
-    # Convert the dictionary to a DataFrame
-    df_combined = pd.DataFrame(daily_correlations)
-    df_combined.columns = [f'spearman_{col}' for col in df_combined.columns]
-
-    return df_combined
-"""
 
+#Daily Spearman rank correlation for solar and wind, solar nighttime hours are left out
 def spearman(df_combined):
-    daily_correlations = {}
-
-    for power_type in power_types:
-        # Group by day and compute Spearman's rank correlation for each day
-        grouped = df_combined.groupby(pd.Grouper(freq='D'))
-        correlations = []
-        dates = []
+    return daily_spearman(df_combined, power_types, night_rule=night_rule)
 
-        for name, group in grouped:
-            if power_type == 'solar':
-                # Filter out days where solar predictions are zero
-                non_zero_solar = group[group[f'power_production_{power_type}_avg_target'] != 0]
-                correlation, p_value = spearmanr(non_zero_solar[f'power_production_{power_type}_avg_target'], non_zero_solar[f'power_production_{power_type}_avg_pred'])
-            else:
-                correlation, p_value = spearmanr(group[f'power_production_{power_type}_avg_target'], group[f'power_production_{power_type}_avg_pred'])
-
-            correlations.append(correlation)
-            dates.append(name)
+#metric_type is one metric or a list of metrics, several metrics are returned side by side per day
+def metric(predicted_file, target_file, metric_type):
+    df_combined = split_horizon(predicted_file, target_file)
+    metric_types = [metric_type] if isinstance(metric_type, str) else list(metric_type)
 
-        daily_correlations[power_type] = pd.Series(correlations, index=dates)
+    results = []
+    requested_error_metrics = [name for name in metric_types if name in metric_statistics]
+    if requested_error_metrics:
+        results.append(error_metrics(df_combined, requested_error_metrics))
 
-    # Convert the dictionary to a DataFrame and set column names
-    df_correlations = pd.DataFrame(daily_correlations)
-    df_correlations.columns = [f'spearman_{col}' for col in df_correlations.columns]
+    if 'spearman' in metric_types:
+        results.append(spearman(df_combined))
 
-    return df_correlations
+    if 'mrae' in metric_types:
+        df_mrae = mrae(df_combined)
+        mrae_columns = [f'mrae_{power_type}' for power_type in power_types]
+        results.append(df_mrae[mrae_columns].dropna(how='all'))
 
-def metric(predicted_file, target_file, metric_type):
-    df_predicted = pq.read_table(predicted_file).to_pandas()
-    df_target = pq.read_table(target_file).to_pandas()
+    if len(results) == 1:
+        return results[0]
+    return pd.concat(results, axis=1)
 
-    df_combined = split_horizon(df_predicted, df_target)
 
-    if metric_type == 'nmae':  
-        return nmae(df_combined)  
+#Daily metric of every zone in target_predicted_files, keyed by predicted file.
+#Error metrics of all zones and power types are computed in a process pool of workers processes
+#(see ParallelRunner), the other metrics zone by zone.
+def metric_all_zones(metric_type, workers=None):
+    if metric_type not in metric_statistics:
+        return {predicted_file: metric(predicted_file, target_file, metric_type) for predicted_file, target_file in target_predicted_files.items()}
 
-    elif metric_type == 'nrmse':  
-        return nrmse(df_combined)     
+    paths = {zone_from_path(predicted_file): (predicted_file, target_file) for predicted_file, target_file in target_predicted_files.items()}
+    table = evaluate_zones(list(paths), [24], window_start, window_end, [metric_type], power_types, None, paths, workers, night_rule=night_rule)
+    table = table.drop(columns='horizon')
+    return {predicted_file: daily_metrics_wide(table[table['zone'] == zone_key]) for zone_key, (predicted_file, _) in paths.items()}
 
-    elif metric_type == 'nrmdse':  
-        return nrmdse(df_combined)   
-    
-    elif metric_type == 'nmbe':  
-        return nmbe(df_combined)  
-    
-    elif metric_type == 'nsde':  
-        return nsde(df_combined)
-    
-    elif metric_type == 'spearman':  
-        return spearman(df_combined)
-    
-    if metric_type == 'mrae':
-        return mrae(df_combined)
 
+#matplotlib is imported here, so the metric functions can be imported without loading it
+def visualize_daily_metric_all_zones(metric_type, workers=None):
+    import matplotlib.pyplot as plt
 
-def visualize_daily_metric_all_zones(metric_type):
     plt.figure(figsize=(12, 6))
 
-    for predicted_file, target_file in target_predicted_files.items():
-        zone_df = metric(predicted_file, target_file, metric_type).dropna()
+    for predicted_file, zone_df in metric_all_zones(metric_type, workers).items():
+        zone_df = zone_df.dropna()
         zone_df.index = zone_df.index.date
                 
-        zone = 'California' if 'CAL' in predicted_file else 'Texas'
+        zone = zone_names[zone_from_path(predicted_file)]
 
         #plot for wind
         plt.plot(zone_df.index, zone_df[f'{metric_type}_wind'], linestyle='-', marker='o', label=f'Daily {metric_type} for wind in {zone}')
@@ -352,5 +118,6 @@ def visualize_daily_metric_all_zones(metric_type):
     plt.show()
 
 
-#call the function
-visualize_daily_metric_all_zones(metric_type='mrae')
+#call the function, under __main__ so worker processes can import this module
+if __name__ == "__main__":
+    visualize_daily_metric_all_zones(metric_type='mrae')
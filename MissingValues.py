@@ -2,8 +2,9 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import pyarrow.parquet as pq
 import pandas as pd
-import pytz
 import numpy as np 
+from LocalTime import convert_to_local_time
+from ZoneRegistry import timezone_mapping
 
 
 # Define the file paths
@@ -12,20 +13,8 @@ target_predicted_files = {
     'data/target_and_predicted/US-TEX-ERCO_predicted.parquet': 'data/target_and_predicted/US-TEX-ERCO_target.parquet',
 }
 
-# Timezone mapping for each zone
-timezone_mapping = {
-    'US-CAL-CISO': 'America/Los_Angeles',  # California Time Zone
-    'US-TEX-ERCO': 'America/Chicago',      # Texas Time Zone
-}
-
 power_types = ['wind', 'solar']
 
-def convert_to_local_time(df, zone_key):
-    df['target_time'] = pd.to_datetime(df['target_time'], unit='ms', utc=True)
-    local_timezone = pytz.timezone(timezone_mapping[zone_key])
-    df['target_time'] = df['target_time'].dt.tz_convert(local_timezone)
-    return df
-
 def split_horizon(predicted_file, target_file, horizon):
     df_predicted = pq.read_table(predicted_file).to_pandas()
     df_target = pq.read_table(target_file).to_pandas()
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from ParquetLoader import load_zone, value_columns, power_types
+from LocalTime import local_day_id, day_id_to_timestamp
+from Alignment import align_frames, key_horizon_and_time
+from DailyMetrics import grouped_metrics, metric_statistics
+from DaylightMask import daytime_rows
+from ZoneRegistry import capacity_at
+
+# Horizons evaluated in production
+all_horizons = list(range(1, 49))
+
+
+#Reading the predicted and target files of a zone once for all requested horizons and aligning
+#them on (horizon, target_time). Returns the horizon, target_time (ms) and value arrays per kind.
+def load_all_horizons(zone_key, horizons=all_horizons, start=None, end=None, power_types=power_types, predicted_path=None, target_path=None):
+    paths = {'predicted': predicted_path, 'target': target_path}
+    frames = {}
+    columns = {}
+    for kind, path in paths.items():
+        columns[kind] = value_columns(kind, power_types)
+        frames[kind] = load_zone(zone_key, kind, list(horizons), power_types, start, end, path=path, columns=['target_time', 'horizon'] + columns[kind])
+
+    keys, aligned, unmatched = align_frames(frames, columns, by_horizon=True)
+    horizon, epoch_ms = key_horizon_and_time(keys)
+
+    arrays = {'horizon': horizon, 'target_time': epoch_ms}
+    for kind in paths:
+        arrays[kind] = {power_type: aligned[kind][column].astype(float) for power_type, column in zip(power_types, columns[kind])}
+    return arrays
+
+
+#Computing the metric suite for every horizon of a zone from a single read of its files.
+#Rows are grouped on (horizon, local day) with one integer code, so all horizons and days
+#are computed in the same grouped pass. Only compact arrays are returned: the horizons,
+#the local day ids and {power_type: {metric: (values, has_rows)}} over the (horizon, day) groups.
+#night_rule selects the solar nighttime hours left out of the night-excluded metrics (see DaylightMask).
+#Without a capacity per power type the error is normalized by the registry capacity at each hour.
+def horizon_metric_arrays(zone_key, horizons=all_horizons, start=None, end=None, metrics=list(metric_statistics), power_types=power_types, capacity=None, predicted_path=None, target_path=None, night_rule='target_zero'):
+    arrays = load_all_horizons(zone_key, horizons, start, end, power_types, predicted_path, target_path)
+
+    horizon_values, horizon_codes = np.unique(arrays['horizon'], return_inverse=True)
+    day_ids, day_codes = np.unique(local_day_id(arrays['target_time'], zone_key), return_inverse=True)
+    n_groups = len(horizon_values) * len(day_ids)
+    group_codes = horizon_codes * len(day_ids) + day_codes
+
+    results = {}
+    for power_type in power_types:
+        predicted = arrays['predicted'][power_type]
+        target = arrays['target'][power_type]
+        daytime = daytime_rows(night_rule, target, arrays['target_time'], zone_key) if power_type == 'solar' else None
+        capacity_mw = capacity[power_type] if capacity else capacity_at(zone_key, power_type, arrays['target_time'])
+        results[power_type] = grouped_metrics(group_codes, predicted, target, n_groups, metrics, power_type, capacity_mw, daytime)
+
+    return {'horizons': horizon_values, 'day_ids': day_ids, 'results': results}
+
+
+#Building the tidy table with one row per (zone, horizon, power_type, day, metric)
+#from the output of horizon_metric_arrays
+def horizon_metric_table(zone_key, metric_arrays):
+    horizon_values = metric_arrays['horizons']
+    day_ids = metric_arrays['day_ids']
+    days = day_id_to_timestamp(day_ids, zone_key)
+
+    # Horizon and day of every (horizon, day) group
+    group_horizon = np.repeat(horizon_values, len(day_ids))
+    group_day = np.tile(np.arange(len(day_ids)), len(horizon_values))
+
+    tables = []
+    for power_type, results in metric_arrays['results'].items():
+        for metric, (values, has_rows) in results.items():
+            tables.append(pd.DataFrame({
+                'zone': zone_key,
+                'horizon': group_horizon[has_rows],
+                'power_type': power_type,
+                'day': days[group_day[has_rows]],
+                'metric': metric,
+                'value': values[has_rows],
+            }))
+
+    return pd.concat(tables, ignore_index=True)
+
+
+#Evaluating the metric suite for every horizon of a zone as a tidy table
+def evaluate_horizons(zone_key, horizons=all_horizons, start=None, end=None, metrics=list(metric_statistics), power_types=power_types, capacity=None, predicted_path=None, target_path=None, night_rule='target_zero'):
+    metric_arrays = horizon_metric_arrays(zone_key, horizons, start, end, metrics, power_types, capacity, predicted_path, target_path, night_rule)
+    return horizon_metric_table(zone_key, metric_arrays)
+
+
+#Turning the tidy table of one power type into a horizon x day x metric array.
+#Returns the cube and its horizon, day and metric labels, missing combinations are NaN.
+def metric_cube(table, power_type):
+    table = table[table['power_type'] == power_type]
+    horizons = np.sort(table['horizon'].unique())
+    days = pd.DatetimeIndex(table['day'].unique()).sort_values()
+    metrics = list(dict.fromkeys(table['metric']))
+
+    cube = np.full((len(horizons), len(days), len(metrics)), np.nan)
+    horizon_index = np.searchsorted(horizons, table['horizon'].to_numpy())
+    day_index = days.get_indexer(table['day'])
+    metric_index = pd.Index(metrics).get_indexer(table['metric'])
+    cube[horizon_index, day_index, metric_index] = table['value'].to_numpy()
+    return cube, horizons, days, metrics
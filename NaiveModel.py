@@ -1,5 +1,13 @@
+import os
+import numpy as np
 import pandas as pd
-import pytz
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from ParquetLoader import zone_file, time_bound, value_columns, power_types, naive_dataset_dir
+from LocalTime import to_epoch_ms
+from Alignment import sorted_merge_join
 
 # Path to your Parquet files
 target_files = {
@@ -7,49 +15,170 @@ target_files = {
     'US-TEX-ERCO': 'data/target_and_predicted/US-TEX-ERCO_target.parquet',
 }
 
-timezone_mapping = {
-    'US-CAL-CISO': 'America/Los_Angeles',  # California Time Zone
-    'US-TEX-ERCO': 'America/Chicago',      # Texas Time Zone
-}
+# Persistence lags in hours, 168 is the same hour one week earlier. The dataset (see ParquetLoader.naive_dataset_dir)
+# is read with load_zone(kind='naive') and the 'naive_file' baseline, which use the columns of ParquetLoader.naive_lag.
+naive_lags = [24, 48, 168]
+
+ms_per_hour = 3_600_000
+
+
+#Row groups of a parquet file ordered by their first target_time, leaving out the ones that cannot
+#hold the horizon or the time window according to their min/max statistics
+def row_groups_in_time_order(parquet_file, horizon, start_ms=None, end_ms=None):
+    names = parquet_file.schema_arrow.names
+    time_index = names.index('target_time')
+    horizon_index = names.index('horizon')
+
+    row_groups = []
+    for i in range(parquet_file.metadata.num_row_groups):
+        row_group = parquet_file.metadata.row_group(i)
+        time_statistics = row_group.column(time_index).statistics
+        horizon_statistics = row_group.column(horizon_index).statistics
+        if time_statistics is None or horizon_statistics is None or not (time_statistics.has_min_max and horizon_statistics.has_min_max):
+            # Without statistics nothing can be skipped, read the file as it is stored
+            return list(range(parquet_file.metadata.num_row_groups))
+
+        first_ms, last_ms = to_epoch_ms(pd.Series([time_statistics.min, time_statistics.max]))
+        if not horizon_statistics.min <= horizon <= horizon_statistics.max:
+            continue
+        if (start_ms is not None and last_ms < start_ms) or (end_ms is not None and first_ms > end_ms):
+            continue
+        row_groups.append((first_ms, i))
+
+    return [i for _, i in sorted(row_groups)]
+
+
+#Streaming the target values of one horizon in time order, one record batch at a time.
+#Yields the target_time (ms) and {power_type: values} of each batch.
+def stream_target(zone_key, horizon=24, start=None, end=None, power_types=power_types, path=None, batch_size=24 * 31):
+    path = path or zone_file(zone_key, 'target')
+    parquet_file = pq.ParquetFile(path)
+    start_ms = None if start is None else time_bound(start, zone_key, pa.int64()).as_py()
+    end_ms = None if end is None else time_bound(end, zone_key, pa.int64()).as_py()
+
+    columns = value_columns('target', power_types)
+    row_groups = row_groups_in_time_order(parquet_file, horizon, start_ms, end_ms)
+    previous_ms = None
+    for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups, columns=['target_time', 'horizon'] + columns):
+        epoch_ms = to_epoch_ms(batch.column('target_time').to_pandas())
+        keep = batch.column('horizon').to_numpy(zero_copy_only=False) == horizon
+        if start_ms is not None:
+            keep &= epoch_ms >= start_ms
+        if end_ms is not None:
+            keep &= epoch_ms <= end_ms
+        epoch_ms = epoch_ms[keep]
+        if len(epoch_ms) == 0:
+            continue
+
+        if np.any(np.diff(epoch_ms) <= 0) or (previous_ms is not None and epoch_ms[0] <= previous_ms):
+            raise ValueError(f'{path} is not sorted by target_time, rewrite it with ParquetLoader.sort_for_pushdown')
+        previous_ms = epoch_ms[-1]
+
+        values = {power_type: batch.column(column).to_numpy(zero_copy_only=False).astype(float)[keep] for power_type, column in zip(power_types, columns)}
+        yield epoch_ms, values
+
+
+#Writing finished months of naive forecasts to the dataset. The rows are merged into the rows already
+#stored for their month, a new row replaces a stored row of the same target_time and horizon, so
+#rebuilding part of a month keeps the rest of it.
+def write_months(table, dataset_dir=naive_dataset_dir):
+    frames = []
+    for (zone_key, month), df_month in table.to_pandas().groupby(['zone_key', 'month'], sort=False):
+        partition_dir = os.path.join(dataset_dir, f'zone_key={zone_key}', f'month={month}')
+        if os.path.isdir(partition_dir):
+            df_stored = pq.read_table(partition_dir).to_pandas().assign(zone_key=zone_key, month=month)
+            df_month = pd.concat([df_stored, df_month], ignore_index=True).drop_duplicates(['target_time', 'horizon'], keep='last')
+        frames.append(df_month.sort_values(['horizon', 'target_time']))
+    table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True)[table.column_names], schema=table.schema, preserve_index=False)
+    pq.write_to_dataset(table, dataset_dir, partition_cols=['zone_key', 'month'], existing_data_behavior='delete_matching', basename_template='part-{i}.parquet')
+
+
+#Building the persistence (naive) forecasts of a zone for every lag from a stream over its target file.
+#The forecast for target_time t is the target value at t - lag, looked up by timestamp so missing hours
+#give NaN instead of shifting the rows. Between batches only the last max(lags) hours of target values
+#are kept, and rows are written per month once the month is complete, so the memory use does not grow
+#with the length of the history. With a start, the max(lags) hours before it are read as well so the
+#first forecasts have their lagged values. Returns the number of rows written.
+def build_naive_forecast(zone_key, lags=naive_lags, horizon=24, start=None, end=None, power_types=power_types, path=None, dataset_dir=naive_dataset_dir, batch_size=24 * 31):
+    lag_ms = np.asarray(lags, dtype=np.int64) * ms_per_hour
+    start_ms = None if start is None else time_bound(start, zone_key, pa.int64()).as_py()
+    lookback_start = None if start is None else pd.Timestamp(start_ms - lag_ms.max(), unit='ms', tz='UTC')
+    window_ms = np.empty(0, dtype=np.int64)
+    window_values = {power_type: np.empty(0) for power_type in power_types}
+    interval_ms = None
+    pending = None
+    rows_written = 0
+
+    for epoch_ms, values in stream_target(zone_key, horizon, lookback_start, end, power_types, path, batch_size):
+        times = np.concatenate([window_ms, epoch_ms])
+        series = {power_type: np.concatenate([window_values[power_type], values[power_type]]) for power_type in power_types}
+
+        # The lag in periods follows from the sampling interval of the data, not from a fixed row count
+        if interval_ms is None and len(times) > 1:
+            interval_ms = int(np.median(np.diff(times)))
+            if np.any(lag_ms % interval_ms):
+                raise ValueError(f'lags {lags} are not a whole number of periods of {interval_ms // 60_000} minutes')
+
+        # Lookback rows before start are only kept as history
+        if start_ms is not None:
+            rows = epoch_ms >= start_ms
+            epoch_ms = epoch_ms[rows]
+            values = {power_type: values[power_type][rows] for power_type in power_types}
 
-def convert_to_local_time(df, zone_key):
-    # Convert target_time to UTC then to the local timezone for the region
-    df['target_time'] = pd.to_datetime(df['target_time'], unit='ms', utc=True)
-    local_timezone = pytz.timezone(timezone_mapping[zone_key])
-    df['target_time'] = df['target_time'].dt.tz_convert(local_timezone)
-    return df
+        if len(epoch_ms):
+            output = {
+                'target_time': epoch_ms,
+                'horizon': np.full(len(epoch_ms), horizon, dtype=np.int64),
+            }
+            for power_type in power_types:
+                output[f'power_production_{power_type}_avg'] = values[power_type]
+            for lag, lag_value in zip(lags, lag_ms):
+                found, position = sorted_merge_join(epoch_ms - lag_value, times)
+                for power_type in power_types:
+                    naive = np.full(len(epoch_ms), np.nan)
+                    naive[found] = series[power_type][position]
+                    output[f'naive_forecast_{power_type}_{lag}h'] = naive
 
-# Define the specific period
-start_date = pd.Timestamp('2023-07-30', tz='UTC') #change these for different timeframe periods
-end_date = pd.Timestamp('2023-08-16', tz='UTC')
+            month = epoch_ms.astype('datetime64[ms]').astype('datetime64[M]').astype(str)
+            table = pa.table(output).append_column('zone_key', pa.array(np.full(len(epoch_ms), zone_key))).append_column('month', pa.array(month))
+            pending = table if pending is None else pa.concat_tables([pending, table])
 
+            # Months before the month of the last row are complete
+            is_complete = pc.not_equal(pending.column('month'), month[-1])
+            complete = pending.filter(is_complete)
+            if complete.num_rows:
+                write_months(complete, dataset_dir)
+                rows_written += complete.num_rows
+                pending = pending.filter(pc.invert(is_complete))
 
+        # Keeping only the hours that later rows can still look back to
+        in_window = times >= times[-1] - lag_ms.max()
+        window_ms = times[in_window]
+        window_values = {power_type: series[power_type][in_window] for power_type in power_types}
 
-#Assume the frequency of data recording is every half hour
-shift_periods = 96  # 48 hours * 2 half-hours per hour
+    if pending is not None and pending.num_rows:
+        write_months(pending, dataset_dir)
+        rows_written += pending.num_rows
+    return rows_written
 
-# Process each file
-for zone_key, file_path in target_files.items():
-    # Load the dataset
-    df = pd.read_parquet(file_path)
-    
-    # Convert target_time to the local timezone for the region
-    df = convert_to_local_time(df, zone_key)
-    
-    # Filter rows for the defined period
-    # Ensure comparison is between timezone-aware datetimes converted to the right time zone
-    df_period = df[(df['target_time'] >= start_date.tz_convert(timezone_mapping[zone_key])) & 
-                   (df['target_time'] <= end_date.tz_convert(timezone_mapping[zone_key]))]
-    
-    # For naive forecast, shift the values by the correct number of periode
-    df_period = df_period.sort_values('target_time')
-    df_period['naive_forecast_solar'] = df_period.groupby(['zone_key'])['power_production_solar_avg'].shift(shift_periods) #change between solar/wind
-    df_period['naive_forecast_wind'] = df_period.groupby(['zone_key'])['power_production_wind_avg'].shift(shift_periods)
 
-    # Save the result to a new file
-    output_file_path = f'naive_forecast_{zone_key}.parquet'
-    df_period.to_parquet(output_file_path, index=False)
-    print(f"Naive forecast for {zone_key} saved to {output_file_path}")
+#Reading the naive forecasts of a zone back from the dataset, only the partitions of the zone are opened
+def load_naive_forecast(zone_key, lags=naive_lags, start=None, end=None, power_types=power_types, dataset_dir=naive_dataset_dir):
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning='hive')
+    expression = ds.field('zone_key') == zone_key
+    if start is not None:
+        expression &= ds.field('target_time') >= time_bound(start, zone_key, pa.int64())
+    if end is not None:
+        expression &= ds.field('target_time') <= time_bound(end, zone_key, pa.int64())
 
+    columns = ['zone_key', 'target_time', 'horizon'] + value_columns('target', power_types)
+    columns += [f'naive_forecast_{power_type}_{lag}h' for lag in lags for power_type in power_types]
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+    return df.sort_values('target_time', ignore_index=True)
 
 
+# Process each file, the whole history of every zone is streamed
+if __name__ == "__main__":
+    for zone_key, file_path in target_files.items():
+        rows = build_naive_forecast(zone_key, path=file_path)
+        print(f"Naive forecast for {zone_key} ({rows} rows) saved to {naive_dataset_dir}")
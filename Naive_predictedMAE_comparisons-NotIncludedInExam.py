@@ -1,8 +1,10 @@
 import pandas as pd
-import pytz
 import numpy as np
 import matplotlib.pyplot as plt
 import pyarrow.parquet as pq
+from LocalTime import convert_to_local_time, to_epoch_ms
+from ZoneRegistry import timezone_mapping, capacity_at
+from Baselines import baseline_forecasts
 
 # Dictionary mapping predicted file paths to target file paths
 target_predicted_files = {
@@ -10,17 +12,8 @@ target_predicted_files = {
     'data/target_and_predicted/US-TEX-ERCO_predicted.parquet': 'data/target_and_predicted/US-TEX-ERCO_target.parquet',
 }
 
-# Timezone mapping for each zone
-timezone_mapping = {
-    'US-CAL-CISO': 'America/Los_Angeles',
-    'US-TEX-ERCO': 'America/Chicago',
-}
-
-# Capacities in GW, will be converted to MW for calculations
-zone_capacity_gw = {
-    'US-CAL-CISO': {'solar': 19700, 'wind': 6030},
-    'US-TEX-ERCO': {'solar': 13500, 'wind': 37000},
-}
+# Baseline used as the naive forecast (see Baselines)
+naive_baseline = 'persistence_24h'
 
 def split_horizon(df_predicted, df_target, zone_key, horizon):
     df_predicted = convert_to_local_time(df_predicted, zone_key)
@@ -33,15 +26,10 @@ def split_horizon(df_predicted, df_target, zone_key, horizon):
     df_combined = df_combined[(df_combined['target_time'] >= start_date) & (df_combined['target_time'] <= end_date)]
     return df_combined
 
-def convert_to_local_time(df, zone_key):
-    df['target_time'] = pd.to_datetime(df['target_time'], unit='ms', utc=True)
-    local_timezone = pytz.timezone(timezone_mapping[zone_key])
-    df['target_time'] = df['target_time'].dt.tz_convert(local_timezone)
-    return df
-
+#capacity_mw is one capacity or the capacity in MW of every row
 def calculate_nmae(df, column_pred, column_actual, capacity_mw):
     df['abs_error'] = np.abs(df[column_pred] - df[column_actual])
-    daily_nmae = df['abs_error'].resample('D').mean() / capacity_mw
+    daily_nmae = (df['abs_error'] / capacity_mw).resample('D').mean()
     return daily_nmae
 
 def calculate_mrae(df, column_pred, column_actual):
@@ -70,11 +58,11 @@ for predicted_file, target_file in target_predicted_files.items():
     df_combined = pd.merge(df_predicted, df_actual, on='target_time', suffixes=('_pred', '_target'))
     df_combined.set_index('target_time', inplace=True)
 
-    # Set up naive forecast by shifting the actual values
-    df_combined['naive_forecast'] = df_combined[f'power_production_{power_type}_avg_target'].shift(48)
+    # Naive forecast of the horizon for every target time, generated from the target data (see Baselines)
+    df_combined['naive_forecast'] = baseline_forecasts(zone_key, [naive_baseline], to_epoch_ms(df_combined.index), 24, [power_type], target_path=target_file)[naive_baseline][power_type]
 
     # Calculate NMAE for predictive and naive models
-    capacity_mw = zone_capacity_gw[zone_key][power_type]
+    capacity_mw = capacity_at(zone_key, power_type, to_epoch_ms(df_combined.index))
     nmae_predicted = calculate_nmae(df_combined, f'power_production_{power_type}_avg_pred', f'power_production_{power_type}_avg_target', capacity_mw)
     nmae_naive = calculate_nmae(df_combined, 'naive_forecast', f'power_production_{power_type}_avg_target', capacity_mw)
 
@@ -1,15 +1,17 @@
 import pyarrow.parquet as pq
 import numpy as np
-import seaborn as sns
 import matplotlib.pyplot as plt
-from scipy.stats import norm
-from scipy.stats import skew, kurtosis
+from ParquetLoader import zone_from_path
+from DistributionSummary import summarize_zone, distribution_statistics, kde_curve
 
 target_predicted_files = {
     'data/target_and_predicted/US-CAL-CISO_predicted.parquet': 'data/target_and_predicted/US-CAL-CISO_target.parquet',
     'data/target_and_predicted/US-TEX-ERCO_predicted.parquet': 'data/target_and_predicted/US-TEX-ERCO_target.parquet',
 }
 
+# Solar hours left out as nighttime: 'target_zero', 'solar_position' or None (see DaylightMask)
+night_rule = 'target_zero'
+
     
 def predicted_horizon_split():
     predicted_list = []
@@ -25,65 +27,60 @@ def predicted_horizon_split():
     return predicted_list
 
 
-def split_solar_wind(list_files):
+#Distribution summaries of the predicted and target values of every zone, built chunk by chunk from the
+#files (see DistributionSummary). Solar nighttime hours are left out, hours without a predicted or
+#target value are skipped.
+def split_solar_wind(list_files, night_rule=night_rule):
     solar_wind_list = []
     
     for predicted, target in list_files.items():
-        predicted = pq.read_table(predicted).to_pandas()
-        target = pq.read_table(target).to_pandas()
-
-        # Set "target_time" as index for both DataFrames
-        predicted.set_index(['target_time'], inplace=True)
-        target.set_index(['target_time'], inplace=True)
-
-        filtered_target = target[target['power_production_solar_avg'] != 0]
-        filtered_predicted = predicted.loc[filtered_target.index]    
-
-        # Drop nan values only for specified columns
-        cols_to_drop_nan = ["power_production_solar_avg", "power_production_wind_avg"]
-        for col in cols_to_drop_nan:
-            filtered_predicted = filtered_predicted.dropna(subset=[col])    
+        summaries = summarize_zone(zone_from_path(predicted), kinds=['predicted', 'target'], night_rule=night_rule, predicted_path=predicted, target_path=target)
 
         solar_wind_dict = {
-            'predicted_solar': filtered_predicted["power_production_solar_avg"].values,
-            'target_solar': filtered_target["power_production_solar_avg"].values,
-            'predicted_wind': filtered_predicted["power_production_wind_avg"].values,
-            'target_wind': filtered_target["power_production_wind_avg"].values
+            'predicted_solar': summaries[('predicted', 'solar')],
+            'target_solar': summaries[('target', 'solar')],
+            'predicted_wind': summaries[('predicted', 'wind')],
+            'target_wind': summaries[('target', 'wind')]
         }
         solar_wind_list.append(solar_wind_dict)
 
     return solar_wind_list
 
 
+#KDE curve of a summary, smoothed from its histogram
+def plot_density(summary, label, color):
+    plt.plot(*kde_curve(summary), label=label, color=color)
+
+
 def plot_normal_distributions(data_list):
     # Determine common axis limits
 
     for data_dict in data_list:
         # Plot for solar
         plt.subplot(1, 2, 1)  # 1 row, 2 columns, 1st subplot
-        sns.kdeplot(data_dict['predicted_solar'], label='Predicted Solar', color='red')
-        sns.kdeplot(data_dict['target_solar'], label='Target Solar', color='blue')
+        plot_density(data_dict['predicted_solar'], 'Predicted Solar', 'red')
+        plot_density(data_dict['target_solar'], 'Target Solar', 'blue')
         plt.title(f'Solar Energy Distribution')
         plt.xlabel('Power Production')
         plt.ylabel('Density')
         plt.legend()
-        print("Skewness - Predicted Solar:", skew(data_dict['predicted_solar']))
-        print("Kurtosis - Predicted Solar:", kurtosis(data_dict['predicted_solar']))
-        print("Skewness - Target Solar:", skew(data_dict['target_solar']))
-        print("Kurtosis - Target Solar:", kurtosis(data_dict['target_solar']))
+        print("Skewness - Predicted Solar:", distribution_statistics(data_dict['predicted_solar'])['skew'])
+        print("Kurtosis - Predicted Solar:", distribution_statistics(data_dict['predicted_solar'])['kurtosis'])
+        print("Skewness - Target Solar:", distribution_statistics(data_dict['target_solar'])['skew'])
+        print("Kurtosis - Target Solar:", distribution_statistics(data_dict['target_solar'])['kurtosis'])
 
         # Plot for wind
         plt.subplot(1, 2, 2)  # 1 row, 2 columns, 2nd subplot
-        sns.kdeplot(data_dict['predicted_wind'], label='Predicted Wind', color='orange')
-        sns.kdeplot(data_dict['target_wind'], label='Target Wind', color='green')
+        plot_density(data_dict['predicted_wind'], 'Predicted Wind', 'orange')
+        plot_density(data_dict['target_wind'], 'Target Wind', 'green')
         plt.title(f'Wind Energy Distribution')
         plt.xlabel('Power Production')
         plt.ylabel('Density')
         plt.legend()
-        print("Skewness - Predicted Wind:", skew(data_dict['predicted_wind']))
-        print("Kurtosis - Predicted Wind:", kurtosis(data_dict['predicted_wind']))
-        print("Skewness - Target Wind:", skew(data_dict['target_wind']))
-        print("Kurtosis - Target Wind:", kurtosis(data_dict['target_wind']))
+        print("Skewness - Predicted Wind:", distribution_statistics(data_dict['predicted_wind'])['skew'])
+        print("Kurtosis - Predicted Wind:", distribution_statistics(data_dict['predicted_wind'])['kurtosis'])
+        print("Skewness - Target Wind:", distribution_statistics(data_dict['target_wind'])['skew'])
+        print("Kurtosis - Target Wind:", distribution_statistics(data_dict['target_wind'])['kurtosis'])
 
         plt.tight_layout()
         plt.show()
@@ -0,0 +1,106 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from ParquetLoader import power_types
+from DailyMetrics import metric_statistics
+from MultiHorizon import all_horizons, horizon_metric_arrays, horizon_metric_table
+from ZoneRegistry import zones as registered_zones, register_zones
+
+# Worker processes used when no count is given, the METRICS_WORKERS environment variable overrides it
+default_workers = int(os.environ.get('METRICS_WORKERS', os.cpu_count() or 1))
+
+
+#Work done in a worker process: one zone and power type for a batch of horizons and all metrics.
+#The worker reads only the row groups and columns of its zone and power type and sends back
+#the compact arrays of horizon_metric_arrays, not DataFrames.
+def evaluate_task(task):
+    return horizon_metric_arrays(**task)
+
+
+#Process pool of workers processes that know the zones of this process. Workers started with spawn (the
+#default on macOS) import ZoneRegistry again and only have the zones of zones.json, so the registry entries
+#of zones are registered in every worker when it starts, including zones added with register_zone.
+def zone_pool(workers, zones):
+    entries = {zone_key: registered_zones[zone_key] for zone_key in zones}
+    return ProcessPoolExecutor(max_workers=workers, initializer=register_zones, initargs=(entries,))
+
+
+#Splitting the horizons into batches of horizons_per_task, or one batch with all of them
+def horizon_batches(horizons, horizons_per_task=None):
+    horizons = sorted(set(horizons))
+    if not horizons_per_task:
+        return [horizons]
+    return [horizons[i:i + horizons_per_task] for i in range(0, len(horizons), horizons_per_task)]
+
+
+#Putting the arrays of the horizon batches of one zone and power type back together, as if all
+#horizons had been computed in one task. Groups a batch did not have stay empty (has_rows False).
+def merge_horizon_batches(batches):
+    if len(batches) == 1:
+        return batches[0]
+
+    horizon_values = np.concatenate([batch['horizons'] for batch in batches])
+    day_ids = np.unique(np.concatenate([batch['day_ids'] for batch in batches]))
+    n_days = len(day_ids)
+
+    results = {}
+    horizon_offset = 0
+    for batch in batches:
+        # Position of every (horizon, day) group of the batch in the merged groups
+        day_index = np.searchsorted(day_ids, batch['day_ids'])
+        horizon_index = horizon_offset + np.arange(len(batch['horizons']))
+        group_index = (horizon_index[:, None] * n_days + day_index[None, :]).ravel()
+        horizon_offset += len(batch['horizons'])
+
+        for power_type, metrics in batch['results'].items():
+            merged = results.setdefault(power_type, {})
+            for metric, (values, has_rows) in metrics.items():
+                if metric not in merged:
+                    merged[metric] = (np.full(len(horizon_values) * n_days, np.nan), np.zeros(len(horizon_values) * n_days, dtype=bool))
+                merged[metric][0][group_index] = values
+                merged[metric][1][group_index] = has_rows
+
+    return {'horizons': horizon_values, 'day_ids': day_ids, 'results': results}
+
+
+#Evaluating the metric suite for several zones in a process pool, one task per (zone, power_type)
+#and batch of horizons. paths maps a zone to its (predicted_path, target_path) and capacities maps
+#a zone to its capacity per power type, zones not in them use the defaults. With workers=1 the tasks
+#run in this process. The result is the same table as concatenating evaluate_horizons over the zones.
+def evaluate_zones(zones, horizons=all_horizons, start=None, end=None, metrics=list(metric_statistics), power_types=power_types, capacities=None, paths=None, workers=None, horizons_per_task=None, night_rule='target_zero'):
+    workers = workers or default_workers
+    capacities = capacities or {}
+    paths = paths or {}
+
+    tasks = []
+    for zone_key in zones:
+        predicted_path, target_path = paths.get(zone_key, (None, None))
+        for power_type in power_types:
+            for batch in horizon_batches(horizons, horizons_per_task):
+                tasks.append({
+                    'zone_key': zone_key,
+                    'horizons': batch,
+                    'start': start,
+                    'end': end,
+                    'metrics': list(metrics),
+                    'power_types': [power_type],
+                    'capacity': capacities.get(zone_key),
+                    'predicted_path': predicted_path,
+                    'target_path': target_path,
+                    'night_rule': night_rule,
+                })
+
+    if workers == 1 or len(tasks) == 1:
+        results = [evaluate_task(task) for task in tasks]
+    else:
+        with zone_pool(min(workers, len(tasks)), zones) as pool:
+            results = list(pool.map(evaluate_task, tasks))
+
+    # Collecting the batches of each (zone, power_type) in task order, which keeps the serial row order
+    grouped = {}
+    for task, arrays in zip(tasks, results):
+        grouped.setdefault((task['zone_key'], task['power_types'][0]), []).append(arrays)
+
+    tables = [horizon_metric_table(zone_key, merge_horizon_batches(batches)) for (zone_key, _), batches in grouped.items()]
+    return pd.concat(tables, ignore_index=True)
@@ -0,0 +1,146 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from ZoneRegistry import timezone_mapping, zone_files
+
+# Folder holding the <zone>_predicted.parquet and <zone>_target.parquet files
+data_dir = 'data/target_and_predicted'
+
+power_types = ['wind', 'solar']
+
+# Folder of the naive forecast dataset built by NaiveModel, partitioned by zone_key and month (UTC),
+# and the lag in hours of the naive forecast columns read as kind 'naive'
+naive_dataset_dir = 'data/naive_forecast'
+naive_lag = 24
+
+
+#Returning the parquet file for a zone, kind is 'predicted', 'target' or 'naive'.
+#Files listed in the zone registry come first, otherwise the usual file names are used.
+#The naive forecasts of a zone are its partition folder of the NaiveModel dataset.
+def zone_file(zone_key, kind):
+    if kind in zone_files.get(zone_key, {}):
+        return zone_files[zone_key][kind]
+    if kind == 'naive':
+        return os.path.join(naive_dataset_dir, f'zone_key={zone_key}')
+    return os.path.join(data_dir, f'{zone_key}_{kind}.parquet')
+
+
+#Daylight index of a zone: one row per target_time (ms) with a daylight flag, built by ExcludeNighttimeZeroValues_files
+#in the folder of the zone's predicted and target files
+def daylight_index_file(zone_key, directory=data_dir):
+    return os.path.join(directory, f'{zone_key}_daylight.parquet')
+
+
+#Extracting the zone from a file name such as .../US-CAL-CISO_predicted.parquet, or from a
+#partition folder of the naive dataset such as .../zone_key=US-CAL-CISO
+def zone_from_path(path):
+    name = os.path.basename(os.path.normpath(path))
+    if name.startswith('zone_key='):
+        return name[len('zone_key='):]
+    if name.startswith('naive_forecast_'):
+        name = name[len('naive_forecast_'):]
+    return name.split('_')[0].replace('.parquet', '')
+
+
+#Columns holding the power values in a file of the given kind, for the naive kind the forecasts of one lag
+def value_columns(kind, power_types=power_types, lag=naive_lag):
+    if kind == 'naive':
+        return [f'naive_forecast_{power_type}_{lag}h' for power_type in power_types]
+    return [f'power_production_{power_type}_avg' for power_type in power_types]
+
+
+#Converting a date to a scalar of the same type as target_time in the file.
+#Dates without a timezone are read as local time of the zone, like in split_horizon.
+def time_bound(value, zone_key, field_type):
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize(timezone_mapping[zone_key])
+
+    if pa.types.is_timestamp(field_type):
+        return pa.scalar(timestamp.to_pydatetime(), type=field_type)
+    # target_time stored as milliseconds since epoch
+    return pa.scalar(timestamp.value // 1_000_000, type=field_type)
+
+
+#target_times of the zone flagged as daylight (True) or night (False) in its daylight index, within the
+#time window and with the type of time_type. Hours with an unknown flag are in neither of them.
+def daylight_times(zone_key, daylight, time_type, start=None, end=None, index_dir=data_dir):
+    index_path = daylight_index_file(zone_key, index_dir)
+    flag = ds.field('daylight') == daylight
+    time_filter = build_filter(pq.read_schema(index_path), zone_key, start=start, end=end)
+    index = pq.read_table(index_path, columns=['target_time'], filters=flag if time_filter is None else time_filter & flag)
+
+    times = index.column('target_time').combine_chunks()
+    if pa.types.is_timestamp(time_type):
+        times = times.cast(pa.timestamp('ms', tz=time_type.tz)).cast(time_type)
+    return times
+
+
+#Building the row filter that pyarrow uses to skip row groups through their min/max statistics.
+#daylight=True or False keeps only the day or night rows of the daylight index in index_dir.
+def build_filter(schema, zone_key, horizon=None, start=None, end=None, daylight=None, index_dir=data_dir):
+    expression = None
+
+    def combine(condition):
+        return condition if expression is None else expression & condition
+
+    if horizon is not None and 'horizon' in schema.names:
+        if isinstance(horizon, (list, tuple, set, range)):
+            expression = combine(ds.field('horizon').isin(list(horizon)))
+        else:
+            expression = combine(ds.field('horizon') == horizon)
+
+    time_type = schema.field('target_time').type
+    if start is not None:
+        expression = combine(ds.field('target_time') >= time_bound(start, zone_key, time_type))
+    if end is not None:
+        # end is inclusive, like the <= end_date filter in the scripts
+        expression = combine(ds.field('target_time') <= time_bound(end, zone_key, time_type))
+    if daylight is not None:
+        expression = combine(ds.field('target_time').isin(daylight_times(zone_key, daylight, time_type, start, end, index_dir)))
+
+    return expression
+
+
+#Schema of a parquet file, or of a partition folder of a dataset such as the naive forecasts
+def read_schema(path):
+    if os.path.isdir(path):
+        return ds.dataset(path, format='parquet', partitioning='hive').schema
+    return pq.read_schema(path)
+
+
+#Reading only the rows and columns needed for a metric run from one zone file.
+#horizon can be a single horizon, a list of horizons or None for all of them.
+#daylight=True or False reads only the daylight or night rows (see daylight_index_file).
+def load_zone(zone_key, kind='predicted', horizon=24, power_types=power_types, start=None, end=None, path=None, columns=None, daylight=None):
+    path = path or zone_file(zone_key, kind)
+    schema = read_schema(path)
+
+    if columns is None:
+        columns = ['zone_key', 'target_time', 'horizon'] + value_columns(kind, power_types)
+    columns = [column for column in columns if column in schema.names]
+
+    # The daylight index sits next to the predicted and target files, also for the naive dataset
+    index_dir = os.path.dirname(zone_file(zone_key, 'target') if kind == 'naive' else path)
+    filters = build_filter(schema, zone_key, horizon, start, end, daylight, index_dir)
+    table = pq.read_table(path, columns=columns, filters=filters)
+    return table.to_pandas()
+
+
+#Reading the predicted and target files of a zone with the same filters
+def load_predicted_target(zone_key, horizon=24, power_types=power_types, start=None, end=None, predicted_path=None, target_path=None):
+    df_predicted = load_zone(zone_key, 'predicted', horizon, power_types, start, end, path=predicted_path)
+    df_target = load_zone(zone_key, 'target', horizon, power_types, start, end, path=target_path)
+    return df_predicted, df_target
+
+
+#Rewriting a file sorted by target_time in small row groups, so the min/max statistics
+#of each row group cover a short time span and a two-week read only touches a few of them
+def sort_for_pushdown(path, row_group_size=24 * 14 * 2):
+    table = pq.read_table(path)
+    table = table.sort_by([('target_time', 'ascending'), ('horizon', 'ascending')])
+    temporary_path = path + '.tmp'
+    pq.write_table(table, temporary_path, row_group_size=row_group_size)
+    os.replace(temporary_path, path)
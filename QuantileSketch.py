@@ -0,0 +1,116 @@
+import numpy as np
+
+# Quantiles come back within this relative distance of an exact value of the data
+default_relative_accuracy = 0.01
+
+# Values closer to zero than this are counted in the bin of zero
+min_indexable_value = 1e-9
+
+# A bin is stored as one integer code: sign * (key + key_offset), and 0 for the bin of zero
+key_offset = 1 << 20
+
+
+#Ratio between the bounds of consecutive bins for a relative accuracy
+def bin_ratio(relative_accuracy):
+    return (1 + relative_accuracy) / (1 - relative_accuracy)
+
+
+#Code of the logarithmic bin of each value (DDSketch): bin k holds the magnitudes in (ratio^(k-1), ratio^k]
+def encode_values(values, relative_accuracy=default_relative_accuracy):
+    values = np.asarray(values, dtype=float)
+    magnitude = np.abs(values)
+    is_zero = magnitude < min_indexable_value
+    key = np.ceil(np.log(np.where(is_zero, 1.0, magnitude)) / np.log(bin_ratio(relative_accuracy))).astype(np.int64)
+    return np.where(is_zero, 0, np.sign(values).astype(np.int64) * (key + key_offset))
+
+
+#Value standing for each bin code, within relative_accuracy of every value counted in the bin
+def decode_bins(codes, relative_accuracy=default_relative_accuracy):
+    codes = np.asarray(codes, dtype=np.int64)
+    ratio = bin_ratio(relative_accuracy)
+    key = np.abs(codes) - key_offset
+    return np.where(codes == 0, 0.0, np.sign(codes) * 2 * ratio ** key.astype(float) / (ratio + 1))
+
+
+#Adding up the counts of the bins with the same group and code.
+#Returns the group, code and count of every non-empty (group, bin), sorted by group and code.
+def merge_bins(groups, codes, counts):
+    order = np.lexsort((codes, groups))
+    groups, codes, counts = groups[order], codes[order], counts[order]
+    if len(groups) == 0:
+        return groups, codes, counts
+
+    is_first = np.ones(len(groups), dtype=bool)
+    is_first[1:] = (groups[1:] != groups[:-1]) | (codes[1:] != codes[:-1])
+    first = np.flatnonzero(is_first)
+    return groups[first], codes[first], np.add.reduceat(counts, first)
+
+
+#Sketch bins of the values of every group at once, NaN values are skipped
+def grouped_sketch_bins(group_codes, values, relative_accuracy=default_relative_accuracy):
+    valid = ~np.isnan(values)
+    codes = encode_values(values[valid], relative_accuracy)
+    return merge_bins(np.asarray(group_codes)[valid], codes, np.ones(len(codes), dtype=np.int64))
+
+
+#Quantile q of every group from its sketch bins. The bins do not have to be merged or sorted.
+#With absolute=True the quantile is of the absolute values. Groups without values give NaN.
+#The result is within relative_accuracy of the lower quantile of the data (numpy method='lower').
+def grouped_quantile(groups, codes, counts, n_groups, q, relative_accuracy=default_relative_accuracy, absolute=False):
+    if absolute:
+        codes = np.abs(codes)
+    groups, codes, counts = merge_bins(np.asarray(groups), np.asarray(codes), np.asarray(counts))
+    values = decode_bins(codes, relative_accuracy)
+
+    # Bins in value order within each group, the codes of negative values are sorted the wrong way
+    order = np.lexsort((values, groups))
+    groups, values, counts = groups[order], values[order], counts[order]
+
+    total = np.bincount(groups, weights=counts, minlength=n_groups)
+    cumulative = np.cumsum(counts)
+    group_offset = np.cumsum(total) - total
+    within_group = cumulative - group_offset[groups]
+    rank = np.floor(q * (total - 1))
+
+    # The quantile is the value of the first bin whose cumulative count passes the rank
+    passes = np.flatnonzero(within_group > rank[groups])
+    _, first = np.unique(groups[passes], return_index=True)
+    quantile = np.full(n_groups, np.nan)
+    quantile[groups[passes[first]]] = values[passes[first]]
+    return quantile
+
+
+#A mergeable quantile sketch (DDSketch): values are counted in logarithmic bins, so every quantile
+#is within relative_accuracy of an exact value of the data and two sketches merge by adding counts.
+#The number of bins grows with the log of the range of the values, not with the number of values.
+class QuantileSketch:
+    def __init__(self, relative_accuracy=default_relative_accuracy, codes=None, counts=None):
+        self.relative_accuracy = relative_accuracy
+        self.codes = np.empty(0, dtype=np.int64) if codes is None else np.asarray(codes, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def add_bins(self, codes, counts):
+        codes = np.concatenate([self.codes, np.asarray(codes, dtype=np.int64)])
+        counts = np.concatenate([self.counts, np.asarray(counts, dtype=np.int64)])
+        _, self.codes, self.counts = merge_bins(np.zeros(len(codes), dtype=np.int64), codes, counts)
+        return self
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        return self.add_bins(encode_values(values, self.relative_accuracy), np.ones(len(values), dtype=np.int64))
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Sketches with a different relative accuracy cannot be merged')
+        return self.add_bins(other.codes, other.counts)
+
+    def quantile(self, q, absolute=False):
+        groups = np.zeros(len(self.codes), dtype=np.int64)
+        quantiles = [grouped_quantile(groups, self.codes, self.counts, 1, value, self.relative_accuracy, absolute)[0] for value in np.atleast_1d(q)]
+        return quantiles[0] if np.ndim(q) == 0 else np.array(quantiles)
+
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+from DailyMetrics import day_groups, frame_epoch_ms
+from DaylightMask import daytime_rows
+
+power_types = ['wind', 'solar']
+
+
+#Ranking values within each group in one sort on (group, value).
+#Ties get the average of their positions, like scipy.stats.rankdata which spearmanr uses.
+def grouped_rank(group_codes, values, n_groups):
+    n_rows = len(values)
+    ranks = np.empty(n_rows)
+    if n_rows == 0:
+        return ranks
+
+    order = np.lexsort((values, group_codes))
+    sorted_codes = group_codes[order]
+    sorted_values = values[order]
+
+    count = np.bincount(group_codes, minlength=n_groups)
+    start = np.cumsum(count) - count
+    position = np.arange(1, n_rows + 1) - start[sorted_codes]
+
+    # A run is a block of equal values within the same group
+    run_start = np.ones(n_rows, dtype=bool)
+    run_start[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (sorted_values[1:] != sorted_values[:-1])
+    run_id = np.cumsum(run_start) - 1
+    first_position = position[run_start]
+    last_position = np.append(position[np.flatnonzero(run_start)[1:] - 1], position[-1])
+
+    ranks[order] = ((first_position + last_position) / 2)[run_id]
+    return ranks
+
+
+#Pearson correlation of x and y within each group, from segmented sums
+def grouped_correlation(group_codes, x, y, n_groups):
+    count = np.bincount(group_codes, minlength=n_groups)
+    sum_x = np.bincount(group_codes, weights=x, minlength=n_groups)
+    sum_y = np.bincount(group_codes, weights=y, minlength=n_groups)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = sum_x / count
+        mean_y = sum_y / count
+        dx = x - mean_x[group_codes]
+        dy = y - mean_y[group_codes]
+        covariance = np.bincount(group_codes, weights=dx * dy, minlength=n_groups)
+        variance_x = np.bincount(group_codes, weights=dx * dx, minlength=n_groups)
+        variance_y = np.bincount(group_codes, weights=dy * dy, minlength=n_groups)
+        correlation = covariance / np.sqrt(variance_x * variance_y)
+
+    # Constant days have no defined correlation, as in spearmanr
+    correlation[(variance_x == 0) | (variance_y == 0)] = np.nan
+    return np.clip(correlation, -1, 1)
+
+
+#Spearman rank correlation of target and predicted for every group at once.
+#A group with a NaN value gives NaN, like spearmanr with the default nan_policy.
+def grouped_spearman(group_codes, target, predicted, n_groups, min_count=2):
+    has_nan = np.isnan(target) | np.isnan(predicted)
+    nan_count = np.bincount(group_codes[has_nan], minlength=n_groups)
+
+    valid = ~has_nan
+    codes = group_codes[valid]
+    target_rank = grouped_rank(codes, target[valid], n_groups)
+    predicted_rank = grouped_rank(codes, predicted[valid], n_groups)
+    correlation = grouped_correlation(codes, target_rank, predicted_rank, n_groups)
+
+    count = np.bincount(codes, minlength=n_groups)
+    correlation[(nan_count > 0) | (count < min_count)] = np.nan
+    return correlation
+
+
+#Index of agreement d = 1 - sum((P - O)^2) / sum((|P - mean(O)| + |O - mean(O)|)^2) for every group.
+#NaN values are skipped as in calculate_index_of_agreement, which sums pandas Series.
+def grouped_index_of_agreement(group_codes, observed, predicted, n_groups, min_count=2):
+    rows = np.bincount(group_codes, minlength=n_groups)
+
+    has_observed = ~np.isnan(observed)
+    observed_count = np.bincount(group_codes[has_observed], minlength=n_groups)
+    observed_sum = np.bincount(group_codes[has_observed], weights=observed[has_observed], minlength=n_groups)
+
+    valid = has_observed & ~np.isnan(predicted)
+    codes = group_codes[valid]
+    observed = observed[valid]
+    predicted = predicted[valid]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_observed = (observed_sum / observed_count)[codes]
+        numerator = np.bincount(codes, weights=(predicted - observed) ** 2, minlength=n_groups)
+        potential_error = (np.abs(predicted - mean_observed) + np.abs(observed - mean_observed)) ** 2
+        denominator = np.bincount(codes, weights=potential_error, minlength=n_groups)
+        index_of_agreement = 1 - numerator / denominator
+
+    index_of_agreement[rows < min_count] = np.nan
+    return index_of_agreement
+
+
+#Calculating one daily rank metric for every power type of a merged frame, solar nighttime
+#hours are left out when exclude_night is set, as in MetricsallZones.spearman. night_rule tells
+#which hours are night (see DaylightMask), by default the hours with zero target production.
+def daily_rank_metric(df_combined, grouped_metric, name, power_types, exclude_night, night_rule='target_zero'):
+    group_codes, days = day_groups(df_combined)
+    zone_key = df_combined['zone_key_pred'].iloc[0]
+
+    daily_values = {}
+    for power_type in power_types:
+        target = df_combined[f'power_production_{power_type}_avg_target'].to_numpy(dtype=float)
+        predicted = df_combined[f'power_production_{power_type}_avg_pred'].to_numpy(dtype=float)
+        codes = group_codes
+
+        if power_type == 'solar' and exclude_night:
+            daytime = daytime_rows(night_rule, target, frame_epoch_ms(df_combined), zone_key)
+            codes, target, predicted = codes[daytime], target[daytime], predicted[daytime]
+
+        daily_values[f'{name}_{power_type}'] = grouped_metric(codes, target, predicted, len(days))
+
+    return pd.DataFrame(daily_values, index=days)
+
+
+#Daily Spearman rank correlation between target and predicted for each power type
+def daily_spearman(df_combined, power_types=power_types, exclude_night=True, night_rule='target_zero'):
+    return daily_rank_metric(df_combined, grouped_spearman, 'spearman', power_types, exclude_night, night_rule)
+
+
+#Daily index of agreement between target (observed) and predicted for each power type
+def daily_index_of_agreement(df_combined, power_types=power_types, exclude_night=True, night_rule='target_zero'):
+    return daily_rank_metric(df_combined, grouped_index_of_agreement, 'ioa', power_types, exclude_night, night_rule)
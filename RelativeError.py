@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+from DailyMetrics import day_groups, frame_epoch_ms
+from DaylightMask import daytime_rows
+from Baselines import baseline_forecasts
+
+power_types = ['wind', 'solar']
+
+
+#Ratio of the model MAE to the MAE of each baseline for every group at once: {name: (values, has_rows)}.
+#For each baseline only the rows where the model, the baseline and the target all have a value are used,
+#so both MAEs are over the same hours and the ratio is the ratio of the sums of absolute errors.
+def grouped_relative_mae(group_codes, predicted, target, baseline_values, n_groups):
+    model_error = np.abs(predicted - target)
+
+    results = {}
+    for name, baseline in baseline_values.items():
+        baseline_error = np.abs(baseline - target)
+        valid = ~(np.isnan(model_error) | np.isnan(baseline_error))
+        codes = group_codes[valid]
+        count = np.bincount(codes, minlength=n_groups)
+        model_sum = np.bincount(codes, weights=model_error[valid], minlength=n_groups)
+        baseline_sum = np.bincount(codes, weights=baseline_error[valid], minlength=n_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            results[name] = (model_sum / baseline_sum, count > 0)
+    return results
+
+
+#Horizon of every row of a merged frame, from the horizon key column when it holds several horizons
+def frame_horizons(df_combined):
+    column = 'horizon' if 'horizon' in df_combined.columns else 'horizon_pred'
+    return df_combined[column].to_numpy(dtype=np.int64)
+
+
+#Daily MRAE (model MAE / baseline MAE) of a merged frame for every power type and baseline (see Baselines).
+#The baselines are looked up once for the target times and horizons of the frame, so model, baseline and
+#target are aligned by timestamp without joins, and every power type and baseline is one grouped pass.
+#Solar nighttime hours are left out when exclude_night is set, night_rule tells which hours are night.
+#Returns one column mrae_<baseline>_<power_type> per combination, indexed by local day.
+def daily_relative_mae(df_combined, baselines=['persistence_24h'], power_types=power_types, exclude_night=True, night_rule='target_zero', target_path=None, naive_path=None):
+    zone_key = df_combined['zone_key_pred'].iloc[0]
+    group_codes, days = day_groups(df_combined)
+    epoch_ms = frame_epoch_ms(df_combined)
+    forecasts = baseline_forecasts(zone_key, baselines, epoch_ms, frame_horizons(df_combined), power_types, target_path, naive_path)
+
+    daily_values = {}
+    for power_type in power_types:
+        target = df_combined[f'power_production_{power_type}_avg_target'].to_numpy(dtype=float)
+        predicted = df_combined[f'power_production_{power_type}_avg_pred'].to_numpy(dtype=float)
+        rows = np.ones(len(target), dtype=bool)
+        if power_type == 'solar' and exclude_night:
+            rows = daytime_rows(night_rule, target, epoch_ms, zone_key)
+
+        baseline_values = {name: forecasts[name][power_type][rows] for name in baselines}
+        results = grouped_relative_mae(group_codes[rows], predicted[rows], target[rows], baseline_values, len(days))
+        for name, (values, has_rows) in results.items():
+            daily_values[f'mrae_{name}_{power_type}'] = np.where(has_rows, values, np.nan)
+
+    return pd.DataFrame(daily_values, index=days)
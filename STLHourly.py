@@ -1,29 +1,14 @@
 import matplotlib.pyplot as plt
-import pandas as pd
-from statsmodels.tsa.seasonal import STL
 import matplotlib.dates as mdates
+from Downsample import plot_downsampled
+from Decomposition import decomposition
 
-# Load your time series data
-df_combined = pd.read_parquet('data/target_and_predicted/US-TEX-ERCO_target.parquet')
-df_combined['target_time'] = pd.to_datetime(df_combined['target_time'], unit='ms', utc=True)
-
-# Set the index to the target_time
-df_combined.set_index('target_time', inplace=True)
-df_combined.sort_index(inplace=True)
-
-# Check for NaN values in your series
-print("NaN values before filling:", df_combined['power_production_solar_avg'].isnull().sum())
-
-# Option to fill NaN values if necessary
-# Uncomment the line below to fill NaN values with the previous value (forward fill)
-df_combined['power_production_solar_avg'].fillna(method='ffill', inplace=True)
+# Hourly target series of the zone, one value per hour, missing hours filled with the previous value
+# and the fit cached by its input data (see Decomposition)
+stl_result = decomposition('US-TEX-ERCO', 'solar', 'target', periods=[24], method='stl')
 
 # Select the data to analyze
-data_to_analyze = df_combined['power_production_solar_avg']
-
-# Perform STL decomposition
-stl = STL(data_to_analyze, period=24, seasonal=13)
-stl_result = stl.fit()
+data_to_analyze = stl_result['observed']
 
 # Plotting each component individually with customizations
 plt.figure(figsize=(14, 10))
@@ -34,7 +19,7 @@ month_fmt = mdates.DateFormatter('%Y-%m')
 
 # Function to set up each subplot
 def setup_subplot(ax, data, title, y_limit=None):
-    ax.plot(data)
+    plot_downsampled(ax, data.index, data)
     ax.set_title(title, fontsize=16)
     if y_limit:
         ax.set_ylim(y_limit)
@@ -44,15 +29,15 @@ def setup_subplot(ax, data, title, y_limit=None):
 
 # Trend
 ax1 = plt.subplot(411)
-setup_subplot(ax1, stl_result.trend, 'Trend', (-200, 15000))
+setup_subplot(ax1, stl_result['trend'], 'Trend', (-200, 15000))
 
 # Seasonal
 ax2 = plt.subplot(412)
-setup_subplot(ax2, stl_result.seasonal, 'Seasonality', (-5500, 3000))
+setup_subplot(ax2, stl_result['seasonal_24'], 'Seasonality', (-5500, 3000))
 
 # Residuals
 ax3 = plt.subplot(413)
-setup_subplot(ax3, stl_result.resid, 'Residuals', (-5000, 5000))
+setup_subplot(ax3, stl_result['resid'], 'Residuals', (-5000, 5000))
 
 # Observed
 ax4 = plt.subplot(414)
@@ -0,0 +1,75 @@
+import functools
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Zone metadata: name, timezone, centre, files and installed capacity as dated steps.
+# A capacity step holds from local midnight of its "from" date (null for the first step) until the next step.
+registry_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zones.json')
+
+
+def read_registry(path=registry_file):
+    with open(path) as file:
+        return json.load(file)
+
+
+zones = read_registry()
+
+# Views of the registry that the scripts use, register_zone keeps them up to date
+zone_names = {}
+timezone_mapping = {}
+zone_locations = {}
+zone_files = {}
+zone_capacity_mw = {}
+
+
+#Filling the views for one zone. zone_capacity_mw holds the latest capacity of each power type.
+def add_zone_views(zone_key, zone):
+    zone_names[zone_key] = zone.get('name', zone_key)
+    timezone_mapping[zone_key] = zone['timezone']
+    zone_locations[zone_key] = tuple(zone['location'])
+    zone_files[zone_key] = zone.get('files', {})
+    zone_capacity_mw[zone_key] = {power_type: steps[-1]['mw'] for power_type, steps in zone['capacity_mw'].items()}
+
+
+for zone_key, zone in zones.items():
+    add_zone_views(zone_key, zone)
+
+
+#Adding a zone at run time, e.g. synthetic zones for benchmarks. capacity_mw maps a power type to
+#a constant capacity or to a list of {'from': date, 'mw': capacity} steps.
+def register_zone(zone_key, timezone, location, capacity_mw, name=None, files=None):
+    zone = {
+        'name': name or zone_key,
+        'timezone': timezone,
+        'location': list(location),
+        'files': files or {},
+        'capacity_mw': {power_type: steps if isinstance(steps, list) else [{'from': None, 'mw': steps}] for power_type, steps in capacity_mw.items()},
+    }
+    register_zones({zone_key: zone})
+
+
+#Registering zone entries in the form they have in zones, e.g. the zones of the parent process in the
+#workers of a process pool (see ParallelRunner.zone_pool)
+def register_zones(entries):
+    for zone_key, zone in entries.items():
+        zones[zone_key] = zone
+        add_zone_views(zone_key, zone)
+    capacity_steps.cache_clear()
+
+
+#Start (ms since epoch) and capacity in MW of every capacity step of a zone and power type
+@functools.lru_cache(maxsize=None)
+def capacity_steps(zone_key, power_type):
+    steps = sorted(zones[zone_key]['capacity_mw'][power_type], key=lambda step: (step['from'] is not None, step['from'] or ''))
+    starts = [np.iinfo(np.int64).min if step['from'] is None else pd.Timestamp(step['from']).tz_localize(timezone_mapping[zone_key]).value // 1_000_000 for step in steps]
+    return np.array(starts, dtype=np.int64), np.array([step['mw'] for step in steps], dtype=float)
+
+
+#Installed capacity in MW at each epoch (ms), looked up for the whole array at once with searchsorted.
+#Epochs before the first step get the capacity of the first step.
+def capacity_at(zone_key, power_type, epoch_ms):
+    starts, capacity_mw = capacity_steps(zone_key, power_type)
+    position = np.searchsorted(starts, np.asarray(epoch_ms, dtype=np.int64), side='right') - 1
+    return capacity_mw[np.maximum(position, 0)]
@@ -0,0 +1 @@
+# Makes the modules at the repository root importable from the tests folder
@@ -0,0 +1,49 @@
+import importlib
+
+# Library functions of the project, name -> module that defines it. The modules are imported on first
+# use of a name, so importing the package (and starting the command line tool) does not load pandas,
+# pyarrow or matplotlib before a command needs them. Plotting stays in the scripts and in metrics.cli.
+lazy_exports = {
+    'zone_names': 'ZoneRegistry',
+    'timezone_mapping': 'ZoneRegistry',
+    'zone_capacity_mw': 'ZoneRegistry',
+    'register_zone': 'ZoneRegistry',
+    'capacity_at': 'ZoneRegistry',
+    'load_zone': 'ParquetLoader',
+    'load_predicted_target': 'ParquetLoader',
+    'zone_file': 'ParquetLoader',
+    'zone_from_path': 'ParquetLoader',
+    'convert_to_local_time': 'LocalTime',
+    'aligned_frame': 'AlignedFrameStore',
+    'aligned_arrays': 'AlignedFrameStore',
+    'clear_cache': 'AlignedFrameStore',
+    'metric_statistics': 'DailyMetrics',
+    'daily_metrics': 'DailyMetrics',
+    'daily_metrics_wide': 'DailyMetrics',
+    'daily_spearman': 'RankMetrics',
+    'daily_index_of_agreement': 'RankMetrics',
+    'daily_relative_mae': 'RelativeError',
+    'baselines': 'Baselines',
+    'baseline_forecasts': 'Baselines',
+    'daylight_mask': 'DaylightMask',
+    'evaluate_horizons': 'MultiHorizon',
+    'evaluate_zones': 'ParallelRunner',
+    'update_store': 'IncrementalMetrics',
+    'rollup_metrics': 'IncrementalMetrics',
+    'rollup_quantiles': 'IncrementalMetrics',
+    'capacity_sensitivity': 'CapacitySensitivity',
+}
+
+__all__ = list(lazy_exports)
+
+
+def __getattr__(name):
+    if name not in lazy_exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(lazy_exports[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
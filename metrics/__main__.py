@@ -0,0 +1,4 @@
+from metrics.cli import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import sys
+
+# Commands of the tool. They are listed here instead of read from DailyMetrics, so building the
+# parser and printing the help does not import pandas.
+error_metric_commands = ['nmae', 'nrmse', 'nrmdse', 'nmbe', 'nsde']
+rank_metric_commands = ['spearman', 'ioa']
+night_rules = ['target_zero', 'solar_position', 'none']
+
+
+#Merged predicted and target rows of one zone, indexed by local target_time like in MetricsallZones
+def zone_frame(zone_key, horizon, start, end):
+    from AlignedFrameStore import aligned_frame
+    return aligned_frame(zone_key, horizon, start, end).set_index('target_time')
+
+
+#Daily values of one metric for one zone, one column per power type (and baseline for mrae)
+def zone_metric(command, zone_key, args):
+    df_combined = zone_frame(zone_key, args.horizon, args.start, args.end)
+    night_rule = None if args.night_rule == 'none' else args.night_rule
+
+    if command in error_metric_commands:
+        from DailyMetrics import daily_metrics, daily_metrics_wide
+        return daily_metrics_wide(daily_metrics(df_combined, [command], args.power_type, night_rule=night_rule))
+    if command == 'spearman':
+        from RankMetrics import daily_spearman
+        return daily_spearman(df_combined, args.power_type, night_rule=night_rule)
+    if command == 'ioa':
+        from RankMetrics import daily_index_of_agreement
+        return daily_index_of_agreement(df_combined, args.power_type, night_rule=night_rule)
+    if command == 'mrae':
+        from RelativeError import daily_relative_mae
+        return daily_relative_mae(df_combined, args.baseline, args.power_type, night_rule=night_rule)
+    raise ValueError(f'Unknown command {command!r}')
+
+
+#Drawing the daily values of every zone and column into an image file with the Agg backend, no window is opened
+def save_plot(table, command, path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    figure = plt.figure(figsize=(12, 6))
+    for zone_key, df_zone in table.groupby(level='zone', sort=False):
+        df_zone = df_zone.droplevel('zone')
+        for column in df_zone.columns:
+            plt.plot(df_zone.index, df_zone[column], linestyle='-', marker='o', label=f'{column} in {zone_key}')
+    plt.title(f'Daily {command}')
+    plt.xlabel('Date')
+    plt.ylabel(command)
+    plt.grid(True)
+    plt.legend(loc='upper right')
+    plt.tight_layout()
+    figure.savefig(path)
+    plt.close(figure)
+
+
+def run_metric(args):
+    import pandas as pd
+    from ZoneRegistry import zone_names
+
+    zones = args.zone or list(zone_names)
+    unknown = [zone_key for zone_key in zones if zone_key not in zone_names]
+    if unknown:
+        raise SystemExit(f"Unknown zone {', '.join(unknown)}, known zones are {', '.join(zone_names)}")
+
+    table = pd.concat({zone_key: zone_metric(args.command, zone_key, args) for zone_key in zones}, names=['zone', 'day'])
+    if args.output:
+        table.to_csv(args.output)
+    else:
+        print(table.to_string())
+    if args.plot:
+        save_plot(table, args.command, args.plot)
+
+
+def run_zones(args):
+    from ZoneRegistry import zone_names, timezone_mapping, zone_capacity_mw
+    for zone_key, name in zone_names.items():
+        capacity = ', '.join(f'{power_type} {mw:g} MW' for power_type, mw in zone_capacity_mw[zone_key].items())
+        print(f'{zone_key}\t{name}\t{timezone_mapping[zone_key]}\t{capacity}')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='metrics', description='Daily forecast error metrics of the zones in zones.json.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    zones = commands.add_parser('zones', help='list the zones of the registry')
+    zones.set_defaults(run=run_zones)
+
+    for command in error_metric_commands + rank_metric_commands + ['mrae']:
+        metric = commands.add_parser(command, help=f'daily {command} per zone and power type')
+        metric.add_argument('--zone', action='append', help='zone key, can be repeated, all zones by default')
+        metric.add_argument('--horizon', type=int, default=24, help='forecast horizon in hours (default 24)')
+        metric.add_argument('--start', help='first local day, e.g. 2023-08-01')
+        metric.add_argument('--end', help='end of the window in local time, included as an instant: a date only reads its 00:00 hour, like the end dates of the scripts')
+        metric.add_argument('--power-type', nargs='+', choices=['wind', 'solar'], default=['wind', 'solar'])
+        metric.add_argument('--night-rule', choices=night_rules, default='target_zero', help='how solar nighttime hours are found')
+        metric.add_argument('--output', help='write the table to this CSV file instead of printing it')
+        metric.add_argument('--plot', help='save a plot of the daily values to this image file')
+        if command == 'mrae':
+            metric.add_argument('--baseline', nargs='+', default=['persistence_24h'], help='baselines of Baselines.baselines (default persistence_24h)')
+        metric.set_defaults(run=run_metric)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,131 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import IncrementalMetrics
+from IncrementalMetrics import update_store, read_store, rollup_metrics
+
+zone_key = 'US-TEX-ERCO'
+horizons = [12, 24]
+first_ms = pd.Timestamp('2023-03-01', tz='UTC').value // 1_000_000
+ms_per_hour = 3_600_000
+
+
+#Predicted and target files of n_days days for both horizons, sorted by target_time in weekly row groups
+#like ParquetLoader.sort_for_pushdown. edited_hour changes one target value, as an in-place correction
+#raising the maximum of its row group, since changed row groups are found from their statistics.
+def write_files(directory, n_days, edited_hour=None):
+    rng = np.random.default_rng(0)
+    n_hours = 60 * 24
+    epoch_ms = first_ms + np.arange(n_hours, dtype=np.int64) * ms_per_hour
+    hour = (epoch_ms // ms_per_hour) % 24
+    target = {
+        'wind': rng.uniform(2000, 30000, n_hours),
+        'solar': np.where((hour >= 13) & (hour <= 23), rng.uniform(0, 12000, n_hours), 0.0),
+    }
+    if edited_hour is not None:
+        target['wind'][edited_hour] = 50000.0
+    predicted = {power_type: values + rng.normal(0, 1000, n_hours) for power_type, values in target.items()}
+
+    rows = slice(0, n_days * 24)
+    paths = {}
+    for kind, values in [('predicted', predicted), ('target', target)]:
+        table = pa.table({
+            'zone_key': np.full(n_days * 24 * len(horizons), zone_key),
+            'target_time': np.repeat(epoch_ms[rows], len(horizons)),
+            'horizon': np.tile(np.asarray(horizons, dtype=np.int64), n_days * 24),
+            **{f'power_production_{power_type}_avg': np.repeat(series[rows], len(horizons)) for power_type, series in values.items()},
+        })
+        paths[kind] = os.path.join(directory, f'{zone_key}_{kind}.parquet')
+        pq.write_table(table, paths[kind], row_group_size=24 * 7 * len(horizons))
+    return paths
+
+
+#Moving the modification time of the files one second on, as a later write would. A rewrite within the
+#same timestamp tick and of the same size would not change the fingerprint of the files.
+def touch(paths):
+    for path in paths.values():
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+
+
+#Time windows read by update_store, None when the whole files were read
+@pytest.fixture
+def reads(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    windows = []
+    load_all_horizons = IncrementalMetrics.load_all_horizons
+
+    def recording_load(zone_key, horizons, start, end, *args):
+        windows.append((start, end))
+        return load_all_horizons(zone_key, horizons, start, end, *args)
+
+    monkeypatch.setattr(IncrementalMetrics, 'load_all_horizons', recording_load)
+    return windows
+
+
+def update(paths, store_dir, night_rule='target_zero'):
+    return update_store(zone_key, horizons, predicted_path=paths['predicted'], target_path=paths['target'], store_dir=store_dir, night_rule=night_rule)
+
+
+#The store updated in steps gives the same statistics and rollups as a store built once from the final files
+def assert_same_as_fresh(paths, store_dir, tmp_path, night_rule='target_zero'):
+    fresh_dir = str(tmp_path / 'fresh')
+    update(paths, fresh_dir, night_rule)
+    stored, _ = read_store(zone_key, store_dir)
+    fresh, _ = read_store(zone_key, fresh_dir)
+    sketch_columns = ['sketch_code', 'sketch_count']
+    pd.testing.assert_frame_equal(stored.drop(columns=sketch_columns), fresh.drop(columns=sketch_columns))
+    for column in sketch_columns:
+        assert all(np.array_equal(a, b) for a, b in zip(stored[column], fresh[column]))
+    for freq in ['D', 'W', None]:
+        pd.testing.assert_frame_equal(rollup_metrics(zone_key, freq=freq, store_dir=store_dir), rollup_metrics(zone_key, freq=freq, store_dir=fresh_dir))
+
+
+def test_touched_files_are_not_read(tmp_path, reads):
+    paths = write_files(str(tmp_path), 30)
+    store_dir = str(tmp_path / 'store')
+    update(paths, store_dir)
+    touch(paths)
+
+    assert update(paths, store_dir) == 0
+    assert len(reads) == 1
+    assert_same_as_fresh(paths, store_dir, tmp_path)
+
+
+def test_changed_early_row_group(tmp_path, reads):
+    paths = write_files(str(tmp_path), 30)
+    store_dir = str(tmp_path / 'store')
+    update(paths, store_dir)
+    paths = write_files(str(tmp_path), 30, edited_hour=30)
+    touch(paths)
+
+    # Only the (power_type, horizon, day) groups of the edited hour are recomputed
+    assert update(paths, store_dir) == len(horizons)
+    start, end = reads[-1]
+    assert start is not None and end < pd.Timestamp(first_ms + 14 * 24 * ms_per_hour, unit='ms', tz='UTC')
+    assert_same_as_fresh(paths, store_dir, tmp_path)
+
+
+def test_appended_rows(tmp_path, reads):
+    paths = write_files(str(tmp_path), 30)
+    store_dir = str(tmp_path / 'store')
+    update(paths, store_dir)
+    paths = write_files(str(tmp_path), 45)
+    touch(paths)
+
+    assert update(paths, store_dir) > 0
+    start, end = reads[-1]
+    assert end is not None and start > pd.Timestamp(first_ms + 21 * 24 * ms_per_hour, unit='ms', tz='UTC')
+    assert_same_as_fresh(paths, store_dir, tmp_path)
+
+
+def test_night_rule_change_rebuilds_every_day(tmp_path, reads):
+    paths = write_files(str(tmp_path), 30)
+    store_dir = str(tmp_path / 'store')
+    update(paths, store_dir, 'target_zero')
+
+    update(paths, store_dir, 'solar_position')
+    assert reads[-1] == (None, None)
+    assert_same_as_fresh(paths, store_dir, tmp_path, 'solar_position')
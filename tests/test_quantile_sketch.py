@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from QuantileSketch import QuantileSketch
+
+# An odd number of hours, so np.median is one of the values and not the mean of two
+n_hours = 24 * 365 + 1
+
+rng = np.random.default_rng(0)
+samples = {
+    'normal error': rng.normal(0, 1000, n_hours),
+    'squared error': rng.normal(0, 1000, n_hours) ** 2,
+    'skewed error': rng.lognormal(3, 2, n_hours) - 50,
+    'with zeros': np.where(rng.random(n_hours) < 0.4, 0.0, rng.exponential(500, n_hours)),
+}
+
+
+#Sketch of the values built from one sketch per day merged together, like the daily rollups
+def merged_daily_sketch(values, relative_accuracy):
+    merged = QuantileSketch(relative_accuracy)
+    for day in np.array_split(values, 365):
+        merged.merge(QuantileSketch(relative_accuracy).add(day))
+    return merged
+
+
+@pytest.mark.parametrize('relative_accuracy', [0.01, 0.001])
+@pytest.mark.parametrize('name', list(samples))
+@pytest.mark.parametrize('absolute', [False, True])
+def test_median_within_relative_accuracy(relative_accuracy, name, absolute):
+    values = samples[name]
+    exact = np.median(np.abs(values) if absolute else values)
+    estimate = merged_daily_sketch(values, relative_accuracy).quantile(0.5, absolute)
+    assert abs(estimate - exact) <= relative_accuracy * abs(exact) + 1e-12
+
+
+@pytest.mark.parametrize('relative_accuracy', [0.01, 0.001])
+@pytest.mark.parametrize('name', list(samples))
+def test_quantiles_within_relative_accuracy(relative_accuracy, name):
+    values = samples[name]
+    sketch = merged_daily_sketch(values, relative_accuracy)
+    for q in [0.01, 0.25, 0.9, 0.99]:
+        exact = np.quantile(values, q, method='lower')
+        assert abs(sketch.quantile(q) - exact) <= relative_accuracy * abs(exact) + 1e-12
+
+
+def test_merge_rejects_other_relative_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.001))